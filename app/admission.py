@@ -0,0 +1,283 @@
+"""
+Admission control for the routes that can swamp a worker: auth (bcrypt)
+and report ingest.
+
+Each limited route belongs to a class with:
+
+- a concurrency limit with a bounded wait queue: past the queue, or after
+  waiting ADMISSION_QUEUE_TIMEOUT_MS, the request is shed;
+- a token bucket per client: user id for ingest, client IP for auth.
+  Buckets use GCRA, so the state is one timestamp per client;
+- load shedding: while the event loop lags ADMISSION_SHED_LOOP_LAG_MS
+  (sampled by loop_lag_monitor), every new auth/ingest request is shed.
+  This keeps the loop free for tower/analytics/coverage reads, which are
+  never limited.
+
+Shed requests get 429 with Retry-After before any body is read.
+
+Backends (ADMISSION_BACKEND):
+    memory  per-process buckets (default)
+    redis   buckets shared by every worker; needs `pip install redis` and
+            ADMISSION_REDIS_URL. Concurrency limits stay per worker.
+
+A failing shared backend admits the request (fail open).
+"""
+import asyncio
+import hashlib
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from .config import settings
+from .instrumentation import loop_lag_monitor
+from .metrics import Counter, Gauge
+from .utils.cache import TTLCache
+
+# (method, path without trailing slash) -> admission class
+LIMITED_ROUTES: Dict[Tuple[str, str], str] = {
+    ("POST", "/auth/login"): "auth",
+    ("POST", "/auth/register"): "auth",
+    ("POST", "/api/reports"): "ingest",
+    ("POST", "/api/reports/bulk"): "ingest",
+}
+
+KEY_PREFIX = "signalscope:adm:"
+
+admission_admitted = Counter("admission_admitted_total", "Requests admitted by class", labels=("route_class",))
+admission_shed = Counter("admission_shed_total", "Requests rejected with 429 by class and reason",
+                         labels=("route_class", "reason"))
+admission_in_flight = Gauge("admission_in_flight", "Admitted requests still running", labels=("route_class",))
+admission_queued = Gauge("admission_queued", "Requests waiting for a concurrency slot", labels=("route_class",))
+admission_errors = Counter("admission_backend_errors_total", "Shared bucket calls that failed (request admitted)")
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def gcra(tat: Optional[float], now: float, rate: float, burst: int) -> Tuple[Optional[float], float]:
+    """
+    One token-bucket decision in GCRA form.
+
+    tat is the client's theoretical arrival time (None = new client).
+    Returns (new tat, 0) if the request conforms, else (None, seconds until it would).
+    """
+    interval = 1.0 / rate
+    new_tat = max(tat or now, now) + interval
+    excess = new_tat - now - interval * burst
+    if excess > 0:
+        return None, excess
+    return new_tat, 0.0
+
+
+class MemoryBuckets:
+    def __init__(self, max_clients: int):
+        self.tats = TTLCache(max_clients, ttl=3600)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        tat, retry_after = gcra(self.tats.get(key), now, rate, burst)
+        if tat is not None:
+            # A client idle for a full bucket is indistinguishable from a new one
+            self.tats.set(key, tat, ttl=tat - now + 1)
+        return retry_after
+
+
+# Same decision as gcra(), atomically in Redis; returns retry_after in ms
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local new_tat = math.max(tat, now) + interval
+local excess = new_tat - now - interval * burst
+if excess > 0 then
+    return math.ceil(excess * 1000)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return 0
+"""
+
+
+class RedisBuckets:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis
+        self.url = url
+        self._client = None
+        self._script = None
+
+    @property
+    def script(self):
+        # Created on first use inside the worker, never inherited across a fork
+        if self._client is None:
+            self._client = self._redis.from_url(self.url)
+            self._script = self._client.register_script(GCRA_SCRIPT)
+        return self._script
+
+    def reset(self):
+        self._client = self._script = None
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        retry_ms = await self.script(keys=[KEY_PREFIX + key], args=[repr(time.time()), repr(1.0 / rate), burst])
+        return int(retry_ms) / 1000
+
+
+class RouteClass:
+    """Concurrency limit + wait queue for one admission class, per worker"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, rate: float, burst: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = burst
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.in_flight = 0
+
+    async def acquire(self, timeout: float):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        if self.semaphore.locked():
+            if self.queued >= self.max_queue:
+                raise Shed("queue_full")
+            self.queued += 1
+            admission_queued.set(self.queued, route_class=self.name)
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise Shed("queue_timeout")
+            finally:
+                self.queued -= 1
+                admission_queued.set(self.queued, route_class=self.name)
+        else:
+            await self.semaphore.acquire()
+        self.in_flight += 1
+        admission_in_flight.set(self.in_flight, route_class=self.name)
+
+    def release(self):
+        self.in_flight -= 1
+        admission_in_flight.set(self.in_flight, route_class=self.name)
+        self.semaphore.release()
+
+
+def client_ip(scope) -> str:
+    if settings.ADMISSION_CLIENT_IP_HEADER:
+        header = settings.ADMISSION_CLIENT_IP_HEADER.lower().encode("latin-1")
+        for name, value in scope["headers"]:
+            if name == header:
+                return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def client_key(scope, route_class: str) -> str:
+    """Bucket key: the bearer token's user for ingest, otherwise the client IP"""
+    if route_class == "ingest":
+        for name, value in scope["headers"]:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                from .auth.utils import verify_token
+
+                try:
+                    # Cached decode; an invalid token is rejected by the route itself
+                    return "user:" + verify_token(value[7:].decode("latin-1"))
+                except Exception:
+                    break
+    # Hashed so raw addresses never end up in Redis keys
+    return "ip:" + hashlib.blake2b(client_ip(scope).encode(), digest_size=8).hexdigest()
+
+
+class Admission:
+    def __init__(self):
+        self.buckets = None
+        self.classes: Dict[str, RouteClass] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ADMISSION_ENABLED
+
+    def configure(self):
+        self.classes = {
+            "auth": RouteClass("auth", settings.ADMISSION_AUTH_CONCURRENCY, settings.ADMISSION_AUTH_QUEUE,
+                               settings.ADMISSION_AUTH_RATE, settings.ADMISSION_AUTH_BURST),
+            "ingest": RouteClass("ingest", settings.ADMISSION_INGEST_CONCURRENCY, settings.ADMISSION_INGEST_QUEUE,
+                                 settings.ADMISSION_INGEST_RATE, settings.ADMISSION_INGEST_BURST),
+        }
+        self.buckets = None
+        if settings.ADMISSION_BACKEND == "redis":
+            try:
+                self.buckets = RedisBuckets(settings.ADMISSION_REDIS_URL)
+                return
+            except ImportError:
+                print("[WARN] ADMISSION_BACKEND=redis but the redis package is not installed; "
+                      "using in-process token buckets")
+        self.buckets = MemoryBuckets(settings.ADMISSION_MAX_CLIENTS)
+
+    def route_class(self, scope) -> Optional[RouteClass]:
+        name = LIMITED_ROUTES.get((scope["method"], scope["path"].rstrip("/")))
+        return self.classes.get(name) if name else None
+
+    async def admit(self, route: RouteClass, scope):
+        """Take a bucket token and a concurrency slot, or raise Shed"""
+        lag_limit = settings.ADMISSION_SHED_LOOP_LAG_MS
+        if lag_limit and loop_lag_monitor.latest * 1000 >= lag_limit:
+            raise Shed("overload")
+        if route.rate > 0:
+            try:
+                retry_after = await self.buckets.take(f"{route.name}:{client_key(scope, route.name)}",
+                                                      route.rate, route.burst)
+            except Exception:
+                admission_errors.inc()
+                retry_after = 0.0
+            if retry_after > 0:
+                raise Shed("rate_limited", retry_after)
+        await route.acquire(settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000)
+
+
+admission = Admission()
+admission.configure()
+
+
+async def _send_429(send, shed: Shed):
+    body = orjson.dumps({"detail": "Too many requests, retry later"})
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(shed.retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI; only LIMITED_ROUTES pay anything beyond a dict lookup"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = admission.route_class(scope) if scope["type"] == "http" and admission.enabled else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await admission.admit(route, scope)
+        except Shed as shed:
+            admission_shed.inc(route_class=route.name, reason=shed.reason)
+            await _send_429(send, shed)
+            return
+        admission_admitted.inc(route_class=route.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.release()
@@ -0,0 +1,127 @@
+"""
+Keeps the materialized report views in step with the reports.
+
+Inserts fold into every view concurrently. A view whose update fails is
+marked in `db.view_status` ({"_id": "rollups", "failed_at": ..., "error": ...});
+its counters are then missing those reports, so the next startup rebuilds
+it instead of only building empty views. To rebuild right away:
+
+    python -m app.analytics.pipeline                  # every view in use
+    python -m app.analytics.pipeline --views rollups clusters
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Sequence
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..clusters import ensure_report_clusters, rebuild_report_clusters, record_report_clusters
+from ..config import settings
+from ..coverage_tiles import tile_cache
+from ..report_columns import record_report_columns
+from ..report_storage import timeseries_enabled
+from ..response_cache import response_cache
+from .rebuild import views_lock
+from .report_stats import ensure_report_stats, rebuild_report_stats, record_reports
+from .rollups import ensure_rollups, rebuild_rollups, record_rollups
+from .tiers import ensure_report_tiers, rebuild_report_tiers, record_report_tiers
+
+
+class View(NamedTuple):
+    key: str
+    name: str
+    record: Callable[[AsyncIOMotorDatabase, List[dict]], Awaitable]
+    ensure: Callable[[AsyncIOMotorDatabase], Awaitable]
+    rebuild: Callable[[AsyncIOMotorDatabase], Awaitable[int]]
+
+
+VIEWS = (
+    View("stats", "report stats", record_reports, ensure_report_stats, rebuild_report_stats),
+    View("rollups", "rollups", record_rollups, ensure_rollups, rebuild_rollups),
+    View("clusters", "clusters", record_report_clusters, ensure_report_clusters, rebuild_report_clusters),
+    View("tiers", "tiers", record_report_tiers, ensure_report_tiers, rebuild_report_tiers),
+)
+VIEWS_BY_KEY = {view.key: view for view in VIEWS}
+
+
+def active_views() -> List[View]:
+    """The views this storage mode maintains; tiers only exist with time-series reports"""
+    return [view for view in VIEWS if view.key != "tiers" or timeseries_enabled()]
+
+
+async def mark_stale(db: AsyncIOMotorDatabase, view: View, error: Exception):
+    try:
+        await db.view_status.update_one(
+            {"_id": view.key},
+            {"$set": {"failed_at": datetime.utcnow(), "error": str(error)}},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"[WARN] Failed to mark {view.name} for rebuild: {e}")
+
+
+async def on_reports_inserted(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Fold newly stored reports into every materialized view"""
+    views = active_views()
+    updates = [view.record(db, docs) for view in views]
+    if settings.REPORT_COLUMNS_ENABLED:
+        # Resyncs from the reports on its own, so it's never marked
+        updates.append(record_report_columns(db, docs))
+    results = await asyncio.gather(*updates, return_exceptions=True)
+    for i, result in enumerate(results):
+        if not isinstance(result, Exception):
+            continue
+        # The reports themselves are stored; the view is rebuilt on the next start
+        view = views[i] if i < len(views) else None
+        print(f"[WARN] Failed to update {view.name if view else 'report columns'}: {result}")
+        if view:
+            await mark_stale(db, view, result)
+
+    generations = await response_cache.invalidate("reports")
+    tile_cache.invalidate_points(
+        [d["lat"] for d in docs], [d["lng"] for d in docs], [d.get("carrier") for d in docs],
+        generations.get("reports"),
+    )
+
+
+async def rebuild_views(db: AsyncIOMotorDatabase, views: Sequence[View]):
+    """Rebuild `views` and clear their marks; callers hold views_lock"""
+    for view in views:
+        started = datetime.utcnow()
+        counted = await view.rebuild(db)
+        # A failure during the rebuild may not be covered by it: keep that mark
+        await db.view_status.delete_one({"_id": view.key, "failed_at": {"$lt": started}})
+        print(f"[OK] Rebuilt {view.name} from {counted} reports")
+
+
+async def ensure_materialized_views(db: AsyncIOMotorDatabase):
+    """Build missing or stale views; the other workers of the host wait, then find them built"""
+    async with views_lock(db):
+        stale = {doc["_id"]: doc async for doc in db.view_status.find()}
+        for view in active_views():
+            if view.key in stale:
+                print(f"[WARN] {view.name} missed reports at {stale[view.key]['failed_at']}, rebuilding")
+                await rebuild_views(db, [view])
+            else:
+                await view.ensure(db)
+
+
+async def _main(keys: Optional[List[str]]):
+    from ..database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        views = [VIEWS_BY_KEY[key] for key in keys] if keys else active_views()
+        async with views_lock(db):
+            await rebuild_views(db, views)
+        print(f"✅ Rebuilt {', '.join(view.name for view in views)}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the materialized report views")
+    parser.add_argument("--views", nargs="+", choices=list(VIEWS_BY_KEY),
+                        help="views to rebuild (default: every view in use)")
+    asyncio.run(_main(parser.parse_args().views))
@@ -0,0 +1,121 @@
+"""
+Rebuilding the materialized report views (stats, rollups, tiers, clusters).
+
+A rebuild never empties a live view. It folds the reports into
+`<view>_rebuild` with the same record_* functions inserts use, then renames
+that collection over the view, so readers and concurrent `$inc`s keep
+hitting the old documents until the swap and no report is counted twice.
+
+Reports inserted while the scan runs are picked up by tail passes: the
+main scan covers _ids older than the start of the rebuild (minus
+TAIL_MARGIN for clock skew between workers), the tail folds newer ones it
+hasn't seen yet. Reports stored between the last tail pass and the rename
+are only in the old view; an exact rebuild needs ingest stopped.
+
+views_lock serializes rebuilds between the workers of one host, like the
+tower snapshot writer, so N workers starting against empty views build them
+once.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..config import settings
+from ..indexes import INDEXES
+from ..report_storage import timeseries_enabled
+from ..tower_snapshot import snapshot_dir, writer_lock
+
+REBUILD_SUFFIX = "_rebuild"
+REBUILD_BATCH_SIZE = 5000
+TAIL_MARGIN = timedelta(seconds=5)
+TAIL_PASSES = 3
+
+
+def views_lock(db: AsyncIOMotorDatabase):
+    """Exclusive across the processes of this host; not reentrant"""
+    return writer_lock(os.path.join(snapshot_dir(settings.TOWER_SNAPSHOT_DIR), f"signalscope-views-{db.name}"))
+
+
+class RebuildTargets:
+    """Stands in for the database in record_* calls, redirecting the rebuilt views"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, names: Sequence[str]):
+        self.db = db
+        self.names = {name: name + REBUILD_SUFFIX for name in names}
+
+    def __getitem__(self, name: str):
+        return self.db[self.names[name]]
+
+    def __getattr__(self, name: str):
+        if name in self.__dict__.get("names", {}):
+            return self[name]
+        raise AttributeError(name)
+
+
+async def _stream(cursor, record: Callable[[List[dict]], Awaitable], seen: Optional[set] = None) -> int:
+    counted = 0
+    batch = []
+    async for doc in cursor:
+        if seen is not None:
+            if doc["_id"] in seen:
+                continue
+            seen.add(doc["_id"])
+        batch.append(doc)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            await record(batch)
+            counted += len(batch)
+            batch = []
+    if batch:
+        await record(batch)
+        counted += len(batch)
+    return counted
+
+
+async def _swap(db: AsyncIOMotorDatabase, temp: str, name: str):
+    if temp in await db.list_collection_names():
+        await db[temp].rename(name, dropTarget=True)
+    else:
+        # Nothing was written: the view is empty
+        await db[name].drop()
+
+
+async def rebuild_view(db: AsyncIOMotorDatabase, names: Sequence[str],
+                       record: Callable[[RebuildTargets, List[dict]], Awaitable],
+                       projection: Dict[str, int], source: str = "reports",
+                       bulk: Optional[Callable[[RebuildTargets, dict], Awaitable[int]]] = None) -> int:
+    """
+    Recompute the views `names` from `source` and swap them in; returns
+    reports counted. record(targets, docs) folds a batch; bulk(targets,
+    query), when given, folds the main scan in one go instead.
+    """
+    if timeseries_enabled() and source == "reports" and settings.REPORT_RAW_RETENTION_DAYS:
+        print(f"[WARN] Rebuilding {', '.join(names)} from time-series reports: only the last "
+              f"{settings.REPORT_RAW_RETENTION_DAYS} days are still stored and counted")
+    targets = RebuildTargets(db, names)
+    for name, temp in targets.names.items():
+        await db[temp].drop()
+        if INDEXES.get(name):
+            await db[temp].create_indexes(INDEXES[name])
+
+    boundary = ObjectId.from_datetime(datetime.utcnow() - TAIL_MARGIN)
+    head = {"_id": {"$lt": boundary}}
+    projection = {**projection, "_id": 1}
+    if bulk is not None:
+        counted = await bulk(targets, head)
+    else:
+        cursor = db[source].find(head, projection).batch_size(REBUILD_BATCH_SIZE)
+        counted = await _stream(cursor, lambda docs: record(targets, docs))
+
+    seen = set()
+    for _ in range(TAIL_PASSES):
+        cursor = db[source].find({"_id": {"$gte": boundary}}, projection).batch_size(REBUILD_BATCH_SIZE)
+        tail = await _stream(cursor, lambda docs: record(targets, docs), seen)
+        counted += tail
+        if not tail:
+            break
+
+    for name, temp in targets.names.items():
+        await _swap(db, temp, name)
+    return counted
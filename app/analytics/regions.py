@@ -0,0 +1,66 @@
+"""
+Offline lat/lng -> region lookup.
+
+Reports are assigned to the nearest ZIP centroid from a bundled table; points
+farther than ZIP_MAX_DISTANCE_KM from every centroid fall back to a geohash
+cell ("cell:<geohash>") so nothing is dropped.
+
+The bundled `app/data/zip_centroids.csv` only covers the seeded metros. For
+national coverage point ZIP_CENTROIDS_PATH at the Census ZCTA gazetteer file
+(tab-separated GEOID/INTPTLAT/INTPTLONG) or any CSV with zip,lat,lng columns.
+"""
+import csv
+from pathlib import Path
+from typing import List, Optional
+
+from ..config import settings
+from ..utils import geocell
+from ..utils.spatial_index import GridIndex
+
+BUNDLED_CENTROIDS = Path(__file__).resolve().parent.parent / "data" / "zip_centroids.csv"
+FALLBACK_CELL_PRECISION = 4  # ~39 x 20 km
+
+
+def _read_centroids(path: Path) -> List[tuple]:
+    with open(path, newline="", encoding="utf-8") as f:
+        sample = f.readline()
+        f.seek(0)
+        reader = csv.DictReader(f, delimiter="\t" if "\t" in sample else ",")
+        rows = []
+        for row in reader:
+            row = {k.strip(): v for k, v in row.items() if k}
+            zip_code = row.get("zip") or row.get("GEOID")
+            lat = row.get("lat") or row.get("INTPTLAT")
+            lng = row.get("lng") or row.get("INTPTLONG")
+            if zip_code and lat and lng:
+                rows.append((zip_code.strip(), float(lat), float(lng)))
+        return rows
+
+
+class ZipLookup:
+    def __init__(self, rows: List[tuple], max_distance_km: float):
+        self.zips = [r[0] for r in rows]
+        self.grid = GridIndex([r[1] for r in rows], [r[2] for r in rows], cell_deg=0.5)
+        self.max_distance_km = max_distance_km
+
+    def region_for(self, lat: float, lng: float) -> str:
+        return self.regions_for([lat], [lng])[0]
+
+    def regions_for(self, lats, lngs) -> List[str]:
+        """Region of every point, resolved in one vectorized pass"""
+        idx, _ = self.grid.nearest_within(lats, lngs, self.max_distance_km)
+        return [
+            self.zips[i] if i >= 0 else "cell:" + geocell.encode(lat, lng, FALLBACK_CELL_PRECISION)
+            for i, lat, lng in zip(idx.tolist(), lats, lngs)
+        ]
+
+
+_zip_lookup: Optional[ZipLookup] = None
+
+
+def get_zip_lookup() -> ZipLookup:
+    global _zip_lookup
+    if _zip_lookup is None:
+        path = Path(settings.ZIP_CENTROIDS_PATH) if settings.ZIP_CENTROIDS_PATH else BUNDLED_CENTROIDS
+        _zip_lookup = ZipLookup(_read_centroids(path), settings.ZIP_MAX_DISTANCE_KM)
+    return _zip_lookup
@@ -0,0 +1,170 @@
+"""
+Running per-carrier report statistics.
+
+`db.report_stats` holds one small document per carrier with a report count,
+signal sum / sum of squares / min / max and a histogram of integer dBm
+values. Inserts bump it with `$inc`, so reading the dashboard costs one tiny
+query however large `db.reports` grows. Percentiles come from the histogram.
+
+Rebuild from scratch with:
+    python -m app.analytics.report_stats
+"""
+import asyncio
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from .rebuild import RebuildTargets, rebuild_view, views_lock
+
+PERCENTILES = (50, 90, 95)
+
+
+def _accumulate(docs: Iterable[dict]) -> Dict[str, dict]:
+    """Fold reports into per-carrier partial stats"""
+    partial = {}
+    for doc in docs:
+        signal = int(doc["signal_strength"])
+        entry = partial.get(doc["carrier"])
+        if entry is None:
+            entry = partial[doc["carrier"]] = {
+                "count": 0, "sum": 0, "sum_sq": 0,
+                "min": signal, "max": signal, "hist": defaultdict(int),
+            }
+        entry["count"] += 1
+        entry["sum"] += signal
+        entry["sum_sq"] += signal * signal
+        entry["min"] = min(entry["min"], signal)
+        entry["max"] = max(entry["max"], signal)
+        entry["hist"][str(signal)] += 1
+    return partial
+
+
+def _update(partial: dict) -> dict:
+    inc = {"count": partial["count"], "signal_sum": partial["sum"], "signal_sum_sq": partial["sum_sq"]}
+    for value, n in partial["hist"].items():
+        inc[f"hist.{value}"] = n
+    return {"$inc": inc, "$min": {"signal_min": partial["min"]}, "$max": {"signal_max": partial["max"]}}
+
+
+async def record_reports(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Add freshly inserted reports to the running counters"""
+    partial = _accumulate(docs)
+    if not partial:
+        return
+    await db.report_stats.bulk_write(
+        [UpdateOne({"_id": carrier}, _update(p), upsert=True) for carrier, p in partial.items()],
+        ordered=False,
+    )
+
+
+async def _group_reports(targets: RebuildTargets, query: dict) -> int:
+    """The counters of every report matching query, from a single $group pipeline"""
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"carrier": "$carrier", "signal": {"$toInt": "$signal_strength"}},
+            "n": {"$sum": 1},
+        }},
+    ]
+    totals = {}
+    async for row in targets.db.reports.aggregate(pipeline, allowDiskUse=True):
+        carrier, signal, n = row["_id"]["carrier"], row["_id"]["signal"], row["n"]
+        entry = totals.setdefault(carrier, {
+            "count": 0, "sum": 0, "sum_sq": 0, "min": signal, "max": signal, "hist": {},
+        })
+        entry["count"] += n
+        entry["sum"] += signal * n
+        entry["sum_sq"] += signal * signal * n
+        entry["min"] = min(entry["min"], signal)
+        entry["max"] = max(entry["max"], signal)
+        entry["hist"][str(signal)] = n
+
+    if totals:
+        await targets.report_stats.insert_many([
+            {
+                "_id": carrier,
+                "count": t["count"],
+                "signal_sum": t["sum"],
+                "signal_sum_sq": t["sum_sq"],
+                "signal_min": t["min"],
+                "signal_max": t["max"],
+                "hist": t["hist"],
+            }
+            for carrier, t in totals.items()
+        ])
+    return sum(t["count"] for t in totals.values())
+
+
+async def rebuild_report_stats(db: AsyncIOMotorDatabase) -> int:
+    """Recompute the counters from db.reports and swap them in"""
+    projection = {"_id": 0, "carrier": 1, "signal_strength": 1}
+    return await rebuild_view(db, ["report_stats"], record_reports, projection, bulk=_group_reports)
+
+
+async def ensure_report_stats(db: AsyncIOMotorDatabase):
+    """Build the counters once if they are missing but reports exist"""
+    if await db.report_stats.estimated_document_count() > 0:
+        return
+    if await db.reports.estimated_document_count() == 0:
+        return
+    counted = await rebuild_report_stats(db)
+    print(f"[OK] Rebuilt report stats from {counted} reports")
+
+
+def histogram_percentiles(hist: Dict[str, int], percentiles=PERCENTILES) -> Dict[str, int]:
+    """Nearest-rank percentiles from a {dBm: count} histogram"""
+    values = sorted((int(k), n) for k, n in hist.items() if n > 0)
+    total = sum(n for _, n in values)
+    result = {}
+    if not total:
+        return result
+    for p in percentiles:
+        rank = max(1, math.ceil(p / 100 * total))
+        seen = 0
+        for value, n in values:
+            seen += n
+            if seen >= rank:
+                result[f"p{p}"] = value
+                break
+    return result
+
+
+def summarize(doc: dict) -> dict:
+    """Public view of one report_stats document"""
+    count = doc.get("count", 0)
+    if not count:
+        return {"count": 0}
+    mean = doc["signal_sum"] / count
+    variance = max(doc["signal_sum_sq"] / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "mean": round(mean, 2),
+        "stddev": round(math.sqrt(variance), 2),
+        "min": doc.get("signal_min"),
+        "max": doc.get("signal_max"),
+        **histogram_percentiles(doc.get("hist", {})),
+    }
+
+
+async def load_report_stats(db: AsyncIOMotorDatabase) -> Dict[str, dict]:
+    docs = await db.report_stats.find({}).to_list(length=None)
+    return {doc["_id"]: summarize(doc) for doc in docs}
+
+
+async def _main():
+    from ..database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        async with views_lock(db):
+            counted = await rebuild_report_stats(db)
+        print(f"✅ Rebuilt report stats from {counted} reports")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
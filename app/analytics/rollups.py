@@ -0,0 +1,184 @@
+"""
+Time-bucketed report rollups for the by-zip and by-carrier endpoints.
+
+`db.report_rollups` holds one document per (dimension, key, UTC day):
+
+    {"_id": "zip|10001|2026-10-17", "dim": "zip", "key": "10001",
+     "bucket": <day start>, "count": 12, "signal_sum": -1020,
+     "signal_min": -101, "signal_max": -70,
+     "carriers": {"Verizon": {"count": 7, "signal_sum": -590}, ...}}
+
+Inserts `$inc` the matching buckets, and reads only touch the buckets inside
+the requested window - never the raw reports.
+
+Rebuild from scratch with:
+    python -m app.analytics.rollups
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from .rebuild import rebuild_view, views_lock
+from .regions import get_zip_lookup
+
+DIMENSIONS = ("zip", "carrier")
+
+
+def bucket_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def carrier_field(carrier: str) -> str:
+    # Mongo field names can't contain '.' or start with '$'
+    return carrier.replace(".", "_").replace("$", "_")
+
+
+def _fold(docs: List[dict]) -> Dict[tuple, dict]:
+    regions = get_zip_lookup().regions_for([d["lat"] for d in docs], [d["lng"] for d in docs])
+    buckets = {}
+    for doc, region in zip(docs, regions):
+        day = bucket_start(doc.get("timestamp") or datetime.utcnow())
+        signal = int(doc["signal_strength"])
+        keys = {"zip": region, "carrier": doc["carrier"]}
+        for dim in DIMENSIONS:
+            entry = buckets.get((dim, keys[dim], day))
+            if entry is None:
+                entry = buckets[(dim, keys[dim], day)] = {
+                    "count": 0, "sum": 0, "min": signal, "max": signal, "carriers": {},
+                }
+            entry["count"] += 1
+            entry["sum"] += signal
+            entry["min"] = min(entry["min"], signal)
+            entry["max"] = max(entry["max"], signal)
+            if dim == "zip":
+                per_carrier = entry["carriers"].setdefault(carrier_field(doc["carrier"]), [0, 0])
+                per_carrier[0] += 1
+                per_carrier[1] += signal
+    return buckets
+
+
+def _updates(buckets: Dict[tuple, dict]) -> List[UpdateOne]:
+    updates = []
+    for (dim, key, day), entry in buckets.items():
+        inc = {"count": entry["count"], "signal_sum": entry["sum"]}
+        for carrier, (count, total) in entry["carriers"].items():
+            inc[f"carriers.{carrier}.count"] = count
+            inc[f"carriers.{carrier}.signal_sum"] = total
+        updates.append(UpdateOne(
+            {"_id": f"{dim}|{key}|{day:%Y-%m-%d}"},
+            {
+                "$inc": inc,
+                "$min": {"signal_min": entry["min"]},
+                "$max": {"signal_max": entry["max"]},
+                "$setOnInsert": {"dim": dim, "key": key, "bucket": day},
+            },
+            upsert=True,
+        ))
+    return updates
+
+
+async def record_rollups(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Add freshly inserted reports to their day buckets"""
+    updates = _updates(_fold(docs))
+    if updates:
+        await db.report_rollups.bulk_write(updates, ordered=False)
+
+
+async def rebuild_rollups(db: AsyncIOMotorDatabase) -> int:
+    """Recompute every bucket by streaming db.reports once, then swap them in"""
+    projection = {"_id": 0, "lat": 1, "lng": 1, "carrier": 1, "signal_strength": 1, "timestamp": 1}
+    return await rebuild_view(db, ["report_rollups"], record_rollups, projection)
+
+
+async def ensure_rollups(db: AsyncIOMotorDatabase):
+    """Build the rollups once if they are missing but reports exist"""
+    if await db.report_rollups.estimated_document_count() > 0:
+        return
+    if await db.reports.estimated_document_count() == 0:
+        return
+    counted = await rebuild_rollups(db)
+    print(f"[OK] Rebuilt report rollups from {counted} reports")
+
+
+def _window(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    bucket = {}
+    if start:
+        bucket["$gte"] = bucket_start(start)
+    if end:
+        # Buckets are whole days, so a partial end day is included
+        bucket["$lt"] = bucket_start(end) + timedelta(days=1)
+    return bucket
+
+
+def is_whole_days(start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """Whether the day buckets read for [start, end] cover exactly that window"""
+    if start and start.time() != datetime.min.time():
+        return False
+    # A given end day is always included whole
+    return end is None
+
+
+def _summary(count: int, total: int) -> dict:
+    return {"count": count, "mean_signal": round(total / count, 2) if count else None}
+
+
+async def query_rollups(db: AsyncIOMotorDatabase, dim: str,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        key: Optional[str] = None) -> List[dict]:
+    """Merge the day buckets of one dimension inside [start, end]"""
+    match = {"dim": dim}
+    window = _window(start, end)
+    if window:
+        match["bucket"] = window
+    if key:
+        match["key"] = key
+
+    merged = {}
+    async for doc in db.report_rollups.find(match, {"_id": 0, "bucket": 0, "dim": 0}):
+        entry = merged.get(doc["key"])
+        if entry is None:
+            entry = merged[doc["key"]] = {
+                "count": 0, "signal_sum": 0,
+                "signal_min": doc["signal_min"], "signal_max": doc["signal_max"], "carriers": {},
+            }
+        entry["count"] += doc["count"]
+        entry["signal_sum"] += doc["signal_sum"]
+        entry["signal_min"] = min(entry["signal_min"], doc["signal_min"])
+        entry["signal_max"] = max(entry["signal_max"], doc["signal_max"])
+        for carrier, c in doc.get("carriers", {}).items():
+            totals = entry["carriers"].setdefault(carrier, [0, 0])
+            totals[0] += c["count"]
+            totals[1] += c["signal_sum"]
+
+    results = []
+    for key_value, entry in merged.items():
+        result = {
+            dim: key_value,
+            **_summary(entry["count"], entry["signal_sum"]),
+            "min_signal": entry["signal_min"],
+            "max_signal": entry["signal_max"],
+        }
+        if entry["carriers"]:
+            result["carriers"] = {c: _summary(n, total) for c, (n, total) in entry["carriers"].items()}
+        results.append(result)
+    results.sort(key=lambda r: r["count"], reverse=True)
+    return results
+
+
+async def _main():
+    from ..database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        async with views_lock(db):
+            counted = await rebuild_rollups(db)
+        print(f"✅ Rebuilt report rollups from {counted} reports")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,300 @@
+"""
+Downsampled report tiers, maintained when REPORT_STORAGE=timeseries.
+
+`db.report_tiers_hourly` and `db.report_tiers_daily` hold one document per
+(carrier, geohash cell, UTC hour / day):
+
+    {"_id": "Verizon|dr5ru|2026-10-17T13", "carrier": "Verizon", "cell": "dr5ru",
+     "lat": 40.74, "lng": -73.98, "bucket": <hour start>, "count": 12,
+     "signal_sum": -1020, "signal_min": -101, "signal_max": -70,
+     "hist": {"-85": 3, "-84": 1, ...}}
+
+Inserts `$inc` both tiers, like the rollups. Raw reports expire after
+REPORT_RAW_RETENTION_DAYS and hourly buckets after
+REPORT_HOURLY_RETENTION_DAYS; daily buckets are kept.
+
+choose_resolution() picks the coarsest source that answers a [start, end)
+window exactly: the first tier whose bucket size divides both bounds and
+whose retention still covers start, else the raw reports if they still
+cover it. A tier only knows the center of each cell, so a bbox is matched
+on cell centers and only raw reports answer it exactly. When no source is
+exact (e.g. start is older than the raw retention), the finest one whose
+retention covers start answers, flagged approximate: its buckets overlap
+the window rather than fit it. Summaries are computed from the per-dBm
+histograms, so for an exact source count/mean/min/max/percentiles are
+the same whichever one answers.
+
+Rebuild from scratch with:
+    python -m app.analytics.tiers [--source reports_legacy]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from ..config import settings
+from ..report_query import report_filter
+from ..report_storage import ensure_tier_retention, timeseries_enabled
+from ..utils import geocell
+from .rebuild import rebuild_view, views_lock
+from .report_stats import histogram_percentiles
+
+CELL_PRECISION = 5  # ~4.9 x 4.9 km
+
+
+class Tier(NamedTuple):
+    name: str
+    collection: str
+    step: timedelta
+
+
+# Coarsest first
+TIERS = (
+    Tier("day", "report_tiers_daily", timedelta(days=1)),
+    Tier("hour", "report_tiers_hourly", timedelta(hours=1)),
+)
+TIERS_BY_NAME = {tier.name: tier for tier in TIERS}
+RESOLUTIONS = ("raw",) + tuple(TIERS_BY_NAME)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def retention(resolution: str) -> Optional[timedelta]:
+    """How far back a source is complete (None = forever)"""
+    days = {
+        "raw": settings.REPORT_RAW_RETENTION_DAYS,
+        "hour": settings.REPORT_HOURLY_RETENTION_DAYS,
+    }.get(resolution, 0)
+    return timedelta(days=days) if days else None
+
+
+def naive_utc(ts: datetime) -> datetime:
+    """Stored timestamps are naive UTC; query parameters may carry an offset"""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def floor_to(ts: datetime, step: timedelta) -> datetime:
+    ts = naive_utc(ts)
+    return ts - (ts - _EPOCH) % step
+
+
+def ceil_to(ts: datetime, step: timedelta) -> datetime:
+    ts = naive_utc(ts)
+    floored = floor_to(ts, step)
+    return floored if floored == ts else floored + step
+
+
+def covers(resolution: str, start: Optional[datetime], now: datetime) -> bool:
+    """Whether the source still holds everything from start on"""
+    kept = retention(resolution)
+    return kept is None or (start is not None and naive_utc(start) >= now - kept)
+
+
+def is_exact(resolution: str, start: Optional[datetime], end: Optional[datetime],
+             bbox: Optional[Tuple[float, float, float, float]] = None,
+             now: Optional[datetime] = None) -> bool:
+    """Whether the source answers [start, end) within bbox exactly"""
+    if not covers(resolution, start, now or datetime.utcnow()):
+        return False
+    if resolution == "raw":
+        return True
+    step = TIERS_BY_NAME[resolution].step
+    return bbox is None and all(ts is None or floor_to(ts, step) == naive_utc(ts) for ts in (start, end))
+
+
+def choose_resolution(start: Optional[datetime], end: Optional[datetime],
+                      bbox: Optional[Tuple[float, float, float, float]] = None,
+                      now: Optional[datetime] = None) -> Tuple[str, bool]:
+    """(resolution, exact): the coarsest exact source, else the finest that covers start"""
+    now = now or datetime.utcnow()
+    for resolution in tuple(TIERS_BY_NAME) + ("raw",):
+        if is_exact(resolution, start, end, bbox, now):
+            return resolution, True
+    for resolution in ("raw",) + tuple(tier.name for tier in reversed(TIERS)):
+        if covers(resolution, start, now):
+            return resolution, False
+    return TIERS[0].name, False
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+def _fold(docs: List[dict]) -> Dict[tuple, dict]:
+    """(tier, carrier, cell, bucket) -> partial sums and histogram"""
+    buckets = {}
+    centers: Dict[str, Tuple[float, float]] = {}
+    for doc in docs:
+        cell = geocell.encode(doc["lat"], doc["lng"], CELL_PRECISION)
+        if cell not in centers:
+            min_lat, min_lng, max_lat, max_lng = geocell.bounds(cell)
+            centers[cell] = (round((min_lat + max_lat) / 2, 6), round((min_lng + max_lng) / 2, 6))
+        signal = int(doc["signal_strength"])
+        timestamp = doc.get("timestamp") or datetime.utcnow()
+        for tier in TIERS:
+            key = (tier, doc["carrier"], cell, floor_to(timestamp, tier.step))
+            entry = buckets.get(key)
+            if entry is None:
+                entry = buckets[key] = {"count": 0, "sum": 0, "min": signal, "max": signal, "hist": {},
+                                        "center": centers[cell]}
+            entry["count"] += 1
+            entry["sum"] += signal
+            entry["min"] = min(entry["min"], signal)
+            entry["max"] = max(entry["max"], signal)
+            entry["hist"][str(signal)] = entry["hist"].get(str(signal), 0) + 1
+    return buckets
+
+
+def _updates(buckets: Dict[tuple, dict]) -> Dict[str, List[UpdateOne]]:
+    updates: Dict[str, List[UpdateOne]] = {tier.collection: [] for tier in TIERS}
+    for (tier, carrier, cell, bucket), entry in buckets.items():
+        inc = {"count": entry["count"], "signal_sum": entry["sum"]}
+        for value, n in entry["hist"].items():
+            inc[f"hist.{value}"] = n
+        lat, lng = entry["center"]
+        updates[tier.collection].append(UpdateOne(
+            {"_id": f"{carrier}|{cell}|{bucket:%Y-%m-%dT%H}"},
+            {
+                "$inc": inc,
+                "$min": {"signal_min": entry["min"]},
+                "$max": {"signal_max": entry["max"]},
+                "$setOnInsert": {"carrier": carrier, "cell": cell, "lat": lat, "lng": lng, "bucket": bucket},
+            },
+            upsert=True,
+        ))
+    return updates
+
+
+async def record_report_tiers(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Add freshly inserted reports to their hourly and daily buckets"""
+    for collection, updates in _updates(_fold(docs)).items():
+        if updates:
+            await db[collection].bulk_write(updates, ordered=False)
+
+
+async def rebuild_report_tiers(db: AsyncIOMotorDatabase, source: str = "reports") -> int:
+    """
+    Recompute every bucket by streaming `source` once, then swap them in.
+    Raw reports past their retention are gone, so after a migration rebuild
+    from the legacy collection to keep the older history.
+    """
+    projection = {"_id": 0, "lat": 1, "lng": 1, "carrier": 1, "signal_strength": 1, "timestamp": 1}
+    counted = await rebuild_view(db, [tier.collection for tier in TIERS], record_report_tiers, projection, source)
+    if timeseries_enabled():
+        # The renamed collection brought no TTL index along
+        await ensure_tier_retention(db)
+    return counted
+
+
+async def ensure_report_tiers(db: AsyncIOMotorDatabase):
+    """Build the tiers once if they are missing but reports exist"""
+    if await db.report_tiers_daily.estimated_document_count() > 0:
+        return
+    if await db.reports.estimated_document_count() == 0:
+        return
+    counted = await rebuild_report_tiers(db)
+    print(f"[OK] Rebuilt report tiers from {counted} reports")
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def summarize_histogram(hist: Dict[str, int]) -> dict:
+    """count / mean / min / max / percentiles of a {dBm: count} histogram"""
+    values = {int(k): n for k, n in hist.items() if n}
+    count = sum(values.values())
+    if not count:
+        return {"count": 0}
+    return {
+        "count": count,
+        "mean_signal": round(sum(v * n for v, n in values.items()) / count, 2),
+        "min_signal": min(values),
+        "max_signal": max(values),
+        **histogram_percentiles(hist),
+    }
+
+
+def tier_filter(tier: Tier, carrier: Optional[str] = None, start: Optional[datetime] = None,
+                end: Optional[datetime] = None,
+                bbox: Optional[Tuple[float, float, float, float]] = None) -> dict:
+    """Buckets overlapping [start, end) whose cell center lies inside bbox (approximate for bbox)"""
+    query = {}
+    if carrier:
+        query["carrier"] = carrier
+    if start or end:
+        query["bucket"] = {}
+        if start:
+            query["bucket"]["$gte"] = floor_to(start, tier.step)
+        if end:
+            query["bucket"]["$lt"] = ceil_to(end, tier.step)
+    if bbox:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        query["lat"] = {"$gte": min_lat, "$lte": max_lat}
+        query["lng"] = {"$gte": min_lng, "$lte": max_lng}
+    return query
+
+
+async def signal_by_carrier(db: AsyncIOMotorDatabase, resolution: str, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, carrier: Optional[str] = None,
+                            bbox: Optional[Tuple[float, float, float, float]] = None) -> List[dict]:
+    """Per-carrier signal summary from a tier or the raw reports, busiest first"""
+    if resolution == "raw":
+        pipeline = [
+            {"$match": report_filter(carrier, start, end, bbox)},
+            {"$group": {"_id": {"c": "$carrier", "v": "$signal_strength"}, "n": {"$sum": 1}}},
+        ]
+        collection = db.reports
+    else:
+        # Merge the histograms server-side: one row per (carrier, dBm value)
+        pipeline = [
+            {"$match": tier_filter(TIERS_BY_NAME[resolution], carrier, start, end, bbox)},
+            {"$project": {"carrier": 1, "hist": {"$objectToArray": "$hist"}}},
+            {"$unwind": "$hist"},
+            {"$group": {"_id": {"c": "$carrier", "v": "$hist.k"}, "n": {"$sum": "$hist.v"}}},
+        ]
+        collection = db[TIERS_BY_NAME[resolution].collection]
+
+    hists: Dict[str, Dict[str, int]] = {}
+    async for row in collection.aggregate(pipeline):
+        hist = hists.setdefault(row["_id"]["c"], {})
+        value = str(int(row["_id"]["v"]))
+        hist[value] = hist.get(value, 0) + row["n"]
+
+    results = [{"carrier": name, **summarize_histogram(hist)} for name, hist in hists.items()]
+    results.sort(key=lambda r: r["count"], reverse=True)
+    return results
+
+
+def tier_row(doc: dict) -> dict:
+    """Public view of one tier bucket"""
+    return {
+        "_id": doc["_id"],
+        "carrier": doc["carrier"],
+        "cell": doc["cell"],
+        "lat": doc["lat"],
+        "lng": doc["lng"],
+        "bucket": doc["bucket"],
+        **summarize_histogram(doc.get("hist", {})),
+    }
+
+
+async def _main(args):
+    from ..database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        async with views_lock(db):
+            counted = await rebuild_report_tiers(db, args.source)
+        print(f"✅ Rebuilt report tiers from {counted} reports in {args.source}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the hourly/daily report tiers")
+    parser.add_argument("--source", default="reports", help="collection to read reports from")
+    asyncio.run(_main(parser.parse_args()))
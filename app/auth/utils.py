@@ -1,11 +1,28 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+import asyncio
+import hashlib
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from typing import Optional
 from ..config import settings
+from ..instrumentation import record_password_hash
+from ..metrics import Counter, Gauge
+from ..utils.cache import TTLCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bearer_scheme = HTTPBearer()
+
+# passlib (and its bcrypt backend) and jose are imported on first use, which
+# keeps them off the import path of a cold start
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def get_password_hash(password: str) -> str:
     # bcrypt only allows up to 72 bytes — safely truncate
@@ -16,7 +33,7 @@ def get_password_hash(password: str) -> str:
     password_bytes = password_bytes[:72]  # hard limit for bcrypt
     password = password_bytes.decode("utf-8", errors="ignore")
 
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     if isinstance(plain_password, bytes):
@@ -26,7 +43,87 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     plain_password_bytes = plain_password_bytes[:72]
     plain_password = plain_password_bytes.decode("utf-8", errors="ignore")
 
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a bounded worker pool so it never blocks the event loop.
+
+    At most `workers` hashes run at once; up to `max_queue` more wait for a
+    slot and anything beyond that is rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int, kind: str = "thread"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self.executor: Optional[Executor] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.in_flight = 0
+
+    def _ensure_started(self):
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self.semaphore = asyncio.Semaphore(self.workers)
+
+    async def run(self, fn, *args):
+        self._ensure_started()
+        if self.queued >= self.max_queue and self.semaphore.locked():
+            hash_rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests in progress",
+                headers={"Retry-After": "1"},
+            )
+
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        hash_wait_seconds.inc(time.perf_counter() - enqueued_at)
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            hash_completed.inc()
+            record_password_hash(time.perf_counter() - enqueued_at)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.semaphore = None
+
+
+password_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+)
+
+hash_completed = Counter("password_hash_completed_total", "bcrypt hash/verify calls completed")
+hash_rejected = Counter("password_hash_rejected_total", "bcrypt calls rejected because the queue was full")
+hash_wait_seconds = Counter("password_hash_queue_wait_seconds_total", "Time spent waiting for a bcrypt worker")
+Gauge("password_hash_queue_depth", "bcrypt calls waiting for a worker", fn=lambda: password_pool.queued)
+Gauge("password_hash_in_flight", "bcrypt calls currently running", fn=lambda: password_pool.in_flight)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -35,10 +132,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+def _decode_token(token: str):
+    """Validate signature and claims; returns (user_id, exp as epoch seconds)"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: str = payload.get("sub")
@@ -48,9 +148,36 @@ def verify_token(token: str):
                 detail="Invalid authentication credentials"
             )
         # Return string for MongoDB ObjectId
-        return str(user_id)
+        return str(user_id), payload.get("exp")
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
+
+# Decoded tokens keyed by SHA-256 of the raw token, so clients that resend the
+# same long-lived token skip jwt.decode. Entries never outlive the token's exp.
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+
+token_cache_hits = Counter("token_cache_hits_total", "Bearer tokens served from the decode cache")
+token_cache_misses = Counter("token_cache_misses_total", "Bearer tokens that had to be decoded")
+Gauge("token_cache_size", "Decoded tokens currently cached", fn=lambda: len(token_cache))
+
+def verify_token(token: str):
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    user_id = token_cache.get(key)
+    if user_id is not None:
+        token_cache_hits.inc()
+        return user_id
+
+    token_cache_misses.inc()
+    user_id, exp = _decode_token(token)
+    if exp is not None:
+        token_cache.set(key, user_id, ttl=float(exp) - time.time())
+    return user_id
+
+async def get_current_user_id(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+) -> str:
+    """Dependency for protected routes - returns the authenticated user id"""
+    return verify_token(credentials.credentials)
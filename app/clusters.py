@@ -0,0 +1,275 @@
+"""
+Zoom-aware tower and report clusters for the map.
+
+Both layers share one hierarchy of grids: the cells of level L are the
+slippy-map tiles of zoom L, for L in CLUSTER_LEVELS. A request at zoom z
+reads level z + CLUSTER_ZOOM_OFFSET (cells roughly 64 px across on screen)
+and falls back to coarser levels until the bbox spans at most
+CLUSTER_MAX_CELLS cells, so the response is bounded by screen area and not
+by how much data sits underneath.
+
+Reports: `db.report_clusters` holds one document per (level, cell):
+
+    {"_id": "8|75|96", "z": 8, "x": 75, "y": 96,
+     "carriers": {"Verizon": {"count": 70, "lat_sum": ..., "lng_sum": ...,
+                              "signal_sum": -5200, "signal_min": -112}, ...}}
+
+Only CLUSTER_BASE_LEVELS are stored: inserts `$inc` one cell per base
+level from on_reports_inserted, like the rollups. A level in between is
+read from the next finer base level, merging its 2^d x 2^d cells into one
+(x >> d, y >> d); reads only touch the cells inside the bbox.
+
+Towers: aggregated per level from the in-memory tower index on first use
+and kept until the index reloads.
+
+Rebuild the report cells from scratch with:
+    python -m app.clusters
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from .analytics.rebuild import rebuild_view, views_lock
+from .analytics.rollups import carrier_field
+from .config import settings
+from .tower_index import TowerIndex
+from .utils.tiles import point_tiles
+
+CLUSTER_LEVELS = (2, 4, 6, 8, 10, 12, 14, 16)
+CLUSTER_BASE_LEVELS = (4, 8, 12, 16)
+
+Bbox = Tuple[float, float, float, float]
+
+
+def cell_range(bbox: Bbox, level: int) -> Tuple[int, int, int, int]:
+    """(min_x, min_y, max_x, max_y) of the level's cells covering bbox"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    xs, ys = point_tiles([max_lat, min_lat], [min_lng, max_lng], level)
+    return int(xs[0]), int(ys[0]), int(xs[1]), int(ys[1])
+
+
+def choose_level(bbox: Bbox, zoom: int) -> int:
+    target = zoom + settings.CLUSTER_ZOOM_OFFSET
+    candidates = [level for level in CLUSTER_LEVELS if level <= target] or [CLUSTER_LEVELS[0]]
+    for level in reversed(candidates):
+        min_x, min_y, max_x, max_y = cell_range(bbox, level)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= settings.CLUSTER_MAX_CELLS:
+            return level
+    return candidates[0]
+
+
+def base_level(level: int) -> int:
+    """The stored level a level's report cells are merged from"""
+    return min(base for base in CLUSTER_BASE_LEVELS if base >= level)
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def _fold(docs: List[dict]) -> Dict[tuple, dict]:
+    """(level, x, y, carrier) -> partial sums for a batch of reports"""
+    lats = np.array([d["lat"] for d in docs], dtype=np.float64)
+    lngs = np.array([d["lng"] for d in docs], dtype=np.float64)
+    signals = np.array([int(d["signal_strength"]) for d in docs], dtype=np.int64)
+    carriers, carrier_codes = np.unique([carrier_field(d["carrier"]) for d in docs], return_inverse=True)
+    cells = {}
+    for level in CLUSTER_BASE_LEVELS:
+        side = 2 ** level
+        xs, ys = point_tiles(lats, lngs, level)
+        keys, inverse = np.unique((xs * side + ys) * len(carriers) + carrier_codes, return_inverse=True)
+        counts = np.bincount(inverse)
+        lat_sums = np.bincount(inverse, weights=lats)
+        lng_sums = np.bincount(inverse, weights=lngs)
+        signal_sums = np.bincount(inverse, weights=signals)
+        signal_mins = np.full(len(keys), np.iinfo(np.int64).max)
+        np.minimum.at(signal_mins, inverse, signals)
+        cell_keys, carrier_idx = np.divmod(keys, len(carriers))
+        for cell, c, n, lat, lng, total, low in zip(
+                cell_keys.tolist(), carrier_idx.tolist(), counts.tolist(), lat_sums.tolist(),
+                lng_sums.tolist(), signal_sums.tolist(), signal_mins.tolist()):
+            cells[(level, cell // side, cell % side, str(carriers[c]))] = {
+                "count": n, "lat_sum": lat, "lng_sum": lng, "signal_sum": int(total), "signal_min": low,
+            }
+    return cells
+
+
+def _updates(cells: Dict[tuple, dict]) -> List[UpdateOne]:
+    by_cell: Dict[tuple, dict] = {}
+    for (level, x, y, carrier), entry in cells.items():
+        update = by_cell.setdefault((level, x, y), {"$inc": {}, "$min": {}})
+        prefix = f"carriers.{carrier}."
+        for field in ("count", "lat_sum", "lng_sum", "signal_sum"):
+            update["$inc"][prefix + field] = entry[field]
+        update["$min"][prefix + "signal_min"] = entry["signal_min"]
+    return [
+        UpdateOne({"_id": f"{level}|{x}|{y}"},
+                  {**update, "$setOnInsert": {"z": level, "x": x, "y": y}}, upsert=True)
+        for (level, x, y), update in by_cell.items()
+    ]
+
+
+async def record_report_clusters(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Add freshly inserted reports to their cell at every base level"""
+    if docs:
+        await db.report_clusters.bulk_write(_updates(_fold(docs)), ordered=False)
+
+
+async def rebuild_report_clusters(db: AsyncIOMotorDatabase) -> int:
+    """Recompute every cell by streaming db.reports once, then swap them in"""
+    projection = {"_id": 0, "lat": 1, "lng": 1, "carrier": 1, "signal_strength": 1}
+    return await rebuild_view(db, ["report_clusters"], record_report_clusters, projection)
+
+
+async def ensure_report_clusters(db: AsyncIOMotorDatabase):
+    """Build the cells once if they are missing, or stored at other levels, but reports exist"""
+    if await db.report_clusters.estimated_document_count() > 0:
+        if await db.report_clusters.find_one({"z": {"$nin": list(CLUSTER_BASE_LEVELS)}}, {"_id": 1}) is None:
+            return
+    if await db.reports.estimated_document_count() == 0:
+        return
+    counted = await rebuild_report_clusters(db)
+    print(f"[OK] Rebuilt report clusters from {counted} reports")
+
+
+async def report_clusters(db: AsyncIOMotorDatabase, bbox: Bbox, zoom: int,
+                          carrier: Optional[str] = None) -> dict:
+    level = choose_level(bbox, zoom)
+    base = base_level(level)
+    shift = base - level
+    min_x, min_y, max_x, max_y = cell_range(bbox, level)
+    query = {
+        "z": base,
+        "x": {"$gte": min_x << shift, "$lt": (max_x + 1) << shift},
+        "y": {"$gte": min_y << shift, "$lt": (max_y + 1) << shift},
+    }
+    projection = {"_id": 0, "x": 1, "y": 1, "carriers": 1}
+    if carrier:
+        field = carrier_field(carrier)
+        query[f"carriers.{field}"] = {"$exists": True}
+        projection = {"_id": 0, "x": 1, "y": 1, f"carriers.{field}": 1}
+
+    # (x, y) at `level` -> carrier -> sums merged from the base cells
+    cells: Dict[Tuple[int, int], Dict[str, dict]] = {}
+    async for doc in db.report_clusters.find(query, projection):
+        merged = cells.setdefault((doc["x"] >> shift, doc["y"] >> shift), {})
+        for name, c in doc.get("carriers", {}).items():
+            into = merged.get(name)
+            if into is None:
+                merged[name] = dict(c)
+                continue
+            for key in ("count", "lat_sum", "lng_sum", "signal_sum"):
+                into[key] += c[key]
+            into["signal_min"] = min(into["signal_min"], c["signal_min"])
+
+    clusters = []
+    total = 0
+    for merged in cells.values():
+        count = lat_sum = lng_sum = 0
+        carriers = {}
+        for name, c in merged.items():
+            count += c["count"]
+            lat_sum += c["lat_sum"]
+            lng_sum += c["lng_sum"]
+            carriers[name] = {
+                "count": c["count"],
+                "mean_signal": round(c["signal_sum"] / c["count"], 2),
+                "min_signal": c["signal_min"],
+            }
+        if not count:
+            continue
+        total += count
+        clusters.append({
+            "lat": round(lat_sum / count, 6),
+            "lng": round(lng_sum / count, 6),
+            "count": count,
+            "carriers": carriers,
+        })
+    return {"zoom": zoom, "level": level, "total": total, "clusters": clusters}
+
+
+# ---------------------------------------------------------------------------
+# Towers
+# ---------------------------------------------------------------------------
+
+class TowerLevel:
+    """Per-cell tower counts and coordinate sums for one level, by operator"""
+
+    def __init__(self, index: TowerIndex, level: int):
+        arrays = index.arrays
+        self.operators, operator_codes = np.unique(arrays.operators.astype(str), return_inverse=True)
+        xs, ys = point_tiles(arrays.lats, arrays.lngs, level)
+        keys, cell_codes = np.unique(xs * (2 ** level) + ys, return_inverse=True)
+        self.xs, self.ys = keys // (2 ** level), keys % (2 ** level)
+
+        # (cells, operators) matrices
+        shape = (len(keys), len(self.operators))
+        flat = cell_codes * len(self.operators) + operator_codes
+        size = shape[0] * shape[1]
+        self.counts = np.bincount(flat, minlength=size).reshape(shape)
+        self.lat_sums = np.bincount(flat, weights=arrays.lats, minlength=size).reshape(shape)
+        self.lng_sums = np.bincount(flat, weights=arrays.lngs, minlength=size).reshape(shape)
+
+    def query(self, bbox: Bbox, level: int, operator: Optional[str]) -> List[dict]:
+        min_x, min_y, max_x, max_y = cell_range(bbox, level)
+        cells = np.nonzero((self.xs >= min_x) & (self.xs <= max_x) & (self.ys >= min_y) & (self.ys <= max_y))[0]
+        counts, lat_sums, lng_sums = self.counts[cells], self.lat_sums[cells], self.lng_sums[cells]
+        if operator and operator != "All":
+            keep = self.operators == operator
+            counts, lat_sums, lng_sums = counts[:, keep], lat_sums[:, keep], lng_sums[:, keep]
+
+        totals = counts.sum(axis=1)
+        nonempty = totals > 0
+        totals = totals[nonempty]
+        counts = counts[nonempty]
+        lats = lat_sums[nonempty].sum(axis=1) / totals
+        lngs = lng_sums[nonempty].sum(axis=1) / totals
+        operators = self.operators.tolist() if not operator or operator == "All" else [operator]
+        return [
+            {
+                "lat": round(lat, 6),
+                "lng": round(lng, 6),
+                "count": total,
+                "operators": {name: n for name, n in zip(operators, row) if n},
+            }
+            for lat, lng, total, row in zip(lats.tolist(), lngs.tolist(), totals.tolist(), counts.tolist())
+        ]
+
+
+class TowerClusters:
+    """TowerLevels of the current tower index; dropped when the index is replaced"""
+
+    def __init__(self):
+        self.index: Optional[TowerIndex] = None
+        self.levels: Dict[int, TowerLevel] = {}
+
+    def get(self, index: TowerIndex, bbox: Bbox, zoom: int, operator: Optional[str] = None) -> dict:
+        if index is not self.index:
+            self.index, self.levels = index, {}
+        level = choose_level(bbox, zoom)
+        if level not in self.levels:
+            self.levels[level] = TowerLevel(index, level)
+        clusters = self.levels[level].query(bbox, level, operator)
+        return {"zoom": zoom, "level": level, "total": sum(c["count"] for c in clusters), "clusters": clusters}
+
+
+tower_clusters = TowerClusters()
+
+
+async def _main():
+    from .database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        async with views_lock(db):
+            counted = await rebuild_report_clusters(db)
+        print(f"✅ Rebuilt report clusters from {counted} reports")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,46 +1,171 @@
-import os
 import json
 from pydantic_settings import BaseSettings
 from typing import List
 
+DEFAULT_CORS_ORIGINS = (
+    "http://localhost:5173",
+    "http://localhost:5174",
+    "https://signal-scope-psi.vercel.app",
+)
+
 class Settings(BaseSettings):
     DATABASE_URL: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "signalscope"
     SECRET_KEY: str = "your-super-secret-key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080
+
+    # Worker processes for `python -m app.serve` (0 = one per available CPU)
+    WEB_CONCURRENCY: int = 0
+
+    # MongoDB connection pool (per worker process)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 0  # 0 = keep idle connections
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 0  # 0 = wait for a connection indefinitely
+    MONGO_COMPRESSORS: str = ""  # e.g. "zstd,snappy,zlib" (zstd/snappy need extra packages)
+    # primary, primaryPreferred, secondary, secondaryPreferred or nearest
+    MONGO_READ_PREFERENCE: str = "primary"
+    # Analytics, tile and export reads. Stays on the primary by default: a
+    # lagging secondary read right after an invalidation would be cached
+    # under the new generation and served until the next write
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "primary"
+    # Bound on secondary lag for non-primary analytics reads (0 = unbounded, else >= 90)
+    MONGO_ANALYTICS_MAX_STALENESS_SECONDS: int = 0
+
+    # Log requests slower than this with a Mongo/bcrypt breakdown (0 = off)
+    SLOW_REQUEST_LOG_MS: int = 1000
+    # Event loop lag sampling interval (0 = off)
+    LOOP_LAG_SAMPLE_MS: int = 500
+
+    # Admission control (app/admission.py): concurrency limits and per-client
+    # token buckets for auth and report ingest; excess requests get 429
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_BACKEND: str = "memory"  # "memory" or "redis" (buckets shared by workers)
+    ADMISSION_REDIS_URL: str = "redis://localhost:6379/0"
+    ADMISSION_AUTH_CONCURRENCY: int = 8
+    ADMISSION_AUTH_QUEUE: int = 32
+    ADMISSION_AUTH_RATE: float = 5.0  # requests/s per client IP
+    ADMISSION_AUTH_BURST: int = 20
+    ADMISSION_INGEST_CONCURRENCY: int = 32
+    ADMISSION_INGEST_QUEUE: int = 128
+    ADMISSION_INGEST_RATE: float = 20.0  # requests/s per user (client IP if unauthenticated)
+    ADMISSION_INGEST_BURST: int = 100
+    ADMISSION_QUEUE_TIMEOUT_MS: int = 2000
+    # Shed auth/ingest outright while the event loop lags this much, so reads stay responsive (0 = off)
+    ADMISSION_SHED_LOOP_LAG_MS: int = 250
+    # Client IP from this header (rightmost entry, as set by the nearest proxy), e.g. "x-forwarded-for"
+    ADMISSION_CLIENT_IP_HEADER: str = ""
+    ADMISSION_MAX_CLIENTS: int = 10000  # token buckets kept per worker (memory backend)
+
+    # Create missing MongoDB indexes on startup (or run `python -m app.indexes`)
+    ENSURE_INDEXES_ON_STARTUP: bool = True
+
+    # Startup: "blocking" (default) connects to MongoDB and builds indexes and
+    # materialized views before accepting connections; "background" accepts
+    # connections immediately and does it in a task (see /readyz)
+    STARTUP_MODE: str = "blocking"
+    STARTUP_RETRY_MAX_SECONDS: float = 30.0  # backoff cap between connect attempts
+
+    # bcrypt worker pool ("thread" or "process")
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Decoded bearer token cache
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 3600
+
+    # Report storage: "standard" or "timeseries" (MongoDB 6.0+ time-series
+    # collection plus hourly/daily tiers, see app/report_storage.py)
+    REPORT_STORAGE: str = "standard"
+    REPORT_TIMESERIES_GRANULARITY: str = "hours"
+    REPORT_RAW_RETENTION_DAYS: int = 90  # raw time-series reports expire after this (0 = keep)
+    REPORT_HOURLY_RETENTION_DAYS: int = 400  # hourly tier buckets expire after this (0 = keep)
+
+    # Single-report writes: "sync" (default) or "write_behind"
+    REPORT_WRITE_MODE: str = "sync"
+    REPORT_QUEUE_MAX_SIZE: int = 10000
+    REPORT_FLUSH_BATCH_SIZE: int = 500
+    REPORT_FLUSH_INTERVAL_MS: int = 50
+    REPORT_ENQUEUE_TIMEOUT_MS: int = 100
+
+    # Bulk report ingestion
+    REPORT_BULK_MAX_ITEMS: int = 50000
+    REPORT_BULK_CHUNK_SIZE: int = 1000
+
+    # Streaming export (/api/reports/export) cursor batch size
+    REPORT_EXPORT_BATCH_SIZE: int = 2000
+
+    # Coverage estimation
+    COVERAGE_MAX_POINTS: int = 20000
+
+    # Coverage heatmap tiles (/api/coverage/tiles/{z}/{x}/{y})
+    COVERAGE_TILE_SIZE: int = 64
+    COVERAGE_TILE_CACHE_SIZE: int = 4096
+    COVERAGE_TILE_TTL_SECONDS: int = 86400
+    COVERAGE_TILE_MAX_REPORTS: int = 20000
+    COVERAGE_TILE_MODEL_WEIGHT: float = 3.0
+
+    # Map clusters (/api/clusters/*): request zoom + offset picks the grid
+    # level; coarser levels are used until the bbox fits in CLUSTER_MAX_CELLS
+    CLUSTER_ZOOM_OFFSET: int = 2
+    CLUSTER_MAX_CELLS: int = 1024
+
+    # Validate report lists against ReportResponse before sending; false
+    # trusts the stored documents and serializes them directly with orjson
+    VALIDATE_LIST_RESPONSES: bool = True
+
+    # Response cache for tower/analytics reads: "memory", "redis" or "off".
+    # memory shares generations between workers on one host through a file
+    # in TOWER_SNAPSHOT_DIR; redis shares entries and generations across hosts
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: int = 300
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # In-memory tower index
+    TOWER_INDEX_CELL_DEG: float = 0.25
+    TOWER_INDEX_REFRESH_SECONDS: int = 60
+    TOWER_INDEX_MAX_AGE_SECONDS: int = 3600
+    # Share the loaded index between workers through an mmap'd file
+    TOWER_SNAPSHOT_ENABLED: bool = True
+    TOWER_SNAPSHOT_DIR: str = ""  # empty = /dev/shm, else the temp dir
+
+    # In-process columnar report snapshot for /api/analytics/reports
+    REPORT_COLUMNS_ENABLED: bool = False
+    REPORT_COLUMNS_SYNC_SECONDS: int = 5
+    REPORT_COLUMNS_MAX_AGE_SECONDS: int = 3600  # full rescan after this
+    # Share the snapshot between workers and restarts through an mmap'd file
+    REPORT_COLUMNS_PERSIST: bool = True
+    REPORT_COLUMNS_DIR: str = ""  # empty = /dev/shm, else the temp dir
+
+    # Region lookup for /api/analytics/by-zip (empty = bundled table)
+    ZIP_CENTROIDS_PATH: str = ""
+    ZIP_MAX_DISTANCE_KM: float = 15.0
     
-    # CORS origins - supports JSON array format or comma-separated values
+    # CORS origins - JSON array or comma-separated values; empty = DEFAULT_CORS_ORIGINS
     cors_origins: str = ""
-    
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Explicitly read CORS_ORIGINS from environment if not set by Pydantic
-        env_cors = os.getenv("CORS_ORIGINS")
-        if env_cors:
-            self.cors_origins = env_cors
-    
+
     @property
     def cors_origins_list(self) -> List[str]:
         """Parse CORS_ORIGINS - supports both JSON array and comma-separated values"""
-        cors_value = os.getenv("CORS_ORIGINS", self.cors_origins).strip()
-        
+        cors_value = self.cors_origins.strip()
         if not cors_value:
-            return []
-        
+            return list(DEFAULT_CORS_ORIGINS)
+
         # Remove outer quotes if present
         if cors_value.startswith('"') and cors_value.endswith('"'):
             cors_value = cors_value[1:-1].replace('\\"', '"')
-        
+
         # Try parsing as JSON array first
         try:
             parsed = json.loads(cors_value)
-            return parsed if isinstance(parsed, list) else [str(parsed)]
+            origins = parsed if isinstance(parsed, list) else [str(parsed)]
         except json.JSONDecodeError:
-            # Not JSON, try comma-separated values
-            if ',' in cors_value:
-                return [origin.strip().strip('"').strip("'") for origin in cors_value.split(',')]
-            return [cors_value]
+            # Not JSON, comma-separated values
+            origins = cors_value.split(',')
+        return [str(o).strip().strip('"').strip("'") for o in origins if str(o).strip()]
 
     class Config:
         env_file = ".env"
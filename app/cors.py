@@ -0,0 +1,95 @@
+"""
+Single pure-ASGI CORS layer.
+
+Allowed origins are resolved once into a frozenset. Preflights are answered
+here without reaching the router, and every header that doesn't depend on
+the request is built once as raw byte tuples. Requests without an Origin
+header pass straight through untouched.
+"""
+from typing import Iterable
+
+ALLOW_METHODS = b"GET, POST, PUT, DELETE, OPTIONS, PATCH, HEAD"
+# Used when a preflight doesn't list the headers it wants
+DEFAULT_ALLOW_HEADERS = b"content-type, authorization, accept, origin, x-requested-with"
+# Response headers the frontend may read
+EXPOSE_HEADERS = (b"x-next-cursor, etag, x-cache, retry-after, content-disposition, "
+                  b"x-tile-size, x-tile-observed-reports")
+MAX_AGE = b"3600"
+
+PREFLIGHT_HEADERS = (
+    (b"access-control-allow-methods", ALLOW_METHODS),
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-max-age", MAX_AGE),
+    (b"vary", b"Origin"),
+    (b"content-length", b"0"),
+)
+SIMPLE_HEADERS = (
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-expose-headers", EXPOSE_HEADERS),
+    (b"vary", b"Origin"),
+)
+# Preflights from other origins get an empty 200 without any CORS header,
+# as before; the browser then refuses the actual request
+REJECTED_HEADERS = (
+    (b"vary", b"Origin"),
+    (b"content-length", b"0"),
+)
+
+
+class CORSMiddleware:
+    def __init__(self, app, origins: Iterable[str]):
+        self.app = app
+        origins = list(origins)
+        self.allow_any = "*" in origins
+        self.origins = frozenset(o.encode("latin-1") for o in origins if o != "*")
+
+    def is_allowed(self, origin: bytes) -> bool:
+        return self.allow_any or origin in self.origins
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self.preflight(origin, request_headers, send)
+            return
+
+        if not self.is_allowed(origin):
+            await self.app(scope, receive, send)
+            return
+
+        allow_origin = ((b"access-control-allow-origin", origin),)
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + list(allow_origin + SIMPLE_HEADERS)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def preflight(self, origin: bytes, request_headers, send):
+        if not self.is_allowed(origin):
+            await send({"type": "http.response.start", "status": 200, "headers": REJECTED_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers = (
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-headers", request_headers or DEFAULT_ALLOW_HEADERS),
+        ) + PREFLIGHT_HEADERS
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,228 @@
+"""
+Coverage heatmap tiles.
+
+A tile is a COVERAGE_TILE_SIZE x COVERAGE_TILE_SIZE grid of estimated dBm
+(int8, row-major from the north-west corner). Each pixel starts from the
+best-server model estimate and is pulled towards the mean of the reports
+observed inside it; the model counts as COVERAGE_TILE_MODEL_WEIGHT reports.
+
+Tiles live in a size-bounded LRU keyed by (operator, z, x, y). New reports
+only evict the tiles that contain them, and a tower index reload only evicts
+tiles within MAX_RANGE_KM of towers that were added, moved or removed.
+Every worker follows tower changes itself, but reports reach only the
+worker that stored them: the others notice the shared "reports" generation
+of the response cache moving and drop all of their tiles.
+"""
+import hashlib
+import time
+from typing import List, Optional
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .config import settings
+from .metrics import Counter, Gauge
+from .report_query import bbox_filter
+from .response_cache import response_cache
+from .tower_index import TowerIndex, tower_index_state
+from .utils.cache import TTLCache
+from .utils.coverage import MAX_RANGE_KM, MAX_SIGNAL_DBM, MIN_SIGNAL_DBM, estimate_best_server
+from .utils.spatial_index import bounding_box
+from .utils.tiles import encode_png, pixel_centers, point_pixels, point_tiles, tile_bounds
+
+# Above this many changed towers a reload simply drops every tile
+MAX_TARGETED_TOWERS = 1000
+
+tile_hits = Counter("coverage_tile_cache_hits_total", "Coverage tiles served from cache")
+tile_misses = Counter("coverage_tile_cache_misses_total", "Coverage tiles computed on request")
+tile_evictions = Counter("coverage_tile_invalidations_total", "Coverage tiles invalidated by new data")
+tile_seconds = Counter("coverage_tile_compute_seconds_total", "Time spent computing coverage tiles")
+
+
+class Tile:
+    def __init__(self, grid: np.ndarray, observed: int):
+        self.grid = grid
+        self.observed = observed
+        self.data = grid.tobytes()
+        self.etag = '"' + hashlib.blake2b(self.data, digest_size=8).hexdigest() + '"'
+        self._png: Optional[bytes] = None
+
+    def png(self) -> bytes:
+        if self._png is None:
+            self._png = encode_png(colorize(self.grid))
+        return self._png
+
+
+def colorize(grid: np.ndarray) -> np.ndarray:
+    """Red (weak) -> yellow -> green (strong); no coverage is transparent"""
+    t = np.clip((grid.astype(np.float32) - MIN_SIGNAL_DBM) / (MAX_SIGNAL_DBM - MIN_SIGNAL_DBM), 0, 1)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = np.interp(t, [0, 0.5, 1], [220, 240, 40])
+    rgba[..., 1] = np.interp(t, [0, 0.5, 1], [40, 200, 180])
+    rgba[..., 2] = 40
+    rgba[..., 3] = np.where(grid <= MIN_SIGNAL_DBM, 0, 170)
+    return rgba
+
+
+def model_grid(index: TowerIndex, z: int, x: int, y: int, size: int,
+               operator: Optional[str]) -> np.ndarray:
+    lats, lngs = pixel_centers(z, x, y, size)
+    towers = index.coverage_candidates(lats, lngs, operator)
+    return estimate_best_server(lats, lngs, towers)["signal"].astype(np.float64)
+
+
+async def observed_reports(db: AsyncIOMotorDatabase, z: int, x: int, y: int,
+                           operator: Optional[str]) -> List[dict]:
+    query = bbox_filter(tile_bounds(z, x, y))
+    if operator and operator != "All":
+        query["carrier"] = operator
+    limit = settings.COVERAGE_TILE_MAX_REPORTS
+    return await db.reports.find(
+        query, {"_id": 0, "lat": 1, "lng": 1, "signal_strength": 1}
+    ).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+
+
+def blend(model: np.ndarray, reports: List[dict], z: int, x: int, y: int, size: int) -> np.ndarray:
+    """Weighted mean of the model estimate and the reports in each pixel"""
+    if not reports:
+        return model
+    lats = np.fromiter((r["lat"] for r in reports), dtype=np.float64, count=len(reports))
+    lngs = np.fromiter((r["lng"] for r in reports), dtype=np.float64, count=len(reports))
+    values = np.fromiter((r["signal_strength"] for r in reports), dtype=np.float64, count=len(reports))
+
+    pixels = point_pixels(lats, lngs, z, x, y, size)
+    inside = pixels >= 0
+    counts = np.bincount(pixels[inside], minlength=size * size)
+    sums = np.bincount(pixels[inside], weights=values[inside], minlength=size * size)
+
+    weight = settings.COVERAGE_TILE_MODEL_WEIGHT
+    return (model * weight + sums) / (weight + counts)
+
+
+class TileCache:
+    def __init__(self, maxsize: int, ttl: float, size: int):
+        self.tiles = TTLCache(maxsize, ttl)
+        self.size = size
+        # Zooms tiles were cached at, so invalidate_points can look its
+        # points' tiles up instead of scanning the cache
+        self.zooms = set()
+        # Bumped on every invalidation so a tile computed from data that
+        # changed mid-flight is never stored
+        self.generation = 0
+        # Last shared "reports" generation this process accounted for
+        self.reports_generation: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    async def get(self, db: AsyncIOMotorDatabase, index: TowerIndex,
+                  z: int, x: int, y: int, operator: Optional[str]) -> Tile:
+        operator = None if operator == "All" else operator
+        key = (operator, z, x, y)
+        self._follow(await response_cache.generation("reports"))
+        tile = self.tiles.get(key)
+        if tile is not None:
+            tile_hits.inc()
+            return tile
+
+        tile_misses.inc()
+        generation = self.generation
+        reports = await observed_reports(db, z, x, y, operator)
+        started = time.perf_counter()
+        model = model_grid(index, z, x, y, self.size, operator)
+        grid = np.clip(np.trunc(blend(model, reports, z, x, y, self.size)), -128, 127).astype(np.int8)
+        tile = Tile(grid.reshape(self.size, self.size), len(reports))
+        tile_seconds.inc(time.perf_counter() - started)
+
+        if generation == self.generation and index is tower_index_state.index:
+            self.tiles.set(key, tile)
+            self.zooms.add(z)
+        return tile
+
+    def _follow(self, generation: Optional[int]):
+        """Drop every tile once reports were stored by another worker"""
+        if generation is None:
+            return
+        if self.reports_generation is not None and generation > self.reports_generation:
+            self.generation += 1
+            self.tiles.clear()
+        if self.reports_generation is None or generation > self.reports_generation:
+            self.reports_generation = generation
+
+    def _evict(self, keys):
+        self.generation += 1
+        for key in keys:
+            if self.tiles.pop(key) is not None:
+                tile_evictions.inc()
+
+    def invalidate_points(self, lats, lngs, carriers, reports_generation: Optional[int] = None):
+        """
+        Evict every cached tile containing one of the points.
+
+        reports_generation is the shared generation this write bumped to; a
+        gap since the last one seen means another worker wrote as well.
+        """
+        if reports_generation is not None:
+            if self.reports_generation is not None and reports_generation > self.reports_generation + 1:
+                self._follow(reports_generation)
+            else:
+                self.reports_generation = max(self.reports_generation or 0, reports_generation)
+        self.generation += 1
+        if not len(self.tiles) or not len(lats):
+            return
+        carriers = list(carriers)
+        stale = set()
+        for z in self.zooms:
+            xs, ys = point_tiles(lats, lngs, z)
+            for carrier, x, y in zip(carriers, xs.tolist(), ys.tolist()):
+                stale.add((carrier, z, x, y))
+                # "All operators" tiles are stale whatever the report's carrier
+                stale.add((None, z, x, y))
+        self._evict(stale)
+
+    def invalidate_towers(self, towers: List[dict]):
+        """Evict tiles within model range of any of the given towers"""
+        if len(towers) > MAX_TARGETED_TOWERS:
+            self.generation += 1
+            self.tiles.clear()
+            return
+        boxes = [
+            (t.get("operator"),) + bounding_box(np.array([t["lat"]]), np.array([t["lng"]]), MAX_RANGE_KM)
+            for t in towers
+        ]
+        stale = []
+        for key in self.tiles.keys():
+            operator, z, x, y = key
+            min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+            for tower_operator, b_min_lat, b_min_lng, b_max_lat, b_max_lng in boxes:
+                if operator is not None and operator != tower_operator:
+                    continue
+                if b_min_lat <= max_lat and b_max_lat >= min_lat and b_min_lng <= max_lng and b_max_lng >= min_lng:
+                    stale.append(key)
+                    break
+        self._evict(stale)
+
+    def on_tower_index_reload(self, old: Optional[TowerIndex], new: TowerIndex):
+        if old is None:
+            return
+
+        def rows(index):
+            # From the columns, so snapshot-backed indexes aren't decoded
+            a = index.arrays
+            keys = zip(a.ids.tolist(), a.lats.tolist(), a.lngs.tolist(), a.heights.tolist(), a.operators.tolist())
+            return {key: {"lat": key[1], "lng": key[2], "operator": key[4]} for key in keys}
+
+        before, after = rows(old), rows(new)
+        changed = [before[k] for k in before.keys() - after.keys()]
+        changed += [after[k] for k in after.keys() - before.keys()]
+        if changed:
+            self.invalidate_towers(changed)
+
+
+tile_cache = TileCache(
+    maxsize=settings.COVERAGE_TILE_CACHE_SIZE,
+    ttl=settings.COVERAGE_TILE_TTL_SECONDS,
+    size=settings.COVERAGE_TILE_SIZE,
+)
+tower_index_state.reload_listeners.append(tile_cache.on_tower_index_reload)
+
+Gauge("coverage_tile_cache_size", "Coverage tiles currently cached", fn=lambda: len(tile_cache))
@@ -1,10 +1,26 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference
 from urllib.parse import urlparse
 from fastapi import HTTPException
 from .config import settings
+from .instrumentation import command_listener, pool_listener
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
 
 class MongoDB:
     client: AsyncIOMotorClient = None
+    # Resolved once in connect_to_mongo, reused by every request
+    database: AsyncIOMotorDatabase = None
+    analytics: AsyncIOMotorDatabase = None
+    # Serializes connect attempts from startup and from early requests
+    connect_lock: asyncio.Lock = None
 
 db = MongoDB()
 
@@ -25,17 +41,56 @@ def get_database_name_from_url(url: str) -> str:
     # Fall back to settings or default
     return settings.DATABASE_NAME or "signalscope"
 
-async def get_database():
-    # Ensure connection is established
-    if db.client is None:
-        try:
+def read_preference(name: str, max_staleness: int = 0):
+    try:
+        mode = READ_PREFERENCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown read preference {name!r} (expected one of {', '.join(READ_PREFERENCES)})")
+    if max_staleness and mode is not ReadPreference.PRIMARY:
+        return type(mode)(max_staleness=max_staleness)
+    return mode
+
+async def ensure_connected():
+    """Connect unless already connected; concurrent callers share one attempt"""
+    if db.database is not None:
+        return
+    if db.connect_lock is None:
+        db.connect_lock = asyncio.Lock()
+    async with db.connect_lock:
+        if db.database is None:
             await connect_to_mongo()
+
+async def _ensure_connected():
+    if db.database is None:
+        try:
+            await ensure_connected()
         except Exception as e:
             print(f"[ERROR] Failed to connect to MongoDB: {e}")
             raise HTTPException(status_code=503, detail="Database connection unavailable")
-    
-    database_name = get_database_name_from_url(settings.DATABASE_URL) or settings.DATABASE_NAME
-    return db.client[database_name]
+
+async def get_database() -> AsyncIOMotorDatabase:
+    """Handle for writes and read-your-writes queries (MONGO_READ_PREFERENCE)"""
+    await _ensure_connected()
+    return db.database
+
+async def get_analytics_database() -> AsyncIOMotorDatabase:
+    """Handle for analytics and export reads (MONGO_ANALYTICS_READ_PREFERENCE, primary by default)"""
+    await _ensure_connected()
+    return db.analytics
+
+def _client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "read_preference": read_preference(settings.MONGO_READ_PREFERENCE),
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
 
 async def connect_to_mongo():
     """Create database connection"""
@@ -48,20 +103,41 @@ async def connect_to_mongo():
             # Add tls=true if not present
             separator = '&' if '?' in connection_url else '?'
             connection_url = f"{connection_url}{separator}tls=true"
-    
+
     db.client = AsyncIOMotorClient(
         connection_url,
         tls=True if connection_url.startswith('mongodb+srv://') else None,
         serverSelectionTimeoutMS=30000,
-        connectTimeoutMS=30000
+        connectTimeoutMS=30000,
+        event_listeners=[command_listener, pool_listener],
+        **_client_options()
     )
     # Test connection
-    await db.client.admin.command('ping')
+    try:
+        await db.client.admin.command('ping')
+    except Exception:
+        # Don't leave a half-open client behind for the next attempt
+        db.client.close()
+        db.client = None
+        raise
     database_name = get_database_name_from_url(settings.DATABASE_URL) or settings.DATABASE_NAME
-    print(f"[OK] Connected to MongoDB! Database: {database_name}")
+    db.database = db.client[database_name]
+    db.analytics = db.client.get_database(
+        database_name, read_preference=read_preference(settings.MONGO_ANALYTICS_READ_PREFERENCE,
+                                                        settings.MONGO_ANALYTICS_MAX_STALENESS_SECONDS)
+    )
+    print(f"[OK] Connected to MongoDB! Database: {database_name} "
+          f"(pool {settings.MONGO_MIN_POOL_SIZE}-{settings.MONGO_MAX_POOL_SIZE}, "
+          f"analytics reads: {settings.MONGO_ANALYTICS_READ_PREFERENCE})")
+    if (settings.MONGO_ANALYTICS_READ_PREFERENCE != "primary"
+            and settings.RESPONSE_CACHE_BACKEND != "off"):
+        staleness = settings.MONGO_ANALYTICS_MAX_STALENESS_SECONDS
+        print(f"[WARN] Cached analytics routes read from secondaries; responses may be up to "
+              f"{f'{staleness}s' if staleness else 'an unbounded replication lag'} behind the last invalidation")
 
 async def close_mongo_connection():
     """Close database connection"""
     if db.client:
         db.client.close()
+        db.client = db.database = db.analytics = None
         print("[OK] Disconnected from MongoDB!")
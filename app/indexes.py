@@ -0,0 +1,200 @@
+"""
+Declarative MongoDB index definitions.
+
+Applied idempotently at startup (ENSURE_INDEXES_ON_STARTUP) or from the CLI:
+
+    python -m app.indexes                      # create missing indexes
+    python -m app.indexes --check              # explain() every query shape, fail on scans
+    python -m app.indexes --backfill-location  # add GeoJSON location to old reports/towers
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .report_query import bbox_filter, report_locations
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "towers": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "reports": [
+        # Keyset pagination: newest first, optionally per carrier / per user
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("carrier", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="carrier_timestamp_id"),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="user_timestamp_id"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "report_rollups": [
+        IndexModel([("dim", ASCENDING), ("bucket", ASCENDING)], name="dim_bucket"),
+        IndexModel([("dim", ASCENDING), ("key", ASCENDING), ("bucket", ASCENDING)], name="dim_key_bucket"),
+    ],
+    # Downsampled tiers (REPORT_STORAGE=timeseries); the hourly bucket TTL
+    # index is managed by app.report_storage
+    "report_tiers_hourly": [
+        IndexModel([("carrier", ASCENDING), ("bucket", DESCENDING)], name="carrier_bucket"),
+    ],
+    "report_tiers_daily": [
+        IndexModel([("bucket", DESCENDING)], name="bucket"),
+        IndexModel([("carrier", ASCENDING), ("bucket", DESCENDING)], name="carrier_bucket"),
+    ],
+    "report_clusters": [
+        IndexModel([("z", ASCENDING), ("x", ASCENDING), ("y", ASCENDING)], name="z_x_y"),
+    ],
+}
+
+_SAMPLE_TIME = datetime(2024, 1, 1)
+_PAGE = 100
+
+# A plan fails the check when it examines more than EXAMINED_RATIO documents
+# per document returned (past EXAMINED_MIN): an IXSCAN that only serves the
+# sort and filters everything else is as bad as a COLLSCAN
+EXAMINED_RATIO = 10
+EXAMINED_MIN = 1000
+
+# Representative filter/sort/limit for every query the routers send to Mongo.
+# Full reads by design (loading the tower index, the per-carrier
+# report_stats documents) are intentionally not listed; tower filters and
+# radius queries are answered by the in-memory tower index.
+QUERY_SHAPES = [
+    ("auth login/register", "users", {"email": "user@example.com"}, None),
+    ("seed upsert by id", "towers", {"id": "t1"}, None),
+    ("reports latest", "reports", {}, [("timestamp", -1), ("_id", -1)]),
+    ("reports by carrier", "reports", {"carrier": "Verizon"}, [("timestamp", -1), ("_id", -1)]),
+    ("reports by user", "reports", {"user_id": "u1"}, [("timestamp", -1), ("_id", -1)]),
+    ("reports time range", "reports",
+     {"timestamp": {"$gte": _SAMPLE_TIME, "$lt": _SAMPLE_TIME + timedelta(days=1)}},
+     [("timestamp", -1), ("_id", -1)]),
+    ("reports next page", "reports",
+     {"$and": [{"carrier": "Verizon"}, {"$or": [
+         {"timestamp": {"$lt": _SAMPLE_TIME}},
+         {"timestamp": _SAMPLE_TIME, "_id": {"$lt": ObjectId("000000000000000000000000")}},
+     ]}]},
+     [("timestamp", -1), ("_id", -1)]),
+    ("reports bbox", "reports", bbox_filter((40.7, -74.1, 40.8, -73.9), use_location=True), [("timestamp", -1), ("_id", -1)]),
+    ("coverage tile reports", "reports", {**bbox_filter((40.71, -74.0, 40.74, -73.96), use_location=True), "carrier": "Verizon"},
+     [("timestamp", -1), ("_id", -1)]),
+    ("rollups window", "report_rollups",
+     {"dim": "carrier", "bucket": {"$gte": _SAMPLE_TIME}}, None),
+    ("rollups by key", "report_rollups",
+     {"dim": "zip", "key": "10001", "bucket": {"$gte": _SAMPLE_TIME}}, None),
+    ("report tiers window", "report_tiers_daily",
+     {"bucket": {"$gte": _SAMPLE_TIME, "$lt": _SAMPLE_TIME + timedelta(days=7)}}, [("bucket", -1), ("_id", -1)]),
+    ("report tiers by carrier", "report_tiers_hourly",
+     {"carrier": "Verizon", "bucket": {"$gte": _SAMPLE_TIME}}, [("bucket", -1), ("_id", -1)]),
+    ("report clusters bbox", "report_clusters",
+     {"z": 8, "x": {"$gte": 70, "$lte": 80}, "y": {"$gte": 90, "$lte": 100}}, None),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """create_indexes is a no-op for indexes that already exist"""
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking the unique index - keep serving
+            print(f"[WARN] Could not create indexes on {collection}: {e}")
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def check_query_plans(db: AsyncIOMotorDatabase) -> List[str]:
+    """
+    Run explain(executionStats) for every query shape; returns descriptions
+    of the ones that COLLSCAN or examine far more documents than they return
+    """
+    failures = []
+    for description, collection, query, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": query, "limit": _PAGE}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command("explain", command, verbosity="executionStats")
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        stats = explain["executionStats"]
+        examined, returned = stats["totalDocsExamined"], stats["nReturned"]
+        if "COLLSCAN" in stages:
+            status = "COLLSCAN"
+        elif examined > max(EXAMINED_RATIO * returned, EXAMINED_MIN):
+            status = "EXAMINED"
+        else:
+            status = "ok"
+        print(f"  {status:8s} {description:22s} {examined:>9,} examined {returned:>5,} returned  "
+              f"{' <- '.join(s for s in stages if s)}")
+        if status != "ok":
+            failures.append(description)
+    return failures
+
+
+async def backfill_locations(db: AsyncIOMotorDatabase):
+    """Add a GeoJSON location to documents written before it existed"""
+    set_location = [{"$set": {"location": {"type": "Point", "coordinates": ["$lng", "$lat"]}}}]
+    for collection in ("towers", "reports"):
+        result = await db[collection].update_many({"location": {"$exists": False}}, set_location)
+        print(f"  {collection}: {result.modified_count} documents updated")
+    await check_report_locations(db)
+
+
+async def check_report_locations(db: AsyncIOMotorDatabase):
+    """
+    Let bbox_filter use `location` once no report lacks it. The first clean
+    scan is recorded in db.storage_status, so later starts skip it; every
+    write path sets `location`.
+    """
+    if await db.storage_status.find_one({"_id": "report_location", "complete": True}) is None:
+        if await db.reports.find_one({"location": {"$exists": False}}, {"_id": 1}) is not None:
+            report_locations.complete = False
+            print("[WARN] Some reports have no GeoJSON location; bbox queries use lat/lng ranges until "
+                  "`python -m app.indexes --backfill-location` has run and the API is restarted")
+            return
+        await db.storage_status.update_one({"_id": "report_location"}, {"$set": {"complete": True}}, upsert=True)
+    report_locations.complete = True
+
+
+async def _main(args):
+    from .database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        await ensure_indexes(db)
+        print("✅ Indexes ensured")
+        if args.backfill_location:
+            await backfill_locations(db)
+        if args.check:
+            failures = await check_query_plans(db)
+            if failures:
+                print(f"❌ {len(failures)} query shape(s) scan too much: {', '.join(failures)}")
+                return 1
+            print("✅ Every query shape is served by a selective index")
+        return 0
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes and verify query plans")
+    parser.add_argument("--check", action="store_true",
+                        help="explain() every query shape; fail on COLLSCAN or on far more docs examined than returned")
+    parser.add_argument("--backfill-location", action="store_true",
+                        help="add GeoJSON location to reports/towers that lack it")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
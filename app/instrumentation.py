@@ -0,0 +1,282 @@
+"""
+Request, MongoDB and event-loop instrumentation.
+
+RequestMetricsMiddleware times every request by route template and keeps a
+RequestStats in a contextvar for the duration of the request. The pymongo
+MongoCommandListener (attached in connect_to_mongo) and the bcrypt pool add
+their time to it, so each request knows how much of it was Mongo, bcrypt or
+everything else. Motor copies the context into its executor threads, so the
+listener sees the stats of the request that issued the command.
+
+Requests slower than SLOW_REQUEST_LOG_MS are logged with that breakdown.
+
+PoolListener tracks connection pool occupancy and checkout wait per server
+for GET /pool-stats.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+from .config import settings
+from .metrics import Counter, Gauge, Histogram
+from .startup import startup_state
+
+logger = logging.getLogger("signalscope.requests")
+
+# Mongo commands per request: one find up to a few hundred insert batches
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+request_seconds = Histogram("http_request_duration_seconds", "Request latency by route",
+                            labels=("method", "route"))
+request_total = Counter("http_requests_total", "Requests by route and status",
+                        labels=("method", "route", "status"))
+request_mongo_seconds = Histogram("http_request_mongo_seconds", "Time spent in MongoDB commands per request",
+                                  labels=("route",))
+request_mongo_commands = Histogram("http_request_mongo_commands", "MongoDB commands issued per request",
+                                   labels=("route",), buckets=COUNT_BUCKETS)
+mongo_seconds = Histogram("mongo_command_duration_seconds", "MongoDB command latency", labels=("command",))
+mongo_failures = Counter("mongo_command_failures_total", "MongoDB commands that failed", labels=("command",))
+pool_wait_seconds = Histogram("mongo_pool_checkout_wait_seconds", "Time waiting to check out a connection",
+                              labels=("address",))
+loop_lag_seconds = Histogram("event_loop_lag_seconds", "Event loop scheduling delay", buckets=LAG_BUCKETS)
+
+
+class RequestStats:
+    __slots__ = ("mongo_commands", "mongo_seconds", "password_hash_seconds")
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.password_hash_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def record_password_hash(seconds: float):
+    stats = current_request.get()
+    if stats is not None:
+        stats.password_hash_seconds += seconds
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_seconds.observe(seconds, command=event.command_name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += seconds
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        mongo_failures.inc(command=event.command_name)
+        self._finished(event)
+
+
+command_listener = MongoCommandListener()
+
+
+class PoolStats:
+    __slots__ = ("open", "checked_out", "waiting", "checkouts", "failures", "wait_seconds", "max_wait_seconds")
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "open_connections": self.open,
+            "checked_out": self.checked_out,
+            "idle": max(self.open - self.checked_out, 0),
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.failures,
+            "wait_ms_mean": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """
+    Per-server pool occupancy. Checkout start and finish happen on the same
+    (executor) thread, so the wait is timed with a thread-local.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, PoolStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stats(self, address) -> PoolStats:
+        key = "%s:%s" % address
+        stats = self.pools.get(key)
+        if stats is None:
+            stats = self.pools.setdefault(key, PoolStats())
+        return stats
+
+    def _waited(self, event, stats: PoolStats) -> float:
+        started = getattr(self._local, "started", None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        stats.waiting -= 1
+        return waited
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self._stats(event.address).waiting += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            waited = self._waited(event, stats)
+            stats.checked_out += 1
+            stats.checkouts += 1
+            stats.wait_seconds += waited
+            stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+        pool_wait_seconds.observe(waited, address="%s:%s" % event.address)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            self._waited(event, stats)
+            stats.failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._stats(event.address).checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address).open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._stats(event.address).open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {address: stats.as_dict() for address, stats in self.pools.items()}
+
+
+pool_listener = PoolListener()
+
+Gauge("mongo_pool_checked_out", "Connections currently checked out, all servers",
+      fn=lambda: sum(s.checked_out for s in pool_listener.pools.values()))
+Gauge("mongo_pool_waiting", "Operations waiting for a connection, all servers",
+      fn=lambda: sum(s.waiting for s in pool_listener.pools.values()))
+
+
+def _route_of(scope) -> str:
+    # Route templates keep label cardinality bounded (/tiles/{z}/{x}/{y})
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI - unlike BaseHTTPMiddleware it doesn't buffer or re-wrap responses"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            method, route = scope["method"], _route_of(scope)
+            request_seconds.observe(elapsed, method=method, route=route)
+            request_total.inc(method=method, route=route, status=status)
+            request_mongo_seconds.observe(stats.mongo_seconds, route=route)
+            request_mongo_commands.observe(stats.mongo_commands, route=route)
+            startup_state.request_served(scope["path"])
+
+            threshold = settings.SLOW_REQUEST_LOG_MS
+            if threshold and elapsed * 1000 >= threshold:
+                other = max(elapsed - stats.mongo_seconds - stats.password_hash_seconds, 0.0)
+                logger.warning(
+                    "[SLOW] %s %s (%s) %d in %.0f ms: mongo %.0f ms / %d commands, bcrypt %.0f ms, other %.0f ms",
+                    method, scope["path"], route, status, elapsed * 1000,
+                    stats.mongo_seconds * 1000, stats.mongo_commands,
+                    stats.password_hash_seconds * 1000, other * 1000,
+                )
+
+
+async def sample_loop_lag(interval: float):
+    """How late the loop wakes a sleeping task - CPU-bound work shows up here"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - expected, 0.0)
+        loop_lag_seconds.observe(lag)
+        loop_lag_monitor.latest = lag
+
+
+class LoopLagMonitor:
+    task: Optional[asyncio.Task] = None
+    latest: float = 0.0  # seconds, last sample
+
+    def start(self):
+        if self.task is None and settings.LOOP_LAG_SAMPLE_MS > 0:
+            self.task = asyncio.create_task(sample_loop_lag(settings.LOOP_LAG_SAMPLE_MS / 1000))
+
+    async def stop(self):
+        task, self.task = self.task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -1,110 +1,62 @@
 import logging
 import os
-from fastapi import FastAPI, Response
-from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
-from .database import connect_to_mongo, close_mongo_connection
-from .routers import auth, towers, reports, analytics
+from .database import close_mongo_connection, db
+from .report_columns import stop_report_columns
+from .tower_index import stop_tower_watcher
+from .auth.utils import password_pool
+from .config import settings
+from .cors import CORSMiddleware
+from .report_writer import report_writer
+from . import metrics, startup as startup_steps
+from .admission import AdmissionMiddleware
+from .instrumentation import RequestMetricsMiddleware, loop_lag_monitor, pool_listener
+from .response_cache import ResponseCacheMiddleware
+from .serve import reset_process_state
+from .routers import auth, towers, reports, analytics, coverage, clusters
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="SignalScope API", version="1.0.0")
+# Servers that fork after importing the app (gunicorn --preload)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_process_state)
 
-# CORS origins - supports comma-separated values from environment
-raw_origins = os.getenv("CORS_ORIGINS")
-logger.info(f"[CORS] CORS_ORIGINS env var: {raw_origins}")
+app = FastAPI(title="SignalScope API", version="1.0.0", default_response_class=ORJSONResponse)
 
-if raw_origins:
-    # Split by comma, strip whitespace, filter out empty strings
-    origins = [o.strip() for o in raw_origins.split(",") if o.strip()]
-    logger.info(f"[CORS] Parsed origins from env: {origins}")
-else:
-    # Default origins if CORS_ORIGINS not set
-    origins = [
-        "http://localhost:5173",
-        "http://localhost:5174",
-        "https://signal-scope-psi.vercel.app",
-    ]
-    logger.info(f"[CORS] Using default origins: {origins}")
+origins = settings.cors_origins_list
+logger.info(f"[CORS] Allowed origins: {origins}")
 
-logger.info(f"[CORS] Final allowed origins: {origins}")
-
-# CORS middleware - MUST be added FIRST, before any other middleware or routers
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-)
-
-# Request logger middleware
-class SimpleLoggerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        origin = request.headers.get('origin', 'none')
-        logger.info(f"[REQUEST] {request.method} {request.url.path} | Origin: {origin}")
-        response = await call_next(request)
-        logger.info(f"[RESPONSE] {request.method} {request.url.path} | Status: {response.status_code}")
-        return response
-
-app.add_middleware(SimpleLoggerMiddleware)
-
-# Force CORS headers on all responses
-# This runs AFTER CORS middleware to ensure headers are always present
-@app.middleware("http")
-async def force_cors_headers(request, call_next):
-    """Force CORS headers on all responses"""
-    response = await call_next(request)
-    origin = request.headers.get("origin")
-    
-    if origin and origin in origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH, HEAD"
-        # Explicitly list common headers instead of "*" when credentials are used
-        response.headers["Access-Control-Allow-Headers"] = "content-type, authorization, accept, origin, x-requested-with, cache-control, pragma"
-    
-    return response
-
-# Global OPTIONS handler for preflight requests
-# Must be defined BEFORE routers to catch all OPTIONS requests
-@app.options("/{full_path:path}")
-async def global_options_handler(request, full_path: str):
-    """Global OPTIONS handler for preflight requests"""
-    origin = request.headers.get("origin")
-    requested_headers = request.headers.get("access-control-request-headers", "")
-    
-    # Return response with explicit CORS headers
-    if origin and origin in origins:
-        # When credentials are allowed, we can't use "*" for headers
-        # Instead, echo back the requested headers or use explicit list
-        allowed_headers = requested_headers if requested_headers else "content-type, authorization, accept, origin, x-requested-with"
-        
-        return Response(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": origin,
-                "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH, HEAD",
-                "Access-Control-Allow-Headers": allowed_headers,
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Max-Age": "3600",
-            }
-        )
-    
-    # Return empty response if origin not allowed (CORS middleware will handle it)
-    return Response(status_code=200)
+# Middleware, innermost first:
+# - response cache inside CORS, so it never stores per-origin headers
+# - admission control inside CORS, so browsers can read its 429s
+# - CORS answers preflights before routing
+# - request metrics outermost, so it times everything
+app.add_middleware(ResponseCacheMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(CORSMiddleware, origins=origins)
+app.add_middleware(RequestMetricsMiddleware)
 
 # DB lifecycle
 @app.on_event("startup")
 async def startup():
     logger.info("[STARTUP] SignalScope API Starting...")
-    await connect_to_mongo()
+    loop_lag_monitor.start()
+    # Blocks until MongoDB is connected and initialized, or schedules it (STARTUP_MODE)
+    await startup_steps.start()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await startup_steps.stop()
+    # Flush buffered reports while the Mongo client is still open
+    await report_writer.drain()
+    await stop_tower_watcher()
+    # After the drain, so the snapshot written for the next start includes it
+    await stop_report_columns(db.database.name if db.database is not None else None)
+    password_pool.shutdown()
+    await loop_lag_monitor.stop()
     await close_mongo_connection()
 
 # Routers
@@ -112,6 +64,32 @@ app.include_router(auth.router)
 app.include_router(towers.router)
 app.include_router(reports.router)
 app.include_router(analytics.router)
+app.include_router(coverage.router)
+app.include_router(clusters.router)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/pool-stats", include_in_schema=False)
+def get_pool_stats():
+    """Connection pool occupancy of this worker, per MongoDB server"""
+    return {
+        "max_pool_size": settings.MONGO_MAX_POOL_SIZE,
+        "min_pool_size": settings.MONGO_MIN_POOL_SIZE,
+        "servers": pool_listener.snapshot(),
+    }
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """Liveness: the worker is up and its event loop answers"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """Readiness: MongoDB connected and startup steps done (503 until then)"""
+    state = startup_steps.startup_state.snapshot()
+    return ORJSONResponse(state, status_code=200 if state["ready"] else 503)
 
 @app.get("/")
 def root():
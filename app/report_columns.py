@@ -0,0 +1,563 @@
+"""
+In-process columnar snapshot of the reports, for ad-hoc analytics that
+never touch MongoDB (REPORT_COLUMNS_ENABLED).
+
+Each report is one row of fixed-width columns, 34 bytes in total:
+
+    lat, lng       float32   (~1 m resolution)
+    signal         int16     dBm
+    timestamp      int64     UTC epoch seconds
+    carrier, device, user, region
+                   uint32    codes into per-column dictionaries; region is
+                             the ZIP (or fallback cell) of the by-zip rollups
+
+Rows live in two segments: an optional read-only base mmap'd from the
+snapshot file, and a growable in-memory tail. Queries run once per segment
+and merge their (group, dBm) histograms, so counts, means and percentiles
+are exact.
+
+Keeping it current:
+
+- on_reports_inserted appends this worker's inserts right away;
+- every REPORT_COLUMNS_SYNC_SECONDS the watcher reads reports with a
+  timestamp after the last sync (minus SYNC_LAG_SECONDS for write-behind
+  and clock skew), which picks up other workers' inserts. Ids seen inside
+  that window are remembered so nothing is counted twice;
+- after REPORT_COLUMNS_MAX_AGE_SECONDS the snapshot is rebuilt from a full
+  scan, which also picks up seeded or imported reports with old timestamps
+  and drops reports that expired from a time-series collection.
+
+With REPORT_COLUMNS_PERSIST the snapshot is written to a file (in /dev/shm
+when available) after a scan and on shutdown. Workers and restarts map that
+file instead of rescanning, and its pages are shared between workers; the
+file layout follows tower_snapshot:
+
+    magic (8) | header length (8) | JSON header, padded to 8 bytes
+    one column after another, each padded to 8 bytes
+
+Rebuild the file from scratch with:
+    python -m app.report_columns
+"""
+import asyncio
+import calendar
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from .analytics.regions import get_zip_lookup
+from .analytics.report_stats import PERCENTILES
+from .config import settings
+from .metrics import Gauge
+from .tower_snapshot import snapshot_dir, writer_lock
+
+MAGIC = b"SSREPCL1"
+PREAMBLE = struct.Struct("<8sQ")
+COLUMNS = (
+    ("lat", "<f4"),
+    ("lng", "<f4"),
+    ("signal", "<i2"),
+    ("timestamp", "<i8"),
+    ("carrier", "<u4"),
+    ("device", "<u4"),
+    ("user", "<u4"),
+    ("region", "<u4"),
+)
+DICTIONARY_COLUMNS = ("carrier", "device", "user", "region")
+ROW_BYTES = sum(np.dtype(dtype).itemsize for _, dtype in COLUMNS)
+
+GROUPS = ("carrier", "device", "region", "hour", "day")
+TIME_STEPS = {"hour": 3600, "day": 86400}
+# (group, dBm) histograms up to this many cells use bincount, larger ones a sort
+DENSE_HISTOGRAM_CELLS = 1 << 22
+
+REPORT_FIELDS = {"_id": 1, "lat": 1, "lng": 1, "signal_strength": 1, "timestamp": 1,
+                 "carrier": 1, "device": 1, "user_id": 1}
+SCAN_BATCH_SIZE = 5000
+SYNC_LAG_SECONDS = 60
+
+
+def epoch_seconds(ts: datetime) -> int:
+    """Stored timestamps are naive UTC; query parameters may carry an offset"""
+    return calendar.timegm(ts.utctimetuple())
+
+
+class Dictionary:
+    """Append-only string <-> code mapping for one column"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = list(values)
+        self.codes: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: List[str]) -> np.ndarray:
+        codes = self.codes
+        out = np.empty(len(values), dtype=np.uint32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+            out[i] = code
+        return out
+
+
+class ReportColumns:
+    def __init__(self, watermark: float, capacity: int = 1024):
+        self.base: Optional[Dict[str, np.ndarray]] = None
+        self.base_size = 0
+        self.map: Optional[mmap.mmap] = None
+        self.tail = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.tail_size = 0
+        self.dictionaries = {name: Dictionary() for name in DICTIONARY_COLUMNS}
+        # Reports with a timestamp before watermark - SYNC_LAG_SECONDS are all in;
+        # recent holds the ids of the ones after it (id -> timestamp)
+        self.watermark = watermark
+        self.recent: Dict[object, int] = {}
+        # Start of the full scan the rows go back to
+        self.scanned_at = watermark
+        self.persisted = False
+
+    def __len__(self) -> int:
+        return self.base_size + self.tail_size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.tail.values()) + self.base_size * ROW_BYTES
+
+    def segments(self) -> List[Dict[str, np.ndarray]]:
+        segments = [self.base] if self.base_size else []
+        if self.tail_size:
+            segments.append({name: column[:self.tail_size] for name, column in self.tail.items()})
+        return segments
+
+    def _reserve(self, extra: int):
+        needed = self.tail_size + extra
+        capacity = len(self.tail["lat"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name, column in self.tail.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.tail_size] = column[:self.tail_size]
+            self.tail[name] = grown
+
+    def append(self, docs: List[dict]) -> int:
+        """Add reports not seen yet; returns how many were added"""
+        if not docs:
+            return 0
+        now = datetime.utcnow()
+        timestamps = np.array([d.get("timestamp") or now for d in docs], dtype="datetime64[s]").astype(np.int64)
+        keep = np.ones(len(docs), dtype=bool)
+        horizon = self.watermark - SYNC_LAG_SECONDS
+        for i in np.nonzero(timestamps >= horizon)[0].tolist():
+            key = docs[i].get("_id")
+            if key is None:
+                continue
+            if key in self.recent:
+                keep[i] = False
+            else:
+                self.recent[key] = int(timestamps[i])
+        if not keep.all():
+            docs = [d for d, k in zip(docs, keep.tolist()) if k]
+            timestamps = timestamps[keep]
+        if not docs:
+            return 0
+
+        lats = [d["lat"] for d in docs]
+        lngs = [d["lng"] for d in docs]
+        start, n = self.tail_size, len(docs)
+        self._reserve(n)
+        end = start + n
+        self.tail["lat"][start:end] = lats
+        self.tail["lng"][start:end] = lngs
+        self.tail["signal"][start:end] = [d["signal_strength"] for d in docs]
+        self.tail["timestamp"][start:end] = timestamps
+        self.tail["carrier"][start:end] = self.dictionaries["carrier"].encode([d["carrier"] for d in docs])
+        self.tail["device"][start:end] = self.dictionaries["device"].encode([d.get("device") or "" for d in docs])
+        self.tail["user"][start:end] = self.dictionaries["user"].encode([d.get("user_id") or "" for d in docs])
+        self.tail["region"][start:end] = self.dictionaries["region"].encode(get_zip_lookup().regions_for(lats, lngs))
+        self.tail_size = end
+        self.persisted = False
+        return n
+
+    def advance(self, watermark: float):
+        """Everything up to watermark has been read; forget ids that can't come back"""
+        self.watermark = watermark
+        horizon = watermark - SYNC_LAG_SECONDS
+        self.recent = {key: ts for key, ts in self.recent.items() if ts >= horizon}
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def _mask(self, segment: Dict[str, np.ndarray], codes: Dict[str, int], start: Optional[int],
+              end: Optional[int], bbox: Optional[Tuple[float, float, float, float]]) -> Optional[np.ndarray]:
+        mask = None
+
+        def both(condition):
+            return condition if mask is None else mask & condition
+
+        for name, code in codes.items():
+            mask = both(segment[name] == code)
+        if start is not None:
+            mask = both(segment["timestamp"] >= start)
+        if end is not None:
+            mask = both(segment["timestamp"] < end)
+        if bbox:
+            min_lat, min_lng, max_lat, max_lng = bbox
+            lats, lngs = segment["lat"], segment["lng"]
+            mask = both((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng))
+        return mask
+
+    def _histogram(self, segment: Dict[str, np.ndarray], mask: Optional[np.ndarray],
+                   group_by: Optional[str]) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(group, dBm, count) triples of the selected rows"""
+        signals = segment["signal"] if mask is None else segment["signal"][mask]
+        if not len(signals):
+            return None
+        signals = signals.astype(np.int64)
+        if group_by is None:
+            groups = np.zeros(len(signals), dtype=np.int64)
+        elif group_by in TIME_STEPS:
+            timestamps = segment["timestamp"] if mask is None else segment["timestamp"][mask]
+            groups = timestamps // TIME_STEPS[group_by]
+        else:
+            groups = (segment[group_by] if mask is None else segment[group_by][mask]).astype(np.int64)
+
+        low, first = int(signals.min()), int(groups.min())
+        bins = int(signals.max()) - low + 1
+        cells = (int(groups.max()) - first + 1) * bins
+        keys = (groups - first) * bins + (signals - low)
+        if cells <= DENSE_HISTOGRAM_CELLS:
+            counts = np.bincount(keys, minlength=cells)
+            keys = np.nonzero(counts)[0]
+            counts = counts[keys]
+        else:
+            keys, counts = np.unique(keys, return_counts=True)
+        return keys // bins + first, keys % bins + low, counts
+
+    def query(self, group_by: Optional[str] = None, carrier: Optional[str] = None,
+              device: Optional[str] = None, region: Optional[str] = None, user: Optional[str] = None,
+              start: Optional[datetime] = None, end: Optional[datetime] = None,
+              bbox: Optional[Tuple[float, float, float, float]] = None,
+              limit: int = 100, histogram: bool = False) -> dict:
+        """
+        Signal summary of the matching reports, overall and per group.
+        Dictionary groups come busiest first, time groups oldest first.
+        """
+        codes = {}
+        for name, value in (("carrier", carrier), ("device", device), ("region", region), ("user", user)):
+            if value is not None:
+                code = self.dictionaries[name].codes.get(value)
+                if code is None:
+                    return {"count": 0, "groups": [] if group_by else None}
+                codes[name] = code
+        start_s = epoch_seconds(start) if start else None
+        end_s = epoch_seconds(end) if end else None
+
+        parts = []
+        for segment in self.segments():
+            part = self._histogram(segment, self._mask(segment, codes, start_s, end_s, bbox), group_by)
+            if part is not None:
+                parts.append(part)
+        if not parts:
+            return {"count": 0, "groups": [] if group_by else None}
+        groups, signals, counts = (np.concatenate(column) for column in zip(*parts))
+
+        total = summarize(np.zeros(len(signals), dtype=np.int64), signals, counts, histogram)[1][0]
+        if not group_by:
+            return {**total, "groups": None}
+        keys, summaries = summarize(groups, signals, counts, histogram)
+        if group_by in TIME_STEPS:
+            labels = [datetime.utcfromtimestamp(k * TIME_STEPS[group_by]) for k in keys.tolist()]
+            rows = [{"bucket": label, **s} for label, s in zip(labels, summaries)][:limit]
+        else:
+            values = self.dictionaries[group_by].values
+            rows = sorted(({group_by: values[k], **s} for k, s in zip(keys.tolist(), summaries)),
+                          key=lambda r: r["count"], reverse=True)[:limit]
+        return {**total, "groups": rows}
+
+
+def summarize(groups: np.ndarray, signals: np.ndarray, counts: np.ndarray,
+              histogram: bool = False) -> Tuple[np.ndarray, List[dict]]:
+    """Per-group count / mean / min / max / percentiles from (group, dBm, count) triples"""
+    order = np.lexsort((signals, groups))
+    groups, signals, counts = groups[order], signals[order], counts[order]
+    # Merge the triples both segments contributed
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = (groups[1:] != groups[:-1]) | (signals[1:] != signals[:-1])
+    starts = np.nonzero(first)[0]
+    groups, signals, counts = groups[starts], signals[starts], np.add.reduceat(counts, starts)
+
+    group_starts = np.nonzero(np.r_[True, groups[1:] != groups[:-1]])[0]
+    group_ends = np.r_[group_starts[1:], len(groups)]
+    totals = np.add.reduceat(counts, group_starts)
+    sums = np.add.reduceat(counts * signals, group_starts)
+    # Nearest-rank percentiles: first position whose running count reaches the rank
+    cumulative = np.cumsum(counts)
+    before = cumulative[group_starts] - counts[group_starts]
+    percentiles = {
+        f"p{p}": signals[np.searchsorted(cumulative, before + np.maximum(1, np.ceil(p / 100 * totals)))].tolist()
+        for p in PERCENTILES
+    }
+
+    summaries = []
+    for i, (n, total, low, high) in enumerate(zip(
+            totals.tolist(), sums.tolist(), signals[group_starts].tolist(), signals[group_ends - 1].tolist())):
+        summary = {
+            "count": n,
+            "mean_signal": round(total / n, 2),
+            "min_signal": low,
+            "max_signal": high,
+            **{name: values[i] for name, values in percentiles.items()},
+        }
+        if histogram:
+            s, e = group_starts[i], group_ends[i]
+            summary["histogram"] = dict(zip(map(str, signals[s:e].tolist()), counts[s:e].tolist()))
+        summaries.append(summary)
+    return groups[group_starts], summaries
+
+
+# ---------------------------------------------------------------------------
+# Snapshot file
+# ---------------------------------------------------------------------------
+
+def columns_path(database_name: str) -> str:
+    return os.path.join(snapshot_dir(settings.REPORT_COLUMNS_DIR), f"signalscope-reports-{database_name}.cols")
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def write_columns(path: str, columns: ReportColumns) -> None:
+    """Atomically replace the file at path with base + tail"""
+    segments = columns.segments()
+    header = json.dumps({
+        "count": len(columns),
+        "watermark": columns.watermark,
+        "scanned_at": columns.scanned_at,
+        "dictionaries": {name: d.values[:] for name, d in columns.dictionaries.items()},
+        "recent": [[str(key), type(key) is ObjectId, ts] for key, ts in columns.recent.items()],
+    }).encode()
+    header += b" " * _pad(PREAMBLE.size + len(header))
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".reports-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            for name, dtype in COLUMNS:
+                written = 0
+                for segment in segments:
+                    data = np.ascontiguousarray(segment[name], dtype=dtype).tobytes()
+                    f.write(data)
+                    written += len(data)
+                f.write(b"\0" * _pad(written))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def read_columns(path: str, scanned_after: float = 0.0) -> Optional[ReportColumns]:
+    """Columns backed by the file at path, if it exists, is intact and comes from a scan after scanned_after"""
+    try:
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = PREAMBLE.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a report column snapshot")
+        header = json.loads(bytes(mapping[PREAMBLE.size:PREAMBLE.size + header_len]))
+        if header["scanned_at"] <= scanned_after:
+            return None
+
+        count = header["count"]
+        offset = PREAMBLE.size + header_len
+        base = {}
+        for name, dtype in COLUMNS:
+            size = np.dtype(dtype).itemsize * count
+            if offset + size > len(mapping):
+                raise ValueError(f"{path} is truncated")
+            base[name] = np.frombuffer(mapping, dtype=dtype, count=count, offset=offset)
+            offset += size + _pad(size)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"[WARN] Ignoring unreadable report column snapshot {path}: {e}")
+        return None
+
+    columns = ReportColumns(header["watermark"])
+    columns.scanned_at = header["scanned_at"]
+    columns.map, columns.base, columns.base_size = mapping, base, count
+    columns.dictionaries = {name: Dictionary(header["dictionaries"][name]) for name in DICTIONARY_COLUMNS}
+    columns.recent = {(ObjectId(key) if is_oid else key): ts for key, is_oid, ts in header["recent"]}
+    columns.persisted = True
+    return columns
+
+
+# ---------------------------------------------------------------------------
+# Loading and syncing
+# ---------------------------------------------------------------------------
+
+class ReportColumnsState:
+    columns: Optional[ReportColumns] = None
+    watcher: Optional[asyncio.Task] = None
+
+report_columns_state = ReportColumnsState()
+
+Gauge("report_columns_rows", "Reports in the columnar snapshot",
+      fn=lambda: len(report_columns_state.columns) if report_columns_state.columns else 0)
+Gauge("report_columns_bytes", "Memory held by the columnar snapshot, including its mmap'd base",
+      fn=lambda: report_columns_state.columns.nbytes if report_columns_state.columns else 0)
+
+
+async def _read_into(columns: ReportColumns, cursor) -> int:
+    added = 0
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= SCAN_BATCH_SIZE:
+            added += columns.append(batch)
+            batch = []
+    return added + columns.append(batch)
+
+
+async def scan_report_columns(db: AsyncIOMotorDatabase) -> ReportColumns:
+    """Fresh columns from a full read of db.reports"""
+    columns = ReportColumns(time.time())
+    await _read_into(columns, db.reports.find({}, REPORT_FIELDS).batch_size(SCAN_BATCH_SIZE))
+    return columns
+
+
+async def sync_report_columns(db: AsyncIOMotorDatabase, columns: ReportColumns) -> int:
+    """Append reports stored since the last sync, by any worker; returns how many"""
+    read_at = time.time()
+    since = datetime.utcfromtimestamp(columns.watermark - SYNC_LAG_SECONDS)
+    cursor = db.reports.find({"timestamp": {"$gte": since}}, REPORT_FIELDS).batch_size(SCAN_BATCH_SIZE)
+    added = await _read_into(columns, cursor)
+    columns.advance(read_at)
+    return added
+
+
+def _persist(columns: ReportColumns, path: str, keep_newer: bool = False):
+    """Write columns to path; with keep_newer, not over a file from a later scan"""
+    if keep_newer:
+        if read_columns(path, columns.scanned_at) is not None:
+            return
+    try:
+        write_columns(path, columns)
+        columns.persisted = True
+    except OSError as e:
+        print(f"[WARN] Could not write report column snapshot {path}: {e}")
+
+
+async def load_report_columns(db: AsyncIOMotorDatabase, scanned_after: float) -> ReportColumns:
+    """
+    Columns from the snapshot file if it was scanned after scanned_after,
+    otherwise from a full scan (then written to the file); caught up with
+    a sync either way.
+    """
+    if not settings.REPORT_COLUMNS_PERSIST:
+        columns = await scan_report_columns(db)
+    else:
+        path = columns_path(db.name)
+        async with writer_lock(path):
+            # Under the lock: if a sibling worker just scanned, map its file
+            columns = read_columns(path, scanned_after)
+            if columns is None:
+                columns = await scan_report_columns(db)
+                await asyncio.get_running_loop().run_in_executor(None, _persist, columns, path)
+    await sync_report_columns(db, columns)
+    return columns
+
+
+async def _reload(db: AsyncIOMotorDatabase, scanned_after: float):
+    started = time.perf_counter()
+    columns = await load_report_columns(db, scanned_after)
+    report_columns_state.columns = columns
+    print(f"[OK] Report columns loaded: {len(columns):,} reports, "
+          f"{columns.nbytes / 2**20:,.1f} MiB in {time.perf_counter() - started:.2f}s")
+
+
+async def watch_report_columns(db: AsyncIOMotorDatabase):
+    """Load the columns, then keep them in step with db.reports"""
+    while True:
+        try:
+            state = report_columns_state
+            if state.columns is None:
+                await _reload(db, time.time() - settings.REPORT_COLUMNS_MAX_AGE_SECONDS)
+            elif time.time() - state.columns.scanned_at > settings.REPORT_COLUMNS_MAX_AGE_SECONDS:
+                # Only a file scanned after ours will do; queries keep
+                # using the old columns until the new ones are ready
+                await _reload(db, state.columns.scanned_at)
+            else:
+                await sync_report_columns(db, state.columns)
+        except PyMongoError as e:
+            print(f"[WARN] Report column sync failed: {e}")
+        await asyncio.sleep(settings.REPORT_COLUMNS_SYNC_SECONDS)
+
+
+def start_report_columns(db: AsyncIOMotorDatabase):
+    if report_columns_state.watcher is None:
+        report_columns_state.watcher = asyncio.create_task(watch_report_columns(db))
+
+
+async def stop_report_columns(database_name: Optional[str] = None):
+    """Stop syncing; with a database name, persist columns that changed since the last write"""
+    task = report_columns_state.watcher
+    report_columns_state.watcher = None
+    if task:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+    columns = report_columns_state.columns
+    if database_name and columns is not None and not columns.persisted and settings.REPORT_COLUMNS_PERSIST:
+        path = columns_path(database_name)
+        async with writer_lock(path):
+            # Never over a fresher scan, e.g. one written by `python -m app.report_columns`
+            await asyncio.get_running_loop().run_in_executor(None, _persist, columns, path, True)
+
+
+async def record_report_columns(db: AsyncIOMotorDatabase, docs: List[dict]):
+    """Append this worker's fresh inserts so its own reads see them at once"""
+    if report_columns_state.columns is not None:
+        report_columns_state.columns.append(docs)
+
+
+async def _main():
+    from .database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        started = time.perf_counter()
+        columns = await scan_report_columns(db)
+        path = columns_path(db.name)
+        async with writer_lock(path):
+            write_columns(path, columns)
+        print(f"✅ Wrote {len(columns):,} reports ({columns.nbytes / 2**20:,.1f} MiB) to {path} "
+              f"in {time.perf_counter() - started:.2f}s")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
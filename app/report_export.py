@@ -0,0 +1,66 @@
+"""
+Streaming report export.
+
+Rows are read from a Motor cursor in batches of REPORT_EXPORT_BATCH_SIZE
+and each batch is encoded and yielded before the next one is fetched, so
+memory stays flat however many reports match.
+"""
+import csv
+import io
+from typing import AsyncIterator, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .config import settings
+from .metrics import Counter
+from .report_query import SORT
+from .serialization import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "reports.ndjson"),
+    "csv": ("text/csv", "reports.csv"),
+}
+
+exported_rows = Counter("report_export_rows_total", "Reports streamed by /api/reports/export", labels=("format",))
+
+
+async def _batches(db: AsyncIOMotorDatabase, query: dict, projection: dict) -> AsyncIterator[List[dict]]:
+    batch_size = settings.REPORT_EXPORT_BATCH_SIZE
+    cursor = db.reports.find(query, projection).sort(SORT).batch_size(batch_size)
+    try:
+        batch = []
+        async for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Client went away mid-export - release the server-side cursor
+        await cursor.close()
+
+
+async def export_ndjson(db: AsyncIOMotorDatabase, query: dict, projection: dict) -> AsyncIterator[bytes]:
+    async for batch in _batches(db, query, projection):
+        exported_rows.inc(len(batch), format="ndjson")
+        yield b"".join(dumps(doc) + b"\n" for doc in batch)
+
+
+async def export_csv(db: AsyncIOMotorDatabase, query: dict, projection: dict) -> AsyncIterator[str]:
+    columns = ["_id"] + [f for f in projection if f != "_id"]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for batch in _batches(db, query, projection):
+        buffer.seek(0)
+        buffer.truncate()
+        for doc in batch:
+            if "timestamp" in doc:
+                doc["timestamp"] = doc["timestamp"].isoformat()
+            writer.writerow(doc)
+        exported_rows.inc(len(batch), format="csv")
+        yield buffer.getvalue()
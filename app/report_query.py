@@ -0,0 +1,147 @@
+"""
+Shared filtering, projection and keyset pagination for report reads.
+
+Pages are ordered newest first by (timestamp, _id); the opaque cursor
+encodes the last row of a page, so every page is an index range scan that
+costs the same however deep it is.
+"""
+import base64
+import json
+import math
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+
+from .config import settings
+
+REPORT_FIELDS = ("user_id", "lat", "lng", "carrier", "signal_strength", "device", "timestamp")
+# Full documents projected straight to the ReportResponse shape
+REPORT_PROJECTION = {f: 1 for f in REPORT_FIELDS}
+SORT = [("timestamp", -1), ("_id", -1)]
+# A bbox polygon gets a vertex at least every BBOX_EDGE_STEP_DEG of longitude
+# and is padded by BBOX_PAD_DEG, so it contains the whole lat/lng box
+BBOX_EDGE_STEP_DEG = 1.0
+BBOX_PAD_DEG = 0.01
+
+
+class ReportLocations:
+    """Whether every report has a GeoJSON `location`; set by indexes.check_report_locations"""
+
+    def __init__(self):
+        self.complete = False
+
+
+report_locations = ReportLocations()
+
+
+def bbox_filter(bbox: Tuple[float, float, float, float], use_location: Optional[bool] = None) -> dict:
+    """
+    Reports inside a lat/lng box. `location` $geoWithin a polygon around the
+    box lets the location_2dsphere index answer it; the exact lat/lng ranges
+    are kept because GeoJSON edges are geodesics that bow away from the
+    parallels between vertices. Boxes too wide for a polygon (180 degrees of
+    longitude or more) only use the ranges, and so does every box until
+    report_locations says no report lacks `location` ($geoWithin skips those).
+    """
+    if use_location is None:
+        use_location = report_locations.complete
+    min_lat, min_lng, max_lat, max_lng = bbox
+    query = {"lat": {"$gte": min_lat, "$lte": max_lat}, "lng": {"$gte": min_lng, "$lte": max_lng}}
+    if not use_location or not 0 <= max_lng - min_lng < 180 or max_lat < min_lat:
+        return query
+    south = max(min_lat - BBOX_PAD_DEG, -90.0)
+    north = min(max_lat + BBOX_PAD_DEG, 90.0)
+    west = max(min_lng - BBOX_PAD_DEG, -180.0)
+    east = min(max_lng + BBOX_PAD_DEG, 180.0)
+    steps = max(1, math.ceil((east - west) / BBOX_EDGE_STEP_DEG))
+    lngs = [west + (east - west) * i / steps for i in range(steps + 1)]
+    ring = [[lng, south] for lng in lngs] + [[lng, north] for lng in reversed(lngs)] + [[west, south]]
+    return {"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}, **query}
+
+
+def report_filter(carrier: Optional[str] = None,
+                  start: Optional[datetime] = None,
+                  end: Optional[datetime] = None,
+                  bbox: Optional[Tuple[float, float, float, float]] = None,
+                  user_id: Optional[str] = None) -> dict:
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if carrier:
+        query["carrier"] = carrier
+        if settings.REPORT_STORAGE == "timeseries":
+            # Lets the server skip whole buckets of other carriers
+            query["meta.carrier"] = carrier
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    if bbox:
+        query.update(bbox_filter(bbox))
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """Projection for a "lat,lng,signal_strength" style parameter"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in REPORT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(REPORT_FIELDS)})"
+        )
+    # timestamp is always needed to build the next cursor
+    return {f: 1 for f in requested} | {"timestamp": 1}
+
+
+def encode_cursor(doc: dict, time_field: str = "timestamp") -> str:
+    raw = json.dumps({"t": doc[time_field].isoformat(), "i": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, time_field: str = "timestamp", id_type=ObjectId) -> dict:
+    """Query fragment selecting rows strictly after the cursor position"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        timestamp = datetime.fromisoformat(data["t"])
+        last_id = id_type(data["i"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {time_field: {"$lt": timestamp}},
+        {time_field: timestamp, "_id": {"$lt": last_id}},
+    ]}
+
+
+async def find_reports_page(db: AsyncIOMotorDatabase, query: dict, limit: int,
+                            cursor: Optional[str] = None,
+                            projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of reports plus the cursor for the next page (None at the end)"""
+    if cursor:
+        query = {"$and": [query, decode_cursor(cursor)]} if query else decode_cursor(cursor)
+
+    # Fetch one extra row to know whether another page exists
+    docs = await db.reports.find(query, projection).sort(SORT).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+async def find_tier_page(collection: AsyncIOMotorCollection, query: dict, limit: int,
+                         cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of tier buckets, newest first by (bucket, _id), summarized"""
+    from .analytics.tiers import tier_row
+
+    if cursor:
+        after = decode_cursor(cursor, "bucket", str)
+        query = {"$and": [query, after]} if query else after
+    docs = await collection.find(query).sort([("bucket", -1), ("_id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1], "bucket") if len(docs) > limit else None
+    return [tier_row(doc) for doc in docs[:limit]], next_cursor
@@ -0,0 +1,212 @@
+"""
+Report storage mode (REPORT_STORAGE).
+
+    standard    `reports` is a regular collection (default)
+    timeseries  `reports` is a MongoDB 6.0+ time-series collection: timeField
+                "timestamp", metaField "meta" = {carrier, geohash cell}, so
+                one carrier's reports in one area share compressed buckets.
+                Raw reports expire after REPORT_RAW_RETENTION_DAYS, and
+                app.analytics.tiers keeps hourly/daily aggregates.
+
+Time-series collections can't be renamed or upserted into, so existing
+reports are migrated by copying:
+
+    python -m app.report_storage migrate [--drop-legacy]
+
+The migration:
+
+1. renames `reports` to `reports_legacy`;
+2. creates the time-series `reports`;
+3. copies every report still inside the raw retention, in _id order. A
+   rerun continues after the last copied _id;
+4. rebuilds the tiers from the legacy collection, so history older than
+   the retention survives;
+5. ensures the indexes.
+
+Stop the API, or run the migration before switching REPORT_STORAGE, so
+no report lands in only one of the two collections.
+
+Only the tiers follow the retention. report_stats, the rollups and the
+report clusters are running totals of every report ever stored: raw
+reports expiring don't decrement them, and rebuilding them from `reports`
+shrinks them to the retained window. Time-windowed by-carrier reads come
+from the tiers.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from .config import settings
+from .utils import geocell
+
+STORAGE_MODES = ("standard", "timeseries")
+META_CELL_PRECISION = 4  # ~39 x 20 km: coarse enough to fill buckets
+LEGACY_COLLECTION = "reports_legacy"
+MIGRATE_BATCH_SIZE = 5000
+
+
+def timeseries_enabled() -> bool:
+    return settings.REPORT_STORAGE == "timeseries"
+
+
+def report_meta(carrier: str, lat: float, lng: float) -> dict:
+    return {"carrier": carrier, "cell": geocell.encode(lat, lng, META_CELL_PRECISION)}
+
+
+def with_meta(doc: dict) -> dict:
+    return {**doc, "meta": report_meta(doc["carrier"], doc["lat"], doc["lng"])}
+
+
+async def collection_options(db: AsyncIOMotorDatabase, name: str) -> Optional[dict]:
+    """listCollections entry of `name`, or None if it doesn't exist"""
+    async for info in await db.list_collections(filter={"name": name}):
+        return info
+    return None
+
+
+def _expire_after() -> Optional[int]:
+    days = settings.REPORT_RAW_RETENTION_DAYS
+    return int(timedelta(days=days).total_seconds()) if days else None
+
+
+async def create_timeseries_reports(db: AsyncIOMotorDatabase):
+    options = {"timeseries": {"timeField": "timestamp", "metaField": "meta",
+                              "granularity": settings.REPORT_TIMESERIES_GRANULARITY}}
+    if _expire_after():
+        options["expireAfterSeconds"] = _expire_after()
+    await db.create_collection("reports", **options)
+    print(f"[OK] Created time-series collection reports "
+          f"(raw retention: {settings.REPORT_RAW_RETENTION_DAYS or 'forever'} days)")
+
+
+async def _ensure_ttl(db: AsyncIOMotorDatabase, collection: str, seconds: Optional[int]):
+    """TTL index on `bucket`, or a plain one when seconds is None"""
+    options = {"expireAfterSeconds": seconds} if seconds else {}
+    try:
+        await db[collection].create_index([("bucket", ASCENDING)], name="bucket_ttl", **options)
+    except OperationFailure:
+        # The index exists with another expiry: recreate it
+        await db[collection].drop_index("bucket_ttl")
+        await db[collection].create_index([("bucket", ASCENDING)], name="bucket_ttl", **options)
+
+
+async def ensure_report_storage(db: AsyncIOMotorDatabase):
+    """Create the time-series collection and retention settings (no-op in standard mode)"""
+    if settings.REPORT_STORAGE not in STORAGE_MODES:
+        raise ValueError(f"Unknown REPORT_STORAGE {settings.REPORT_STORAGE!r} "
+                         f"(expected one of {', '.join(STORAGE_MODES)})")
+    if not timeseries_enabled():
+        return
+
+    info = await collection_options(db, "reports")
+    if info is None:
+        await create_timeseries_reports(db)
+    elif info.get("type") != "timeseries":
+        print("[WARN] REPORT_STORAGE=timeseries but reports is a regular collection; "
+              "run `python -m app.report_storage migrate`")
+    elif info.get("options", {}).get("expireAfterSeconds") != _expire_after():
+        await db.command("collMod", "reports", expireAfterSeconds=_expire_after() or "off")
+
+    await ensure_tier_retention(db)
+
+
+async def ensure_tier_retention(db: AsyncIOMotorDatabase):
+    """TTL index expiring hourly tier buckets after REPORT_HOURLY_RETENTION_DAYS"""
+    days = settings.REPORT_HOURLY_RETENTION_DAYS
+    await _ensure_ttl(db, "report_tiers_hourly", int(timedelta(days=days).total_seconds()) if days else None)
+
+
+async def migrate(db: AsyncIOMotorDatabase, batch_size: int = MIGRATE_BATCH_SIZE,
+                  drop_legacy: bool = False) -> int:
+    """Copy a regular `reports` collection into a time-series one; returns reports copied"""
+    from .analytics.tiers import rebuild_report_tiers
+    from .indexes import ensure_indexes
+
+    info = await collection_options(db, "reports")
+    legacy = await collection_options(db, LEGACY_COLLECTION)
+    if info is not None and info.get("type") != "timeseries":
+        if legacy is not None:
+            raise RuntimeError(f"Both reports and {LEGACY_COLLECTION} exist as regular collections")
+        await db.reports.rename(LEGACY_COLLECTION)
+        print(f"[OK] Renamed reports to {LEGACY_COLLECTION}")
+        info = None
+    elif legacy is None:
+        if info is None:
+            await create_timeseries_reports(db)
+        else:
+            print("[OK] reports is already a time-series collection and nothing is left to copy")
+        return 0
+    if info is None:
+        await create_timeseries_reports(db)
+
+    query = {}
+    if _expire_after():
+        # Older reports would expire on arrival; the tiers keep their aggregates
+        query["timestamp"] = {"$gte": datetime.utcnow() - timedelta(seconds=_expire_after())}
+    last = await db.reports.find({}, {"_id": 1}).sort("_id", -1).limit(1).to_list(length=1)
+    if last:
+        print(f"[OK] Resuming after {last[0]['_id']}")
+        query["_id"] = {"$gt": last[0]["_id"]}
+
+    copied = 0
+    started = time.perf_counter()
+    batch = []
+    async for doc in db[LEGACY_COLLECTION].find(query).sort("_id", 1).batch_size(batch_size):
+        batch.append(with_meta(doc))
+        if len(batch) >= batch_size:
+            await db.reports.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            print(f"     {copied:,} reports copied ({copied / (time.perf_counter() - started):,.0f}/s)", flush=True)
+    if batch:
+        await db.reports.insert_many(batch, ordered=False)
+        copied += len(batch)
+    print(f"[OK] Copied {copied:,} reports")
+
+    counted = await rebuild_report_tiers(db, source=LEGACY_COLLECTION)
+    print(f"[OK] Rebuilt report tiers from {counted:,} legacy reports")
+    await ensure_report_storage(db)
+    await ensure_indexes(db)
+
+    if drop_legacy:
+        await db[LEGACY_COLLECTION].drop()
+        print(f"[OK] Dropped {LEGACY_COLLECTION}")
+    else:
+        print(f"[OK] {LEGACY_COLLECTION} kept; drop it once the new collection is verified")
+    return copied
+
+
+async def _main(args) -> int:
+    from .database import connect_to_mongo, close_mongo_connection, get_database
+
+    await connect_to_mongo()
+    try:
+        settings.REPORT_STORAGE = "timeseries"
+        await migrate(await get_database(), args.batch_size, args.drop_legacy)
+        print("✅ Migration finished; set REPORT_STORAGE=timeseries")
+        return 0
+    except (OperationFailure, RuntimeError) as e:
+        print(f"❌ Migration failed: {e}")
+        return 1
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report storage maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="move reports into a time-series collection")
+    migrate_parser.add_argument("--batch-size", type=int, default=MIGRATE_BATCH_SIZE)
+    migrate_parser.add_argument("--drop-legacy", action="store_true",
+                                help=f"drop {LEGACY_COLLECTION} after copying")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Write-behind buffering for single-report POSTs.
+
+With REPORT_WRITE_MODE=write_behind, create_report assigns the ObjectId,
+enqueues the document and returns immediately; a background task writes the
+queue to db.reports with insert_many once REPORT_FLUSH_BATCH_SIZE documents
+are waiting or REPORT_FLUSH_INTERVAL_MS has passed. When the queue is full,
+new reports wait up to REPORT_ENQUEUE_TIMEOUT_MS and then get 503.
+
+Reports still in memory are lost if the process is killed, so the default
+mode stays synchronous; on a normal shutdown the queue is drained first.
+"""
+import asyncio
+import time
+from typing import List, Optional
+from bson import ObjectId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .config import settings
+from .metrics import Counter, Gauge
+from .analytics.pipeline import on_reports_inserted
+
+FLUSH_RETRIES = 3
+
+flushes = Counter("report_writer_flushes_total", "Write-behind batches written")
+flush_seconds = Counter("report_writer_flush_seconds_total", "Time spent in write-behind insert_many calls")
+flushed_reports = Counter("report_writer_reports_total", "Reports written by the write-behind flusher")
+dropped_reports = Counter("report_writer_dropped_total", "Reports that could not be written after retries")
+rejected_reports = Counter("report_writer_rejected_total", "Reports rejected because the queue was full")
+queue_lag_seconds = Counter("report_writer_queue_lag_seconds_total", "Sum of enqueue-to-write delays")
+
+
+class ReportWriteBehind:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, enqueue_timeout: float):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self.task is None:
+            self.db = db
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self.task = asyncio.create_task(self._run())
+            print(f"[OK] Report write-behind enabled (batch {self.batch_size}, "
+                  f"{self.flush_interval * 1000:.0f} ms)")
+
+    async def submit(self, doc: dict) -> dict:
+        """Queue a report for writing; assigns its _id up front"""
+        doc["_id"] = ObjectId()
+        try:
+            await asyncio.wait_for(self.queue.put((time.monotonic(), doc)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            rejected_reports.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Report ingestion is backed up, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        return doc
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                dropped_reports.inc(len(batch))
+                print(f"[ERROR] Write-behind flush crashed, dropped {len(batch)} reports: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _flush(self, batch: List[tuple]):
+        docs = [doc for _, doc in batch]
+        failed = set()
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                await self.db.reports.insert_many(docs, ordered=False)
+                failed = set()
+                break
+            except BulkWriteError as e:
+                # Duplicate _ids mean an earlier attempt already wrote them
+                failed = {
+                    err["index"] for err in e.details.get("writeErrors", [])
+                    if err.get("code") != 11000
+                }
+                break
+            except PyMongoError as e:
+                failed = set(range(len(docs)))
+                print(f"[WARN] Write-behind flush failed (attempt {attempt}): {e}")
+                if attempt < FLUSH_RETRIES:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+            finally:
+                flush_seconds.inc(time.perf_counter() - started)
+
+        written = [doc for i, doc in enumerate(docs) if i not in failed]
+        flushes.inc()
+        flushed_reports.inc(len(written))
+        dropped_reports.inc(len(failed))
+        now = time.monotonic()
+        queue_lag_seconds.inc(sum(now - queued_at for queued_at, _ in batch))
+        if written:
+            await on_reports_inserted(self.db, written)
+
+    async def drain(self):
+        """Write everything still queued, then stop the flusher"""
+        if self.task is None:
+            return
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+
+report_writer = ReportWriteBehind(
+    max_queue=settings.REPORT_QUEUE_MAX_SIZE,
+    batch_size=settings.REPORT_FLUSH_BATCH_SIZE,
+    flush_interval=settings.REPORT_FLUSH_INTERVAL_MS / 1000,
+    enqueue_timeout=settings.REPORT_ENQUEUE_TIMEOUT_MS / 1000,
+)
+
+Gauge("report_writer_queue_depth", "Reports waiting to be written", fn=report_writer.depth)
@@ -0,0 +1,356 @@
+"""
+Response cache for read-heavy, rarely-changing GET routes.
+
+Responses are keyed by path + sorted query string and stored with the
+generation of every collection they were built from ("towers", "reports").
+A write bumps that collection's generation, which orphans every dependent
+entry at once; no key scanning is needed.
+
+Backends (RESPONSE_CACHE_BACKEND):
+    memory  per-process TTL + LRU (default); the generations live in a small
+            file next to the tower snapshot that every worker on the host
+            maps, so a write in one worker orphans the entries of all of them
+    redis   shared by every worker; needs `pip install redis` and
+            RESPONSE_CACHE_REDIS_URL
+    off     disabled
+
+Every cached response carries an ETag, and If-None-Match gets a 304.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from .config import settings
+from .database import get_database_name_from_url
+from .metrics import Counter, Gauge
+from .tower_snapshot import fcntl, snapshot_dir
+from .utils.cache import TTLCache
+
+# path -> collections the response is derived from
+CACHED_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "/api/towers/": ("towers",),
+    "/api/analytics": ("towers", "reports"),
+    "/api/analytics/by-zip": ("reports",),
+    "/api/analytics/by-carrier": ("reports",),
+    "/api/clusters/towers": ("towers",),
+    "/api/clusters/reports": ("reports",),
+}
+
+KEY_PREFIX = "signalscope:rc:"
+# Slot order of the shared generations file (one uint64 each)
+GENERATION_SLOTS = ("towers", "reports")
+GENERATION = struct.Struct("<Q")
+
+cache_requests = Counter("response_cache_requests_total", "Cacheable requests by result",
+                         labels=("route", "result"))
+cache_invalidations = Counter("response_cache_invalidations_total", "Generation bumps by collection",
+                              labels=("collection",))
+cache_errors = Counter("response_cache_backend_errors_total", "Shared backend calls that failed")
+
+
+class CachedResponse:
+    def __init__(self, generations: List[int], status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.generations = generations
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+    def encode(self) -> bytes:
+        meta = {
+            "g": self.generations,
+            "s": self.status,
+            "h": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in self.headers],
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "CachedResponse":
+        meta, body = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in meta["h"]]
+        return cls(meta["g"], meta["s"], headers, body)
+
+
+class LocalGenerations:
+    """Generations seen by this process only"""
+
+    def __init__(self):
+        self.values: Dict[str, int] = {}
+
+    def get(self, collection: str) -> int:
+        return self.values.get(collection, 0)
+
+    def bump(self, collection: str) -> int:
+        self.values[collection] = self.get(collection) + 1
+        return self.values[collection]
+
+
+class SharedGenerations:
+    """
+    Generations in a file mapped by every worker on the host.
+
+    Reads are a plain load from the mapping; bumps take an flock so two
+    workers never lose an increment. The file is created on first use, so
+    a worker forked from a preloaded app maps it itself.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.map: Optional[mmap.mmap] = None
+
+    def _mapping(self) -> mmap.mmap:
+        if self.map is None:
+            size = GENERATION.size * len(GENERATION_SLOTS)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self.map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        return self.map
+
+    def get(self, collection: str) -> int:
+        offset = GENERATION.size * GENERATION_SLOTS.index(collection)
+        return GENERATION.unpack_from(self._mapping(), offset)[0]
+
+    def bump(self, collection: str) -> int:
+        mapping = self._mapping()
+        offset = GENERATION.size * GENERATION_SLOTS.index(collection)
+        # A fresh descriptor per bump: flock on one inherited across a fork
+        # would be shared with the parent and exclude nothing
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            value = GENERATION.unpack_from(mapping, offset)[0] + 1
+            GENERATION.pack_into(mapping, offset, value)
+            return value
+        finally:
+            os.close(fd)
+
+
+def shared_generations():
+    """Host-wide generations, or per-process ones if the file can't be mapped"""
+    path = os.path.join(snapshot_dir(settings.TOWER_SNAPSHOT_DIR),
+                        f"signalscope-generations-{get_database_name_from_url(settings.DATABASE_URL)}")
+    generations = SharedGenerations(path)
+    try:
+        generations.get(GENERATION_SLOTS[0])
+    except OSError as e:
+        print(f"[WARN] Response cache generations can't be shared ({e}); invalidations stay in the "
+              f"writing worker, so run one worker or set RESPONSE_CACHE_BACKEND=redis")
+        return LocalGenerations()
+    return generations
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl: float, generations=None):
+        self.entries = TTLCache(maxsize, ttl)
+        self.generations = generations if generations is not None else LocalGenerations()
+
+    async def lookup(self, key: str, collections: Sequence[str]):
+        return self.entries.get(key), await self.current(collections)
+
+    async def current(self, collections: Sequence[str]) -> List[int]:
+        return [self.generations.get(c) for c in collections]
+
+    async def store(self, key: str, entry: CachedResponse):
+        self.entries.set(key, entry)
+
+    async def bump(self, collection: str) -> int:
+        return self.generations.bump(collection)
+
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis
+
+        self._redis = redis
+        self.url = url
+        self.ttl = int(ttl)
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use inside the worker, never inherited across a fork
+        if self._client is None:
+            self._client = self._redis.from_url(self.url)
+        return self._client
+
+    def reset(self):
+        self._client = None
+
+    async def lookup(self, key: str, collections: Sequence[str]):
+        # Generations and the entry in a single round trip
+        values = await self.client.mget([KEY_PREFIX + "gen:" + c for c in collections] + [KEY_PREFIX + key])
+        generations = [int(v) if v is not None else 0 for v in values[:-1]]
+        entry = CachedResponse.decode(values[-1]) if values[-1] is not None else None
+        return entry, generations
+
+    async def current(self, collections: Sequence[str]) -> List[int]:
+        values = await self.client.mget([KEY_PREFIX + "gen:" + c for c in collections])
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def store(self, key: str, entry: CachedResponse):
+        await self.client.set(KEY_PREFIX + key, entry.encode(), ex=self.ttl)
+
+    async def bump(self, collection: str) -> int:
+        return await self.client.incr(KEY_PREFIX + "gen:" + collection)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def configure(self, backend: str, max_entries: int, ttl: float, redis_url: str = ""):
+        self.backend = None
+        if backend == "redis":
+            try:
+                self.backend = RedisBackend(redis_url, ttl)
+                return
+            except ImportError:
+                print("[WARN] RESPONSE_CACHE_BACKEND=redis but the redis package is not installed; "
+                      "using the in-process cache")
+                backend = "memory"
+        if backend == "memory":
+            self.backend = MemoryBackend(max_entries, ttl, shared_generations())
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def lookup(self, key: str, collections: Sequence[str]):
+        """(entry or None, current generations); entries from an older generation are misses"""
+        try:
+            entry, generations = await self.backend.lookup(key, collections)
+        except Exception:
+            cache_errors.inc()
+            return None, None
+        if entry is not None and entry.generations != generations:
+            entry = None
+        return entry, generations
+
+    async def store(self, key: str, entry: CachedResponse):
+        try:
+            await self.backend.store(key, entry)
+        except Exception:
+            cache_errors.inc()
+
+    async def generation(self, collection: str) -> Optional[int]:
+        """Current generation as every worker sees it; None when disabled or unreachable"""
+        if not self.enabled:
+            return None
+        try:
+            return (await self.backend.current((collection,)))[0]
+        except Exception:
+            cache_errors.inc()
+            return None
+
+    async def invalidate(self, *collections: str) -> Dict[str, int]:
+        """Call after writing to any of the collections; returns the new generations"""
+        if not self.enabled:
+            return {}
+        generations = {}
+        for collection in collections:
+            cache_invalidations.inc(collection=collection)
+            try:
+                generations[collection] = await self.backend.bump(collection)
+            except Exception as e:
+                cache_errors.inc()
+                print(f"[WARN] Response cache invalidation for {collection} failed: {e}")
+        return generations
+
+
+response_cache = ResponseCache()
+response_cache.configure(
+    settings.RESPONSE_CACHE_BACKEND,
+    settings.RESPONSE_CACHE_MAX_ENTRIES,
+    settings.RESPONSE_CACHE_TTL_SECONDS,
+    settings.RESPONSE_CACHE_REDIS_URL,
+)
+
+Gauge("response_cache_hit_ratio", "Share of cacheable requests served from cache",
+      fn=response_cache.hit_ratio)
+
+
+def _cache_key(scope) -> str:
+    query = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+    return scope["path"] + "?" + urlencode(query)
+
+
+def _etag_matches(scope, etag: str) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            return etag in [tag.strip() for tag in value.decode("latin-1").split(",")]
+    return False
+
+
+class ResponseCacheMiddleware:
+    """
+    Pure ASGI middleware serving CACHED_ROUTES from response_cache.
+
+    Must sit inside the CORS middleware so per-origin headers are never
+    stored with a cached response.
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        collections = CACHED_ROUTES.get(scope["path"]) if scope["type"] == "http" else None
+        if collections is None or scope["method"] != "GET" or not self.cache.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"]
+        key = _cache_key(scope)
+        entry, generations = await self.cache.lookup(key, collections)
+        if entry is not None:
+            self.cache.hits += 1
+            cache_requests.inc(route=route, result="hit")
+            await self._send(scope, send, entry, b"HIT")
+            return
+
+        self.cache.misses += 1
+        cache_requests.inc(route=route, result="miss")
+        started: dict = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        entry = CachedResponse(generations or [], started["status"], list(started.get("headers", [])),
+                               b"".join(chunks))
+        # Generations were read before the route ran, so a write that lands
+        # mid-request leaves this entry already stale
+        if entry.status == 200 and generations is not None:
+            await self.cache.store(key, entry)
+        await self._send(scope, send, entry, b"MISS")
+
+    async def _send(self, scope, send, entry: CachedResponse, result: bytes):
+        cache_headers = [(b"etag", entry.etag.encode()), (b"cache-control", b"no-cache"), (b"x-cache", result)]
+        if entry.status == 200 and _etag_matches(scope, entry.etag):
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers = entry.headers + cache_headers if entry.status == 200 else entry.headers
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
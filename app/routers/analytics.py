@@ -1,26 +1,98 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from ..database import get_database
+from ..database import get_analytics_database
+from ..tower_index import TowerIndex, get_tower_index
+from ..analytics.report_stats import load_report_stats
+from ..analytics.rollups import carrier_field, is_whole_days, query_rollups
+from ..analytics.tiers import choose_resolution, signal_by_carrier
+from ..config import settings
+from ..report_columns import GROUPS, report_columns_state
+from ..report_storage import timeseries_enabled
+from ..schemas import CarrierAnalyticsResponse
+from ..utils.params import parse_bbox
 
 router = APIRouter(prefix="/api", tags=["Analytics"])
 
 
 @router.get("/analytics")
-async def get_analytics(db: AsyncIOMotorDatabase = Depends(get_database)):
-    carriers = ["T-Mobile", "Verizon", "AT&T"]
+async def get_analytics(
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database),
+    index: TowerIndex = Depends(get_tower_index)
+):
+    # Tower counts come from the in-memory index, report counts and signal
+    # statistics from the running counters - no scans of either collection.
+    tower_counts = index.count_by_operator()
+    report_stats = await load_report_stats(db)
+    carriers = sorted(set(tower_counts) | set(report_stats))
 
-    towers_by_carrier = {
-        operator: await db.towers.count_documents({"operator": operator})
-        for operator in carriers
+    return {
+        "carriers": carriers,
+        "towers_by_carrier": {c: tower_counts.get(c, 0) for c in carriers},
+        "reports_by_carrier": {c: report_stats.get(c, {}).get("count", 0) for c in carriers},
+        "signal_by_carrier": {c: report_stats[c] for c in carriers if c in report_stats},
+        "total_towers": len(index),
+        "total_reports": sum(s["count"] for s in report_stats.values()),
     }
 
-    total_towers = await db.towers.count_documents({})
-    total_reports = await db.reports.count_documents({})
 
-    return {
-        "towers_by_carrier": towers_by_carrier,
-        "total_towers": total_towers,
-        "total_reports": total_reports
-    }
+@router.get("/analytics/by-zip")
+async def get_analytics_by_zip(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    zip: Optional[str] = None,
+    carrier: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    regions = await query_rollups(db, "zip", start, end, key=zip)
+    if carrier:
+        field = carrier_field(carrier)
+        regions = [
+            {"zip": r["zip"], "carrier": carrier, **r["carriers"][field]}
+            for r in regions if field in r.get("carriers", {})
+        ]
+    return {"start": start, "end": end, "regions": regions}
+
+
+@router.get("/analytics/by-carrier", response_model=CarrierAnalyticsResponse)
+async def get_analytics_by_carrier(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    if timeseries_enabled():
+        # Exact window from the coarsest tier whose buckets line up with it,
+        # with percentiles; the day rollups below include whole end days.
+        # Windows reaching past the raw retention come from a tier, approximate
+        resolution, exact = choose_resolution(start, end)
+        carriers = await signal_by_carrier(db, resolution, start, end)
+    else:
+        resolution, exact = "day", is_whole_days(start, end)
+        carriers = await query_rollups(db, "carrier", start, end)
+    return {"start": start, "end": end, "resolution": resolution, "approximate": not exact,
+            "carriers": carriers}
+
 
+@router.get("/analytics/reports")
+async def get_report_analytics(
+    group_by: Optional[str] = Query(None, pattern=f"^({'|'.join(GROUPS)})$"),
+    carrier: Optional[str] = None,
+    device: Optional[str] = None,
+    region: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    histogram: bool = False,
+    limit: int = Query(100, ge=1, le=10000),
+):
+    # Answered from the in-process columnar snapshot, never from MongoDB
+    columns = report_columns_state.columns
+    if columns is None:
+        detail = ("Report columns are still loading" if settings.REPORT_COLUMNS_ENABLED
+                  else "Report columns are disabled (REPORT_COLUMNS_ENABLED)")
+        raise HTTPException(status_code=503, detail=detail)
+    result = columns.query(group_by, carrier=carrier, device=device, region=region, start=start, end=end,
+                           bbox=parse_bbox(bbox), limit=limit, histogram=histogram)
+    return {"start": start, "end": end, "group_by": group_by, **result}
@@ -1,71 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
-import os
 
 from ..database import get_database
 from ..schemas import UserCreate, UserLogin, UserResponse, Token
 from ..auth.utils import (
-    get_password_hash, verify_password,
+    get_password_hash_async, verify_password_async,
     create_access_token
 )
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 security = HTTPBearer()  # Reserved for future protected endpoints
 
-# ---------------------------------------------------------
-# OPTIONS HANDLERS - Handle preflight requests without DB dependency
-# ---------------------------------------------------------
-def get_allowed_origins():
-    """Get allowed origins from environment or use defaults"""
-    raw_origins = os.getenv("CORS_ORIGINS")
-    if raw_origins:
-        return [o.strip() for o in raw_origins.split(",") if o.strip()]
-    return [
-        "http://localhost:5173",
-        "http://localhost:5174",
-        "https://signal-scope-psi.vercel.app",
-    ]
-
-@router.options("/register")
-async def options_register(request: Request):
-    """Handle OPTIONS preflight for /register - no dependencies to avoid 500 errors"""
-    origin = request.headers.get("origin")
-    allowed_origins = get_allowed_origins()
-    
-    if origin and origin in allowed_origins:
-        return Response(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": origin,
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization",
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Max-Age": "3600",
-            }
-        )
-    return Response(status_code=200)
-
-@router.options("/login")
-async def options_login(request: Request):
-    """Handle OPTIONS preflight for /login - no dependencies to avoid 500 errors"""
-    origin = request.headers.get("origin")
-    allowed_origins = get_allowed_origins()
-    
-    if origin and origin in allowed_origins:
-        return Response(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": origin,
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization",
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Max-Age": "3600",
-            }
-        )
-    return Response(status_code=200)
-
 # ---------------------------------------------------------
 # REGISTER
 # ---------------------------------------------------------
@@ -75,7 +23,7 @@ async def register(user: UserCreate, db: AsyncIOMotorDatabase = Depends(get_data
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed = get_password_hash(user.password)
+    hashed = await get_password_hash_async(user.password)
 
     doc = {
         "email": user.email,
@@ -84,7 +32,11 @@ async def register(user: UserCreate, db: AsyncIOMotorDatabase = Depends(get_data
         "created_at": datetime.utcnow(),
     }
 
-    result = await db.users.insert_one(doc)
+    try:
+        result = await db.users.insert_one(doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration (unique email index)
+        raise HTTPException(status_code=400, detail="Email already registered")
     uid = str(result.inserted_id)
 
     token = create_access_token({"sub": uid})
@@ -101,7 +53,7 @@ async def register(user: UserCreate, db: AsyncIOMotorDatabase = Depends(get_data
 @router.post("/login", response_model=Token)
 async def login(user: UserLogin, db: AsyncIOMotorDatabase = Depends(get_database)):
     db_user = await db.users.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password_hash"]):
+    if not db_user or not await verify_password_async(user.password, db_user["password_hash"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
     uid = str(db_user["_id"])
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..clusters import report_clusters, tower_clusters
+from ..database import get_analytics_database
+from ..tower_index import TowerIndex, get_tower_index
+from ..utils.params import parse_bbox
+from ..utils.tiles import MAX_ZOOM
+
+router = APIRouter(prefix="/api/clusters", tags=["Clusters"])
+
+BBOX_DESCRIPTION = "min_lat,min_lng,max_lat,max_lng of the visible map"
+
+
+@router.get("/towers")
+async def get_tower_clusters(
+    bbox: str = Query(..., description=BBOX_DESCRIPTION),
+    zoom: int = Query(..., ge=0, le=MAX_ZOOM),
+    operator: Optional[str] = None,
+    index: TowerIndex = Depends(get_tower_index)
+):
+    """Tower clusters (count, centroid, towers per operator) for the visible map"""
+    return tower_clusters.get(index, parse_bbox(bbox), zoom, operator)
+
+
+@router.get("/reports")
+async def get_report_clusters(
+    bbox: str = Query(..., description=BBOX_DESCRIPTION),
+    zoom: int = Query(..., ge=0, le=MAX_ZOOM),
+    carrier: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    """Report clusters (count, centroid, mean/min signal per carrier) for the visible map"""
+    return await report_clusters(db, parse_bbox(bbox), zoom, carrier)
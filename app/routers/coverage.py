@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..config import settings
+from ..coverage_tiles import tile_cache
+from ..database import get_analytics_database
+from ..schemas import CoverageBatchRequest, CoverageBatchResponse, CoverageEstimate
+from ..tower_index import TowerIndex, get_tower_index
+from ..utils.coverage import best_server_results
+from ..utils.tiles import MAX_ZOOM
+
+router = APIRouter(prefix="/api/coverage", tags=["Coverage"])
+
+
+@router.get("/estimate", response_model=CoverageEstimate)
+async def estimate_coverage(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    operator: Optional[str] = None,
+    index: TowerIndex = Depends(get_tower_index)
+):
+    towers = index.coverage_candidates([lat], [lng], operator)
+    result = best_server_results([lat], [lng], towers)
+
+    return CoverageEstimate(
+        lat=lat,
+        lng=lng,
+        signal_strength=result["signal"][0],
+        operator=result["operator"][0],
+        tower_id=result["tower_id"][0],
+    )
+
+
+@router.post("/estimate", response_model=CoverageBatchResponse)
+async def estimate_coverage_batch(
+    request: CoverageBatchRequest,
+    index: TowerIndex = Depends(get_tower_index)
+):
+    if len(request.points) > settings.COVERAGE_MAX_POINTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.COVERAGE_MAX_POINTS} points per request"
+        )
+    if not request.points:
+        return CoverageBatchResponse(signal_strength=[], operator=[], tower_id=[])
+
+    lats = [p.lat for p in request.points]
+    lngs = [p.lng for p in request.points]
+
+    towers = index.coverage_candidates(lats, lngs, request.operator)
+    result = best_server_results(lats, lngs, towers)
+
+    return CoverageBatchResponse(
+        signal_strength=result["signal"],
+        operator=result["operator"],
+        tower_id=result["tower_id"],
+    )
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_coverage_tile(
+    z: int,
+    x: int,
+    y: int,
+    operator: Optional[str] = None,
+    format: str = Query("bin", pattern="^(bin|png)$"),
+    if_none_match: Optional[str] = Header(None),
+    index: TowerIndex = Depends(get_tower_index),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    """
+    Estimated dBm for one slippy-map tile.
+
+    `bin` is COVERAGE_TILE_SIZE^2 signed bytes, row-major from the north-west
+    corner; `png` is the same grid colour-mapped with no-coverage transparent.
+    """
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    tile = await tile_cache.get(db, index, z, x, y, operator)
+    # Clients revalidate every time; unchanged tiles cost a 304
+    headers = {"ETag": tile.etag, "Cache-Control": "no-cache"}
+    if if_none_match and tile.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if format == "png":
+        return Response(tile.png(), media_type="image/png", headers=headers)
+    headers["X-Tile-Size"] = str(tile_cache.size)
+    headers["X-Tile-Observed-Reports"] = str(tile.observed)
+    return Response(tile.data, media_type="application/octet-stream", headers=headers)
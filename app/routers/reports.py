@@ -1,48 +1,288 @@
-from fastapi import APIRouter, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
 
-from ..database import get_database
+from ..config import settings
+
+from ..database import get_analytics_database, get_database
 from ..schemas import ReportCreate, ReportResponse
-from ..auth.utils import verify_token
+from ..auth.utils import get_current_user_id
+from ..analytics.pipeline import on_reports_inserted
+from ..report_writer import report_writer
+from ..report_export import EXPORT_FORMATS, export_csv, export_ndjson
+from ..report_query import REPORT_PROJECTION, find_reports_page, find_tier_page, parse_fields, report_filter
+from ..report_storage import report_meta, timeseries_enabled
+from ..analytics.tiers import TIERS_BY_NAME, choose_resolution, is_exact, tier_filter
+from ..serialization import ListSerializer, dumps, json_response
+from ..utils.params import parse_bbox
 
 router = APIRouter(prefix="/api/reports", tags=["Reports"])
-security = HTTPBearer()
 
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
 
-@router.post("/", response_model=ReportResponse)
-async def create_report(
-    report: ReportCreate,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncIOMotorDatabase = Depends(get_database)
-):
-    user_id = verify_token(credentials.credentials)
+report_list = ListSerializer(ReportResponse)
 
-    doc = {
+
+def build_report_doc(user_id: str, report: ReportCreate, timestamp: datetime) -> dict:
+    return {
         "user_id": user_id,
         "lat": report.lat,
         "lng": report.lng,
         "carrier": report.carrier,
         "signal_strength": report.signal_strength,
         "device": report.device,
-        "timestamp": datetime.utcnow()
+        "timestamp": timestamp,
+        "location": {"type": "Point", "coordinates": [report.lng, report.lat]},
+        **({"meta": report_meta(report.carrier, report.lat, report.lng)} if timeseries_enabled() else {}),
     }
 
-    result = await db.reports.insert_one(doc)
-    doc["_id"] = result.inserted_id
 
-    return ReportResponse(**doc)
+@router.post("/", response_model=ReportResponse)
+async def create_report(
+    report: ReportCreate,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    doc = build_report_doc(user_id, report, datetime.utcnow())
+
+    if report_writer.running:
+        await report_writer.submit(doc)
+    else:
+        result = await db.reports.insert_one(doc)
+        doc["_id"] = result.inserted_id
+        await on_reports_inserted(db, [doc])
+
+    return ReportResponse(**{**doc, "_id": str(doc["_id"])})
+
+
+class BulkIngest:
+    """Validates reports one by one and writes them in unordered chunks"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, user_id: str):
+        self.db = db
+        self.user_id = user_id
+        self.timestamp = datetime.utcnow()
+        self.results: List[dict] = []
+        self.pending: List[tuple] = []  # (index, doc)
+        self.accepted = 0
+        self.overflow = 0  # NDJSON lines past REPORT_BULK_MAX_ITEMS, counted but not parsed
+
+    def reject(self, index: int, errors):
+        self.results.append({"index": index, "status": "rejected", "errors": errors})
+
+    async def add(self, index: int, item):
+        try:
+            report = ReportCreate.model_validate(item)
+        except ValidationError as e:
+            self.reject(index, e.errors(include_url=False, include_context=False))
+            return
+        self.pending.append((index, build_report_doc(self.user_id, report, self.timestamp)))
+        if len(self.pending) >= settings.REPORT_BULK_CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        chunk, self.pending = self.pending, []
+        docs = [doc for _, doc in chunk]
+
+        failed = {}
+        try:
+            await self.db.reports.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+
+        inserted = []
+        for position, (index, doc) in enumerate(chunk):
+            if position in failed:
+                self.reject(index, [{"msg": failed[position]}])
+            else:
+                inserted.append(doc)
+                self.results.append({"index": index, "status": "accepted", "id": str(doc["_id"])})
+        self.accepted += len(inserted)
+        if inserted:
+            await on_reports_inserted(self.db, inserted)
+
+    def summary(self) -> dict:
+        self.results.sort(key=lambda r: r["index"])
+        summary = {
+            "accepted": self.accepted,
+            "rejected": len(self.results) - self.accepted,
+            "results": self.results,
+        }
+        if self.overflow:
+            summary["overflow"] = self.overflow
+            summary["detail"] = f"At most {settings.REPORT_BULK_MAX_ITEMS} reports per request; the rest were ignored"
+        return summary
+
+
+@router.post("/bulk")
+async def create_reports_bulk(
+    request: Request,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Ingest many reports at once, as a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson, one report per line).
+
+    Items are validated individually; valid ones are written with unordered
+    insert_many in chunks of REPORT_BULK_CHUNK_SIZE. The response lists an
+    accepted/rejected result for every item, by position. NDJSON lines past
+    REPORT_BULK_MAX_ITEMS are only counted (`overflow`), never parsed.
+    """
+    ingest = BulkIngest(db, user_id)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_TYPES:
+        # Stream line by line so large uploads are written as they arrive
+        index, buffer = 0, b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                if index < settings.REPORT_BULK_MAX_ITEMS:
+                    await _add_json_line(ingest, index, line)
+                else:
+                    ingest.overflow += 1
+                index += 1
+        if buffer.strip():
+            if index < settings.REPORT_BULK_MAX_ITEMS:
+                await _add_json_line(ingest, index, buffer)
+            else:
+                ingest.overflow += 1
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of reports")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of reports")
+        if len(items) > settings.REPORT_BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.REPORT_BULK_MAX_ITEMS} reports per request"
+            )
+        for index, item in enumerate(items):
+            await ingest.add(index, item)
+
+    await ingest.flush()
+    return ingest.summary()
+
+
+async def _add_json_line(ingest: BulkIngest, index: int, line: bytes):
+    try:
+        item = json.loads(line)
+    except ValueError:
+        ingest.reject(index, [{"msg": "Invalid JSON"}])
+        return
+    await ingest.add(index, item)
+
+
+async def _reports_page(db, query: dict, limit: int, cursor: Optional[str],
+                        fields: Optional[str]) -> Response:
+    projection = parse_fields(fields)
+    docs, next_cursor = await find_reports_page(db, query, limit, cursor, projection or REPORT_PROJECTION)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+
+    if projection:
+        # Partial documents don't fit ReportResponse - return them as-is
+        return json_response(dumps(docs), headers)
+    return report_list.response(docs, headers)
+
+
+async def _tier_page(db, resolution: str, carrier: Optional[str], start: Optional[datetime],
+                     end: Optional[datetime], bbox, limit: int, cursor: Optional[str]) -> Response:
+    """
+    Downsampled buckets (carrier, geohash cell, hour/day) instead of raw
+    reports. `auto` picks the coarsest source whose buckets line up with
+    start/end; a window or bbox only the raw reports answer exactly is
+    served from those. X-Report-Approximate says when no source could.
+    """
+    if not timeseries_enabled():
+        raise HTTPException(status_code=400, detail="Downsampled tiers need REPORT_STORAGE=timeseries")
+    if resolution == "auto":
+        resolution, exact = choose_resolution(start, end, bbox)
+    else:
+        exact = is_exact(resolution, start, end, bbox)
+    if resolution == "raw":
+        response = await _reports_page(db, report_filter(carrier, start, end, bbox), limit, cursor, None)
+    else:
+        tier = TIERS_BY_NAME[resolution]
+        rows, next_cursor = await find_tier_page(db[tier.collection], tier_filter(tier, carrier, start, end, bbox),
+                                                 limit, cursor)
+        response = json_response(dumps(rows), {"X-Next-Cursor": next_cursor} if next_cursor else None)
+    response.headers["X-Report-Resolution"] = resolution
+    response.headers["X-Report-Approximate"] = "false" if exact else "true"
+    return response
 
 
 @router.get("/", response_model=List[ReportResponse])
 async def get_reports(
     carrier: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bbox: Optional[str] = Query(None, description="min_lat,min_lng,max_lat,max_lng"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields, e.g. lat,lng,signal_strength"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    resolution: str = Query("raw", pattern="^(raw|hour|day|auto)$",
+                            description="hour/day buckets instead of raw reports, or auto (REPORT_STORAGE=timeseries)"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    query = {"carrier": carrier} if carrier else {}
+    if resolution != "raw":
+        return await _tier_page(db, resolution, carrier, start, end, parse_bbox(bbox), limit, cursor)
+    query = report_filter(carrier, start, end, parse_bbox(bbox))
+    return await _reports_page(db, query, limit, cursor, fields)
 
-    reports = await db.reports.find(query).sort("timestamp", -1).limit(100).to_list(length=100)
-    return [ReportResponse(**r) for r in reports]
 
+@router.get("/user", response_model=List[ReportResponse])
+async def get_user_reports(
+    carrier: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bbox: Optional[str] = Query(None, description="min_lat,min_lng,max_lat,max_lng"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields, e.g. lat,lng,signal_strength"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    query = report_filter(carrier, start, end, parse_bbox(bbox), user_id=user_id)
+    return await _reports_page(db, query, limit, cursor, fields)
+
+
+@router.get("/export")
+async def export_reports(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    carrier: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bbox: Optional[str] = Query(None, description="min_lat,min_lng,max_lat,max_lng"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of fields, e.g. lat,lng,signal_strength"),
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    """
+    Every matching report, newest first, streamed as NDJSON (one report per
+    line) or CSV with a header row. No limit - the export is read from the
+    cursor in batches and never held in memory.
+    """
+    query = report_filter(carrier, start, end, parse_bbox(bbox))
+    projection = parse_fields(fields) or REPORT_PROJECTION
+    media_type, filename = EXPORT_FORMATS[format]
+    rows = export_csv(db, query, projection) if format == "csv" else export_ndjson(db, query, projection)
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
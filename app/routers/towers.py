@@ -1,27 +1,41 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, List
-from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from ..database import get_database
-from ..schemas import TowerResponse
+from ..schemas import TowerNearResponse
+from ..serialization import json_response
+from ..tower_index import TowerIndex, get_tower_index
+from ..utils.params import parse_bbox, parse_floats
 
 router = APIRouter(prefix="/api/towers", tags=["Towers"])
 
 
-@router.get("/", response_model=List[TowerResponse])
+@router.get("/", response_model=List[TowerNearResponse])
 async def get_towers(
     operator: Optional[str] = None,
     tech: Optional[str] = None,
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    near: Optional[str] = Query(None, description="lat,lng - returns the k nearest towers, or all within radius_km"),
+    k: int = Query(10, ge=1, le=1000),
+    radius_km: Optional[float] = Query(None, gt=0, le=1000),
+    bbox: Optional[str] = Query(None, description="min_lat,min_lng,max_lat,max_lng"),
+    limit: Optional[int] = Query(None, ge=1),
+    index: TowerIndex = Depends(get_tower_index)
 ):
-    query = {}
-    if operator and operator != "All":
-        query["operator"] = operator
-    if tech:
-        query["tech"] = {"$in": [tech]}
+    mask = index.mask(operator, tech)
 
-    towers_cursor = db.towers.find(query)
-    towers = await towers_cursor.to_list(length=1000)
+    if near:
+        lat, lng = parse_floats(near, 2, "near")
+        if radius_km:
+            idx, dist = index.grid.radius(lat, lng, radius_km, mask)
+        else:
+            idx, dist = index.grid.nearest(lat, lng, k, mask)
+        return json_response(index.render(idx[:limit], dist[:limit]))
 
-    return [TowerResponse(**tower) for tower in towers]
+    if bbox:
+        min_lat, min_lng, max_lat, max_lng = parse_bbox(bbox)
+        idx = index.grid.bbox(min_lat, min_lng, max_lat, max_lng, mask)
+    elif radius_km:
+        raise HTTPException(status_code=422, detail="'radius_km' requires 'near'")
+    else:
+        idx = index.all(mask)
 
+    return json_response(index.render(idx[:limit]))
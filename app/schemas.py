@@ -74,6 +74,30 @@ class TowerResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TowerNearResponse(TowerResponse):
+    # Only set in `near` mode
+    distance_km: Optional[float] = None
+
+class CarrierSignal(BaseModel):
+    carrier: str
+    count: int
+    mean_signal: Optional[float] = None
+    min_signal: Optional[int] = None
+    max_signal: Optional[int] = None
+    # Only from the time-series tiers or raw reports; null from the day rollups
+    p50: Optional[int] = None
+    p90: Optional[int] = None
+    p95: Optional[int] = None
+
+class CarrierAnalyticsResponse(BaseModel):
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    # "raw", "hour" or "day": the granularity the counts were read at
+    resolution: str
+    # True when the buckets read don't line up with [start, end]
+    approximate: bool
+    carriers: List[CarrierSignal]
+
 class ReportCreate(BaseModel):
     lat: float
     lng: float
@@ -96,3 +120,24 @@ class ReportResponse(BaseModel):
         populate_by_name = True
         arbitrary_types_allowed = True
 
+
+class CoveragePoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+class CoverageBatchRequest(BaseModel):
+    points: List[CoveragePoint]
+    operator: Optional[str] = None
+
+class CoverageEstimate(BaseModel):
+    lat: float
+    lng: float
+    signal_strength: int
+    operator: Optional[str] = None
+    tower_id: Optional[str] = None
+
+class CoverageBatchResponse(BaseModel):
+    # Column-oriented: index i in every list refers to points[i] of the request
+    signal_strength: List[int]
+    operator: List[Optional[str]]
+    tower_id: List[Optional[str]]
@@ -0,0 +1,432 @@
+"""
+Seed MongoDB with towers and reports for development, staging and capacity tests.
+
+    python -m app.seed demo                                      # the 8 sample towers
+    python -m app.seed generate --towers 200000 --reports 20000000
+    python -m app.seed generate --reports 1000000                # reports for existing towers
+    python -m app.seed import towers.csv --kind towers
+    python -m app.seed import reports.csv --kind reports
+
+Generated towers cluster around US metro areas in proportion to population,
+with a rural sprinkle, per-carrier technology mixes and mast heights. Each
+generated report sits at a random distance and bearing from a tower of its
+carrier and carries the signal estimate_signal_strength predicts there, plus
+Gaussian noise (--noise-db 0 reproduces the model exactly).
+
+Every document has a deterministic key - tower `id`, and a report `_id`
+derived from --seed and the report's position, or from the CSV row - and is
+written with unordered bulk upserts, so re-running a seed or an import
+converges on the same data instead of duplicating it. Up to --parallel
+batches are in flight at once and the write rate is printed as it goes.
+Report stats, rollups and clusters (and the tiers with
+REPORT_STORAGE=timeseries) are rebuilt once at the end.
+
+Time-series collections don't take upserts, so with
+REPORT_STORAGE=timeseries reports are plain inserts and a re-run adds
+them again.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import math
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import InsertOne, UpdateOne
+
+from .report_storage import timeseries_enabled, with_meta
+from .utils.coverage import TowerArrays, clamp_signal, signal_from_distance
+
+EARTH_RADIUS_KM = 6371.0
+
+# (lat, lng, metro population in millions)
+METROS = [
+    (40.7128, -74.0060, 19.6), (34.0522, -118.2437, 12.9), (41.8781, -87.6298, 9.4),
+    (32.7767, -96.7970, 7.9), (29.7604, -95.3698, 7.3), (38.9072, -77.0369, 6.3),
+    (39.9526, -75.1652, 6.2), (25.7617, -80.1918, 6.1), (33.7490, -84.3880, 6.2),
+    (42.3601, -71.0589, 4.9), (33.4484, -112.0740, 5.0), (37.7749, -122.4194, 4.6),
+    (34.1083, -117.2898, 4.7), (42.3314, -83.0458, 4.3), (47.6062, -122.3321, 4.0),
+    (44.9778, -93.2650, 3.7), (32.7157, -117.1611, 3.3), (27.9506, -82.4572, 3.3),
+    (39.7392, -104.9903, 3.0), (38.6270, -90.1994, 2.8), (39.2904, -76.6122, 2.8),
+    (35.2271, -80.8431, 2.7), (28.5383, -81.3792, 2.7), (29.4241, -98.4936, 2.6),
+    (45.5152, -122.6784, 2.5), (38.5816, -121.4944, 2.4), (40.4406, -79.9959, 2.4),
+    (36.1699, -115.1398, 2.3), (30.2672, -97.7431, 2.4), (39.1031, -84.5120, 2.3),
+    (39.0997, -94.5786, 2.2), (39.9612, -82.9988, 2.1), (39.7684, -86.1581, 2.1),
+    (41.4993, -81.6944, 2.1), (37.3382, -121.8863, 2.0), (36.1627, -86.7816, 2.0),
+]
+# Towers along the highways and small towns between metros
+RURAL_SHARE = 0.12
+RURAL_SIGMA_DEG = 1.5
+# Metro spread grows with the square root of population (~18 km for 1M people)
+METRO_SIGMA_DEG = 0.16
+
+# carrier -> (share of towers, [(tech, probability)])
+CARRIERS = {
+    "Verizon": (0.36, [(["LTE", "5G"], 0.55), (["LTE"], 0.35), (["5G"], 0.10)]),
+    "AT&T": (0.33, [(["LTE", "5G"], 0.50), (["LTE"], 0.45), (["5G"], 0.05)]),
+    "T-Mobile": (0.31, [(["LTE", "5G"], 0.70), (["5G"], 0.20), (["LTE"], 0.10)]),
+}
+DEVICES = [("iPhone 15", 0.30), ("iPhone 14", 0.18), ("Galaxy S24", 0.16), ("Pixel 8", 0.10),
+           ("Galaxy A54", 0.10), ("Moto G", 0.08), ("OnePlus 12", 0.08)]
+
+# Reports are taken near a tower: exponential distance with this mean
+REPORT_MEAN_KM = 4.0
+
+DEMO_TOWERS = [
+    {"id": "t1", "lat": 40.7128, "lng": -74.0060, "operator": "T-Mobile", "height": 150, "tech": ["LTE", "5G"]},
+    {"id": "t2", "lat": 34.0522, "lng": -118.2437, "operator": "Verizon", "height": 120, "tech": ["LTE", "5G"]},
+    {"id": "t3", "lat": 41.8781, "lng": -87.6298, "operator": "AT&T", "height": 180, "tech": ["LTE"]},
+    {"id": "t4", "lat": 29.7604, "lng": -95.3698, "operator": "T-Mobile", "height": 140, "tech": ["LTE", "5G"]},
+    {"id": "t5", "lat": 33.4484, "lng": -112.0740, "operator": "Verizon", "height": 160, "tech": ["LTE", "5G"]},
+    {"id": "t6", "lat": 39.7392, "lng": -104.9903, "operator": "T-Mobile", "height": 130, "tech": ["5G"]},
+    {"id": "t7", "lat": 47.6062, "lng": -122.3321, "operator": "AT&T", "height": 170, "tech": ["LTE", "5G"]},
+    {"id": "t8", "lat": 37.7749, "lng": -122.4194, "operator": "T-Mobile", "height": 145, "tech": ["LTE", "5G"]},
+]
+
+REPORT_ID = struct.Struct(">IQ")
+
+
+def _location(lat: float, lng: float) -> dict:
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def _choose(rng: np.random.Generator, options: List[tuple], count: int) -> np.ndarray:
+    weights = np.array([w for _, w in options], dtype=np.float64)
+    return rng.choice(len(options), size=count, p=weights / weights.sum())
+
+
+def destination(lats, lngs, distance_km, bearing):
+    """Points distance_km away from (lats, lngs) along bearing (radians), on the sphere"""
+    phi1, lam1 = np.radians(lats), np.radians(lngs)
+    delta = np.asarray(distance_km) / EARTH_RADIUS_KM
+    phi2 = np.arcsin(np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(bearing))
+    lam2 = lam1 + np.arctan2(np.sin(bearing) * np.sin(delta) * np.cos(phi1),
+                             np.cos(delta) - np.sin(phi1) * np.sin(phi2))
+    return np.degrees(phi2), (np.degrees(lam2) + 540) % 360 - 180
+
+
+def generate_towers(count: int, rng: np.random.Generator, start: int = 0, prefix: str = "gen") -> List[dict]:
+    """Towers clustered around METROS; ids are prefix-<position> so reruns upsert in place"""
+    metros = np.array(METROS)
+    rural = rng.random(count) < RURAL_SHARE
+    metro = _choose(rng, [(m, m[2]) for m in METROS], count)
+    sigma = np.where(rural, RURAL_SIGMA_DEG, METRO_SIGMA_DEG * np.sqrt(metros[metro, 2]))
+    lats = metros[metro, 0] + rng.normal(0, 1, count) * sigma
+    lngs = metros[metro, 1] + rng.normal(0, 1, count) * sigma / np.cos(np.radians(metros[metro, 0]))
+    # Rural masts are taller and sparser
+    heights = np.clip(rng.normal(np.where(rural, 150, 90), 35), 15, 300).astype(int)
+
+    carrier_names = list(CARRIERS)
+    operators = _choose(rng, [(c, CARRIERS[c][0]) for c in carrier_names], count)
+    techs = np.empty(count, dtype=np.int64)
+    for i, name in enumerate(carrier_names):
+        mask = operators == i
+        techs[mask] = _choose(rng, CARRIERS[name][1], int(mask.sum()))
+
+    towers = []
+    for i, lat, lng, operator, height, tech in zip(range(start, start + count), lats.tolist(), lngs.tolist(),
+                                                   operators.tolist(), heights.tolist(), techs.tolist()):
+        name = carrier_names[operator]
+        towers.append({
+            "id": f"{prefix}-{i}",
+            "lat": round(lat, 6),
+            "lng": round(lng, 6),
+            "operator": name,
+            "height": height,
+            "tech": list(CARRIERS[name][1][tech][0]),
+            "location": _location(round(lat, 6), round(lng, 6)),
+        })
+    return towers
+
+
+def generate_reports(towers: TowerArrays, count: int, rng: np.random.Generator, seed: int, start: int,
+                     end: datetime, days: float, users: int, noise_db: float) -> List[dict]:
+    """Reports around random towers, with the model signal at their position plus noise"""
+    idx = rng.integers(0, len(towers), count)
+    distance = rng.exponential(REPORT_MEAN_KM, count)
+    lats, lngs = destination(towers.lats[idx], towers.lngs[idx], distance, rng.uniform(0, 2 * math.pi, count))
+    raw = signal_from_distance(distance, towers.height_bonus[idx])
+    if noise_db:
+        raw = raw + rng.normal(0, noise_db, count)
+    signals = clamp_signal(raw)
+    offsets = rng.uniform(0, days * 86400, count)
+    devices = _choose(rng, DEVICES, count)
+    user_ids = rng.integers(1, users + 1, count)
+    operators = towers.operators[idx]
+
+    end_ts = end.timestamp()
+    reports = []
+    for i, lat, lng, carrier, signal, offset, device, user in zip(
+            range(start, start + count), np.round(lats, 6).tolist(), np.round(lngs, 6).tolist(),
+            operators.tolist(), signals.tolist(), offsets.tolist(), devices.tolist(), user_ids.tolist()):
+        reports.append({
+            "_id": ObjectId(REPORT_ID.pack(seed & 0xFFFFFFFF, i)),
+            "user_id": f"seed-user-{user}",
+            "lat": lat,
+            "lng": lng,
+            "carrier": carrier,
+            "signal_strength": signal,
+            "device": DEVICES[device][0],
+            "timestamp": datetime.utcfromtimestamp(round(end_ts - offset, 3)),
+            "location": _location(lat, lng),
+        })
+    return reports
+
+
+def _row_id(row: Dict[str, str]) -> ObjectId:
+    """Stable _id for a CSV row without one, so a re-import matches it"""
+    if row.get("id") and ObjectId.is_valid(row["id"]):
+        return ObjectId(row["id"])
+    canonical = "\x1f".join(f"{k}={v}" for k, v in sorted(row.items()) if k != "id")
+    return ObjectId(hashlib.blake2b(canonical.encode(), digest_size=12).digest())
+
+
+def tower_from_row(row: Dict[str, str]) -> dict:
+    lat, lng = float(row["lat"]), float(row["lng"])
+    tech = (row.get("tech") or "").replace(";", "|").replace(",", "|")
+    return {
+        "id": row["id"].strip(),
+        "lat": lat,
+        "lng": lng,
+        "operator": row["operator"].strip(),
+        "height": int(float(row.get("height") or 0)),
+        "tech": [t.strip() for t in tech.split("|") if t.strip()],
+        "location": _location(lat, lng),
+    }
+
+
+def report_from_row(row: Dict[str, str], now: datetime) -> dict:
+    lat, lng = float(row["lat"]), float(row["lng"])
+    timestamp = row.get("timestamp")
+    return {
+        "_id": _row_id(row),
+        "user_id": row.get("user_id") or "import",
+        "lat": lat,
+        "lng": lng,
+        "carrier": row["carrier"].strip(),
+        "signal_strength": int(float(row["signal_strength"])),
+        "device": row.get("device") or "unknown",
+        "timestamp": datetime.fromisoformat(timestamp.replace("Z", "+00:00")).replace(tzinfo=None)
+        if timestamp else now,
+        "location": _location(lat, lng),
+    }
+
+
+def read_csv(path: str, kind: str, batch_size: int) -> Iterator[List[dict]]:
+    """Batches of documents from a CSV with a header row; bad rows are skipped with a warning"""
+    convert = tower_from_row if kind == "towers" else (lambda row: report_from_row(row, datetime.utcnow()))
+    skipped = 0
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        batch = []
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                batch.append(convert(row))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                skipped += 1
+                if skipped <= 10:
+                    print(f"[WARN] {path}:{line}: skipping row ({type(e).__name__}: {e})")
+                continue
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    if skipped:
+        print(f"[WARN] Skipped {skipped} invalid row(s) in {path}")
+
+
+def tower_upsert(doc: dict, now: datetime) -> UpdateOne:
+    # Towers are reference data: a re-import updates them in place
+    return UpdateOne({"id": doc["id"]}, {"$set": doc, "$setOnInsert": {"created_at": now}}, upsert=True)
+
+
+def report_upsert(doc: dict, now: datetime) -> UpdateOne:
+    # Reports are immutable measurements: insert if absent, otherwise no-op
+    fields = {k: v for k, v in doc.items() if k != "_id"}
+    return UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": fields}, upsert=True)
+
+
+def report_insert(doc: dict, now: datetime) -> InsertOne:
+    # Time-series reports: no upserts, so reruns are not idempotent
+    return InsertOne(with_meta(doc))
+
+
+class BulkLoader:
+    """Writes batches as unordered bulk upserts, up to `parallel` at a time, and reports progress"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, kind: str, parallel: int, total: Optional[int] = None):
+        self.collection = db[kind]
+        self.kind = kind
+        if kind == "towers":
+            self.to_request = tower_upsert
+        else:
+            self.to_request = report_insert if timeseries_enabled() else report_upsert
+        self.total = total
+        self.semaphore = asyncio.Semaphore(parallel)
+        self.tasks = set()
+        self.written = self.upserted = self.modified = 0
+        self.started = self.reported = time.perf_counter()
+
+    async def add(self, docs: List[dict]):
+        await self.semaphore.acquire()
+        now = datetime.utcnow()
+        requests = [self.to_request(doc, now) for doc in docs]
+        task = asyncio.create_task(self._write(requests))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _write(self, requests: List[UpdateOne]):
+        try:
+            result = await self.collection.bulk_write(requests, ordered=False)
+        finally:
+            self.semaphore.release()
+        self.written += len(requests)
+        self.upserted += result.upserted_count + result.inserted_count
+        self.modified += result.modified_count
+        if time.perf_counter() - self.reported >= 2:
+            self.progress()
+
+    def rate(self) -> float:
+        return self.written / max(time.perf_counter() - self.started, 1e-9)
+
+    def progress(self, done: bool = False):
+        self.reported = time.perf_counter()
+        of = f" / {self.total:,}" if self.total else ""
+        print(f"{'[OK]' if done else '    '} {self.kind}: {self.written:,}{of} written "
+              f"({self.rate():,.0f} docs/s, {self.rate() * 60 / 1e6:.2f}M/min; "
+              f"{self.upserted:,} new, {self.modified:,} updated)", flush=True)
+
+    async def finish(self):
+        # Raises the first bulk write error, after every batch has settled
+        results = await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.progress(done=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+
+async def load_batches(db: AsyncIOMotorDatabase, kind: str, batches: Iterable[List[dict]],
+                       parallel: int, total: Optional[int] = None) -> BulkLoader:
+    loader = BulkLoader(db, kind, parallel, total)
+    for batch in batches:
+        await loader.add(batch)
+    await loader.finish()
+    return loader
+
+
+async def _existing_towers(db: AsyncIOMotorDatabase) -> TowerArrays:
+    from .tower_index import TOWER_FIELDS
+
+    towers = await db.towers.find({}, TOWER_FIELDS).to_list(length=None)
+    return TowerArrays(towers)
+
+
+async def generate(db: AsyncIOMotorDatabase, args) -> bool:
+    """Returns True when reports were written"""
+    rng = np.random.default_rng(args.seed)
+    if args.towers:
+        tower_batches = (generate_towers(min(args.batch_size, args.towers - start), rng, start, args.prefix)
+                         for start in range(0, args.towers, args.batch_size))
+        await load_batches(db, "towers", tower_batches, args.parallel, args.towers)
+    if not args.reports:
+        return False
+
+    towers = await _existing_towers(db)
+    if not len(towers):
+        print("[ERROR] No towers to place reports around - generate or import towers first")
+        return False
+    end = datetime.fromisoformat(args.end) if args.end else datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    report_batches = (
+        generate_reports(towers, min(args.batch_size, args.reports - start), rng, args.seed, start,
+                         end, args.days, args.users, args.noise_db)
+        for start in range(0, args.reports, args.batch_size)
+    )
+    await load_batches(db, "reports", report_batches, args.parallel, args.reports)
+    return True
+
+
+async def _main(args) -> int:
+    from .analytics.report_stats import rebuild_report_stats
+    from .analytics.rollups import rebuild_rollups
+    from .analytics.tiers import rebuild_report_tiers
+    from .clusters import rebuild_report_clusters
+    from .database import close_mongo_connection, connect_to_mongo, get_database
+    from .indexes import ensure_indexes
+    from .report_storage import ensure_report_storage
+    from .response_cache import response_cache
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        # The upsert keys (towers.id, reports._id) must be indexed before
+        # loading; a time-series reports collection must exist before that
+        await ensure_report_storage(db)
+        await ensure_indexes(db)
+
+        if args.command == "demo":
+            await load_batches(db, "towers", [[dict(t, location=_location(t["lat"], t["lng"]))
+                                               for t in DEMO_TOWERS]], 1, len(DEMO_TOWERS))
+            wrote_reports = False
+        elif args.command == "generate":
+            wrote_reports = await generate(db, args)
+        else:
+            await load_batches(db, args.kind, read_csv(args.path, args.kind, args.batch_size), args.parallel)
+            wrote_reports = args.kind == "reports"
+
+        if wrote_reports and not args.skip_views:
+            started = time.perf_counter()
+            await rebuild_report_stats(db)
+            counted = await rebuild_rollups(db)
+            await rebuild_report_clusters(db)
+            if timeseries_enabled():
+                await rebuild_report_tiers(db)
+            print(f"[OK] Rebuilt report stats, rollups and clusters from {counted:,} reports "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+        # Only reaches other workers with the shared (redis) backend; the
+        # in-process caches pick the change up through the tower watcher
+        await response_cache.invalidate("towers", "reports")
+        return 0
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--batch-size", type=int, default=5000, help="documents per bulk write")
+    common.add_argument("--parallel", type=int, default=8, help="bulk writes in flight at once")
+    common.add_argument("--skip-views", action="store_true", help="don't rebuild report stats/rollups afterwards")
+
+    parser = argparse.ArgumentParser(description="Seed MongoDB with generated or imported towers and reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("demo", parents=[common], help="upsert the 8 sample towers")
+
+    gen = commands.add_parser("generate", parents=[common], help="generate synthetic towers and/or reports")
+    gen.add_argument("--towers", type=int, default=0)
+    gen.add_argument("--reports", type=int, default=0, help="placed around all towers in the database")
+    gen.add_argument("--seed", type=int, default=1, help="same seed + counts = same documents")
+    gen.add_argument("--prefix", default="gen", help="generated tower ids are <prefix>-<n>")
+    gen.add_argument("--users", type=int, default=10000, help="distinct reporting user ids")
+    gen.add_argument("--days", type=float, default=90, help="reports are spread over this many days")
+    gen.add_argument("--end", default="", help="newest report time, ISO 8601 (default: today 00:00 UTC)")
+    gen.add_argument("--noise-db", type=float, default=4.0, help="std-dev of signal noise around the model")
+
+    imp = commands.add_parser("import", parents=[common], help="import towers or reports from a CSV file with a header row")
+    imp.add_argument("path")
+    imp.add_argument("--kind", choices=("towers", "reports"), required=True)
+
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Fast JSON path for list endpoints.
+
+Documents come out of Mongo already projected to the response shape, so the
+list is either validated once with a TypeAdapter and dumped by pydantic-core,
+or (VALIDATE_LIST_RESPONSES=false) handed straight to orjson. Both return a
+ready Response, which skips FastAPI's per-item response_model validation and
+jsonable_encoder pass; response_model stays on the route for the docs.
+"""
+from typing import List, Optional, Type
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from .config import settings
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def json_response(body: bytes, headers: Optional[dict] = None) -> Response:
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class ListSerializer:
+    def __init__(self, model: Type[BaseModel]):
+        self.adapter = TypeAdapter(List[model])
+
+    def render(self, rows: List[dict], validate: Optional[bool] = None) -> bytes:
+        if settings.VALIDATE_LIST_RESPONSES if validate is None else validate:
+            return self.adapter.dump_json(self.adapter.validate_python(rows), by_alias=True)
+        return dumps(rows)
+
+    def response(self, rows: List[dict], headers: Optional[dict] = None) -> Response:
+        return json_response(self.render(rows), headers)
@@ -0,0 +1,89 @@
+"""
+Multi-worker entry point.
+
+    python -m app.serve [--workers N] [--host H] [--port P]
+
+Starts WEB_CONCURRENCY (or --workers) uvicorn worker processes, one per
+available CPU by default. Each worker opens its own MongoDB pool, bcrypt pool and
+background tasks in its startup hook, so nothing that holds sockets or
+threads is created before the worker exists. The tower index is shared
+between workers through app.tower_snapshot.
+
+Servers that fork an already-imported app (gunicorn --preload) are covered
+by reset_process_state, registered as an after-fork hook in app.main.
+"""
+import argparse
+import os
+import time
+
+from .config import settings
+
+
+def worker_count(configured: int = 0) -> int:
+    if configured > 0:
+        return configured
+    try:
+        # CPUs this process may run on (respects taskset/cpusets)
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def reset_process_state():
+    """Drop per-process resources inherited from the parent after a fork"""
+    from .admission import admission
+    from .auth.utils import password_pool
+    from .database import db
+    from .instrumentation import loop_lag_monitor, pool_listener
+    from .report_columns import report_columns_state
+    from .report_writer import report_writer
+    from .response_cache import response_cache
+    from .startup import startup_state
+    from .tower_index import tower_index_state
+
+    # The parent's sockets, threads and tasks don't exist in the child;
+    # everything below is recreated lazily on first use or in startup
+    db.client = db.database = db.analytics = db.connect_lock = None
+    pool_listener.pools = {}
+    password_pool.executor = password_pool.semaphore = None
+    password_pool.queued = password_pool.in_flight = 0
+    report_writer.task = report_writer.queue = None
+    loop_lag_monitor.task = None
+    startup_state.task = None
+    tower_index_state.watcher = tower_index_state.lock = None
+    # Keep the copy-on-write index pages but recheck them once the worker runs
+    tower_index_state.stale = True
+    report_columns_state.watcher = None
+    if hasattr(response_cache.backend, "reset"):
+        response_cache.backend.reset()
+    for route_class in admission.classes.values():
+        route_class.semaphore = None
+        route_class.queued = route_class.in_flight = 0
+    if hasattr(admission.buckets, "reset"):
+        admission.buckets.reset()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--app", default="app.main:app", help="ASGI app import string")
+    parser.add_argument("--factory", action="store_true", help="--app names a function returning the app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY,
+                        help="worker processes (default: WEB_CONCURRENCY; 0 = one per CPU)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    workers = worker_count(args.workers)
+    # Workers treat any shared tower snapshot older than this as stale
+    os.environ.setdefault("SIGNALSCOPE_STARTED_AT", repr(time.time()))
+    print(f"[OK] Starting {workers} worker(s) on {args.host}:{args.port}")
+    if workers > 1 and settings.RESPONSE_CACHE_BACKEND == "off":
+        print("[WARN] RESPONSE_CACHE_BACKEND=off: coverage tiles are only invalidated "
+              "in the worker that stored the reports")
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=workers, factory=args.factory)
+
+
+if __name__ == "__main__":
+    main()
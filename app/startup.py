@@ -0,0 +1,178 @@
+"""
+Startup sequencing, readiness and cold-start timing.
+
+The startup steps (MongoDB connect, report writer, tower watcher, report
+column watcher, report storage, indexes, materialized views) run in order from the app's startup hook:
+
+- STARTUP_MODE=blocking waits for all of them, so uvicorn accepts
+  connections only once MongoDB answered - up to serverSelectionTimeoutMS
+  after a cold start.
+- STARTUP_MODE=background runs them in a task and returns at once, so the
+  port binds right after import. The connect is retried with backoff;
+  requests that need the database wait for the same connect attempt
+  (database.ensure_connected) rather than for the whole sequence.
+
+GET /healthz is liveness (the process answers) and GET /readyz readiness
+(every step done; 503 with the pending or failed step until then). Each
+step's duration and the time from process start to the first served
+request are logged and exported on /metrics.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from .config import settings
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODES = ("blocking", "background")
+PROBE_PATHS = ("/healthz", "/readyz")
+
+
+def process_start_time() -> float:
+    """Wall-clock time this process was created (Linux), else the time of this import"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime, clock ticks after boot); comm may contain spaces
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupState:
+    def __init__(self):
+        self.process_started = process_start_time()
+        self.step: Optional[str] = None  # running or failed step
+        self.error: Optional[str] = None
+        self.ready = False
+        self.steps: Dict[str, float] = {}  # step -> seconds
+        self.first_request_seconds: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def since_start(self) -> float:
+        return time.time() - self.process_started
+
+    def request_served(self, path: str):
+        """Called for every response; only the first non-probe request is recorded"""
+        if self.first_request_seconds is None and path not in PROBE_PATHS:
+            self.first_request_seconds = self.since_start()
+            startup_seconds.set(self.first_request_seconds, step="first_request")
+            print(f"[OK] First request served {self.first_request_seconds:.2f}s after process start")
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "mode": settings.STARTUP_MODE,
+            "step": self.step,
+            "error": self.error,
+            "steps": {name: round(seconds, 3) for name, seconds in self.steps.items()},
+            "first_request_seconds": (round(self.first_request_seconds, 3)
+                                      if self.first_request_seconds is not None else None),
+        }
+
+
+startup_state = StartupState()
+
+startup_seconds = Gauge("startup_seconds", "Seconds per startup step; import/ready/first_request since process start",
+                        labels=("step",))
+Gauge("startup_ready", "1 once every startup step has completed", fn=lambda: int(startup_state.ready))
+
+
+async def _timed(name: str, step):
+    startup_state.step = name
+    started = time.perf_counter()
+    await step()
+    startup_state.steps[name] = time.perf_counter() - started
+    startup_seconds.set(startup_state.steps[name], step=name)
+
+
+async def _connect_with_retry():
+    from .database import ensure_connected
+
+    delay = 1.0
+    while True:
+        try:
+            await ensure_connected()
+            return
+        except Exception as e:
+            startup_state.error = f"connect: {e}"
+            print(f"[WARN] MongoDB not reachable yet ({e}); retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.STARTUP_RETRY_MAX_SECONDS)
+
+
+async def run_startup(retry: bool = False):
+    """Connect and initialize everything the API needs; marks the state ready"""
+    # Imported here so the import path stays light when the steps run in the background
+    from .analytics.pipeline import ensure_materialized_views
+    from .database import connect_to_mongo, get_database
+    from .indexes import check_report_locations, ensure_indexes
+    from .report_columns import start_report_columns
+    from .report_storage import ensure_report_storage, timeseries_enabled
+    from .report_writer import report_writer
+    from .tower_index import start_tower_watcher
+
+    await _timed("connect", _connect_with_retry if retry else connect_to_mongo)
+    startup_state.error = None
+    database = await get_database()
+    if settings.REPORT_WRITE_MODE == "write_behind":
+        report_writer.start(database)
+    start_tower_watcher(database)
+    if settings.REPORT_COLUMNS_ENABLED:
+        # Loads in the background; /api/analytics/reports answers 503 until then
+        start_report_columns(database)
+    if timeseries_enabled():
+        # Before the indexes, which would create reports as a regular collection
+        await _timed("report_storage", lambda: ensure_report_storage(database))
+    if settings.ENSURE_INDEXES_ON_STARTUP:
+        await _timed("indexes", lambda: ensure_indexes(database))
+    await _timed("report_locations", lambda: check_report_locations(database))
+    await _timed("materialized_views", lambda: ensure_materialized_views(database))
+
+    startup_state.step = None
+    startup_state.ready = True
+    startup_seconds.set(startup_state.since_start(), step="ready")
+    print(f"[OK] Ready {startup_state.since_start():.2f}s after process start "
+          f"({', '.join(f'{k} {v:.2f}s' for k, v in startup_state.steps.items())})")
+
+
+async def _run_in_background():
+    try:
+        await run_startup(retry=True)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        startup_state.error = f"{startup_state.step}: {e}"
+        logger.exception("[ERROR] Startup step %r failed", startup_state.step)
+
+
+async def start():
+    """Startup hook body: run the steps now or schedule them, per STARTUP_MODE"""
+    from .report_storage import STORAGE_MODES
+
+    if settings.STARTUP_MODE not in STARTUP_MODES:
+        raise ValueError(f"Unknown STARTUP_MODE {settings.STARTUP_MODE!r} (expected one of {', '.join(STARTUP_MODES)})")
+    if settings.REPORT_STORAGE not in STORAGE_MODES:
+        raise ValueError(f"Unknown REPORT_STORAGE {settings.REPORT_STORAGE!r} "
+                         f"(expected one of {', '.join(STORAGE_MODES)})")
+    startup_seconds.set(startup_state.since_start(), step="import")
+    if settings.STARTUP_MODE == "background":
+        startup_state.task = asyncio.create_task(_run_in_background())
+    else:
+        await run_startup()
+
+
+async def stop():
+    if startup_state.task is not None:
+        startup_state.task.cancel()
+        try:
+            await startup_state.task
+        except asyncio.CancelledError:
+            pass
+        startup_state.task = None
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import time
+import numpy as np
+import orjson
+from typing import Callable, Dict, List, Optional, Sequence
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import TypeAdapter, ValidationError
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .config import settings
+from .database import get_database
+from .response_cache import response_cache
+from .schemas import TowerResponse
+from .serialization import dumps
+from .tower_snapshot import Snapshot, read_snapshot, snapshot_dir, snapshot_path, writer_lock, write_snapshot
+from .utils.coverage import TowerArrays, candidate_box
+from .utils.spatial_index import GridIndex
+
+TOWER_WATCH_MAX_BACKOFF_SECONDS = 60
+TOWER_FIELDS = {"_id": 0, "id": 1, "lat": 1, "lng": 1, "operator": 1, "height": 1, "tech": 1}
+
+_tower_adapter = TypeAdapter(TowerResponse)
+
+
+def _validate_towers(towers: List[dict]) -> List[dict]:
+    """TowerResponse-shaped towers; documents that don't fit are skipped"""
+    valid = []
+    for tower in towers:
+        try:
+            valid.append(_tower_adapter.validate_python(tower).model_dump())
+        except ValidationError as e:
+            print(f"[WARN] Skipping invalid tower {tower.get('id')}: {e.error_count()} error(s)")
+    return valid
+
+
+class SnapshotTowers(Sequence):
+    """Tower dicts decoded from a snapshot's JSON rows on access, never all at once"""
+
+    def __init__(self, rows: List[memoryview]):
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i: int) -> dict:
+        return orjson.loads(self.rows[i])
+
+
+class TowerIndex:
+    """Immutable in-memory snapshot of the towers collection with a spatial index"""
+
+    def __init__(self, towers: List[dict], cell_deg: float = 0.25):
+        # Validated once per load; responses reuse the pre-encoded JSON rows
+        self.towers = _validate_towers(towers)
+        self.rows = [dumps(t) for t in self.towers]
+        self.arrays = TowerArrays(self.towers)
+        self.grid = GridIndex(self.arrays.lats, self.arrays.lngs, cell_deg)
+        self._tech_masks = {}
+        self.snapshot: Optional[Snapshot] = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot, cell_deg: float = 0.25) -> "TowerIndex":
+        """Index over a shared snapshot; rows and numeric columns stay in the mapping"""
+        index = object.__new__(cls)
+        # Already validated by the worker that wrote the snapshot
+        index.towers = SnapshotTowers(snapshot.rows)
+        index.rows = snapshot.rows
+        index.arrays = TowerArrays.from_columns(
+            snapshot.ids, snapshot.operators, snapshot.lats, snapshot.lngs, snapshot.heights, snapshot.xyz)
+        index.grid = GridIndex(index.arrays.lats, index.arrays.lngs, cell_deg)
+        index._tech_masks = {}
+        index.snapshot = snapshot
+        return index
+
+    def __len__(self) -> int:
+        return len(self.towers)
+
+    def mask(self, operator: Optional[str] = None, tech: Optional[str] = None) -> Optional[np.ndarray]:
+        """Boolean filter over all towers, None when nothing is filtered"""
+        mask = None
+        if operator and operator != "All":
+            mask = self.arrays.operators == operator
+        if tech:
+            if tech not in self._tech_masks:
+                # The only full pass over the tower dicts, once per tech
+                self._tech_masks[tech] = np.array([tech in t.get("tech", []) for t in self.towers], dtype=bool)
+            mask = self._tech_masks[tech] if mask is None else mask & self._tech_masks[tech]
+        return mask
+
+    def all(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        if mask is None:
+            return np.arange(len(self.towers))
+        return np.nonzero(mask)[0]
+
+    def count_by_operator(self) -> Dict[str, int]:
+        operators, counts = np.unique(self.arrays.operators.astype(str), return_counts=True)
+        return dict(zip(operators.tolist(), counts.tolist()))
+
+    def coverage_candidates(self, lats, lngs, operator: Optional[str] = None) -> TowerArrays:
+        """Towers close enough to serve any of the points, for the coverage engine"""
+        idx = self.grid.bbox(*candidate_box(lats, lngs), mask=self.mask(operator))
+        return self.arrays.take(idx)
+
+    def docs(self, idx, distances=None) -> List[dict]:
+        if distances is None:
+            return [self.towers[i] for i in idx.tolist()]
+        return [
+            {**self.towers[i], "distance_km": round(d, 3)}
+            for i, d in zip(idx.tolist(), distances.tolist())
+        ]
+
+    def render(self, idx, distances=None) -> bytes:
+        """JSON array of the towers at idx"""
+        if distances is None:
+            rows = self.rows
+            return b"[" + b",".join([rows[i] for i in idx.tolist()]) + b"]"
+        return dumps(self.docs(idx, distances))
+
+
+class TowerIndexState:
+    index: Optional[TowerIndex] = None
+    stale: bool = True
+    loaded_at: float = 0.0
+    # Wall clock of the last invalidation; shared snapshots read from Mongo
+    # before this are stale. Starts at server launch so a restart rescans.
+    invalidated_at: float = float(os.environ.get("SIGNALSCOPE_STARTED_AT") or time.time())
+    watcher: Optional[asyncio.Task] = None
+    lock: Optional[asyncio.Lock] = None
+    # Called as listener(old_index, new_index) after every reload
+    reload_listeners: List[Callable] = []
+
+tower_index_state = TowerIndexState()
+
+
+async def _scan_towers(db: AsyncIOMotorDatabase) -> TowerIndex:
+    """Read every tower (no truncation) and build a fresh index"""
+    towers = await db.towers.find({}, TOWER_FIELDS).to_list(length=None)
+    return TowerIndex(towers, settings.TOWER_INDEX_CELL_DEG)
+
+
+async def load_tower_index(db: AsyncIOMotorDatabase) -> TowerIndex:
+    """
+    Fresh index, from the snapshot another worker wrote if it is newer than
+    our last invalidation, otherwise from MongoDB (then shared as a snapshot).
+    """
+    if not settings.TOWER_SNAPSHOT_ENABLED:
+        return await _scan_towers(db)
+
+    path = snapshot_path(snapshot_dir(settings.TOWER_SNAPSHOT_DIR), db.name)
+    newer_than = tower_index_state.invalidated_at
+    async with writer_lock(path):
+        # Under the lock: if a sibling worker just wrote one, use it
+        snapshot = read_snapshot(path, newer_than)
+        if snapshot is not None:
+            return TowerIndex.from_snapshot(snapshot, settings.TOWER_INDEX_CELL_DEG)
+
+        read_at = time.time()
+        index = await _scan_towers(db)
+        try:
+            write_snapshot(path, index.arrays, index.rows, read_at)
+        except OSError as e:
+            print(f"[WARN] Could not write tower snapshot {path}: {e}")
+        return index
+
+
+def invalidate_tower_index():
+    """Force a reload on next use - call after writing to db.towers"""
+    tower_index_state.stale = True
+    tower_index_state.invalidated_at = time.time()
+
+
+async def get_tower_index(db: AsyncIOMotorDatabase = Depends(get_database)) -> TowerIndex:
+    state = tower_index_state
+    if state.index is not None and not state.stale:
+        return state.index
+
+    if state.lock is None:
+        state.lock = asyncio.Lock()
+    async with state.lock:
+        # Another request may have reloaded while we waited
+        if state.index is None or state.stale:
+            state.stale = False
+            old = state.index
+            try:
+                state.index = await load_tower_index(db)
+                state.loaded_at = time.monotonic()
+            except Exception:
+                state.stale = True
+                raise
+            print(f"[OK] Tower index loaded: {len(state.index)} towers")
+            for listener in state.reload_listeners:
+                try:
+                    listener(old, state.index)
+                except Exception as e:
+                    print(f"[WARN] Tower index reload listener failed: {e}")
+    return state.index
+
+
+async def _towers_fingerprint(db: AsyncIOMotorDatabase):
+    newest = await db.towers.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return await db.towers.estimated_document_count(), newest and newest["_id"]
+
+
+async def _follow_change_stream(db: AsyncIOMotorDatabase):
+    async with db.towers.watch() as stream:
+        async for _ in stream:
+            invalidate_tower_index()
+            await response_cache.invalidate("towers")
+
+
+async def _poll_towers(db: AsyncIOMotorDatabase):
+    fingerprint = await _towers_fingerprint(db)
+    while True:
+        await asyncio.sleep(settings.TOWER_INDEX_REFRESH_SECONDS)
+        current = await _towers_fingerprint(db)
+        expired = time.monotonic() - tower_index_state.loaded_at > settings.TOWER_INDEX_MAX_AGE_SECONDS
+        if current != fingerprint or expired:
+            fingerprint = current
+            invalidate_tower_index()
+            await response_cache.invalidate("towers")
+
+
+def _change_streams_unsupported(e: OperationFailure) -> bool:
+    # Standalone servers: "The $changeStream stage is only supported on replica sets"
+    return e.code == 40573 or "replica set" in str(e)
+
+
+async def watch_towers(db: AsyncIOMotorDatabase):
+    """
+    Keep the tower index fresh.
+
+    Uses a change stream when the deployment supports one (replica sets and
+    Atlas); standalone servers fall back to polling a cheap fingerprint.
+    Any other Mongo error (failover, network timeout, failed resume) is
+    logged, the index is invalidated in case changes were missed, and the
+    watch is re-opened with backoff.
+    """
+    change_streams = True
+    delay = 1.0
+    while True:
+        started = time.monotonic()
+        try:
+            if change_streams:
+                try:
+                    await _follow_change_stream(db)
+                    # The stream closed (collection dropped or renamed): reload and re-open
+                    invalidate_tower_index()
+                    await asyncio.sleep(1)
+                except OperationFailure as e:
+                    if not _change_streams_unsupported(e):
+                        raise
+                    change_streams = False
+            else:
+                await _poll_towers(db)
+        except PyMongoError as e:
+            if time.monotonic() - started > TOWER_WATCH_MAX_BACKOFF_SECONDS:
+                delay = 1.0
+            print(f"[WARN] Tower index watch failed ({e}); retrying in {delay:.0f}s")
+            invalidate_tower_index()
+            await response_cache.invalidate("towers")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TOWER_WATCH_MAX_BACKOFF_SECONDS)
+
+
+def start_tower_watcher(db: AsyncIOMotorDatabase):
+    if tower_index_state.watcher is None:
+        tower_index_state.watcher = asyncio.create_task(watch_towers(db))
+
+
+async def stop_tower_watcher():
+    task = tower_index_state.watcher
+    tower_index_state.watcher = None
+    if task:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
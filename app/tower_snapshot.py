@@ -0,0 +1,158 @@
+"""
+Tower index snapshot shared by every worker on the host.
+
+The first worker that needs the tower index reads it from MongoDB and writes
+it to a flat file (in /dev/shm when available); the other workers mmap that
+file instead of issuing the same full collection scan. The numeric columns,
+the id/operator labels and the pre-encoded JSON rows are read straight out
+of the mapping, so their pages live once in the page cache rather than once
+per worker, and no worker decodes the rows up front.
+
+Layout (little-endian):
+
+    magic (8) | header length (8) | JSON header, padded to 8 bytes
+    float64 lat | lng | height                   (n each)
+    float64 unit vectors                         (n x 3)
+    UTF-32 ids, operators                        (n each, fixed width, padded to 8 bytes)
+    int64 row offsets                            (n + 1)
+    JSON rows, concatenated
+
+Snapshots are written to a temp file and renamed into place, so a reader
+never sees a partial file, and an flock serializes writers so a cold start
+of N workers costs one Mongo scan.
+"""
+import asyncio
+import json
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every worker may load
+    fcntl = None
+
+MAGIC = b"SSTOWER2"
+PREAMBLE = struct.Struct("<8sQ")
+COLUMNS = ("lats", "lngs", "heights")
+LABELS = ("ids", "operators")
+
+
+def snapshot_dir(configured: str = "") -> str:
+    if configured:
+        return configured
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def snapshot_path(directory: str, database_name: str) -> str:
+    return os.path.join(directory, f"signalscope-towers-{database_name}.snap")
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def write_snapshot(path: str, arrays, rows, created_at: float) -> None:
+    """
+    Atomically replace the snapshot at path with these columns and rows.
+    created_at is when the data was read, not when it is written.
+    """
+    count = len(rows)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    labels = {name: np.asarray(getattr(arrays, name)).astype(str) for name in LABELS}
+    widths = {name: max(values.dtype.itemsize // 4, 1) for name, values in labels.items()}
+    header = json.dumps({"count": count, "created_at": created_at, "widths": widths}).encode()
+    header += b" " * _pad(PREAMBLE.size + len(header))
+
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".towers-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            for column in (arrays.lats, arrays.lngs, arrays.heights, arrays.xyz):
+                f.write(np.ascontiguousarray(column, dtype="<f8").tobytes())
+            for name in LABELS:
+                column = labels[name].astype(f"<U{widths[name]}").tobytes()
+                f.write(column + b"\0" * _pad(len(column)))
+            f.write(offsets.astype("<i8").tobytes())
+            f.writelines(rows)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class Snapshot:
+    """Read-only view of a snapshot file; arrays and rows point into the mapping"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = PREAMBLE.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tower snapshot")
+        header = json.loads(bytes(self.map[PREAMBLE.size:PREAMBLE.size + header_len]))
+        self.count = count = header["count"]
+        self.created_at = header["created_at"]
+
+        offset = PREAMBLE.size + header_len
+        columns = {}
+        for name in COLUMNS:
+            columns[name] = np.frombuffer(self.map, dtype="<f8", count=count, offset=offset)
+            offset += 8 * count
+        self.lats, self.lngs, self.heights = columns["lats"], columns["lngs"], columns["heights"]
+        self.xyz = np.frombuffer(self.map, dtype="<f8", count=3 * count, offset=offset).reshape(count, 3)
+        offset += 24 * count
+        for name in LABELS:
+            width = header["widths"][name]
+            setattr(self, name, np.frombuffer(self.map, dtype=f"<U{width}", count=count, offset=offset))
+            offset += 4 * width * count + _pad(4 * width * count)
+        row_offsets = np.frombuffer(self.map, dtype="<i8", count=count + 1, offset=offset)
+        offset += 8 * (count + 1)
+        if offset + int(row_offsets[-1]) > len(self.map):
+            raise ValueError(f"{path} is truncated")
+
+        view = memoryview(self.map)
+        bounds = (row_offsets + offset).tolist()
+        self.rows = [view[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def read_snapshot(path: str, newer_than: float = 0.0) -> Optional[Snapshot]:
+    """The snapshot at path if it exists, is intact and was read from MongoDB after newer_than"""
+    try:
+        if os.stat(path).st_mtime < newer_than:
+            return None
+        snapshot = Snapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"[WARN] Ignoring unreadable tower snapshot {path}: {e}")
+        return None
+    return snapshot if snapshot.created_at >= newer_than else None
+
+
+@asynccontextmanager
+async def writer_lock(path: str):
+    """Exclusive across processes; the blocking flock runs off the event loop"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, fcntl.flock, fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,133 @@
+import numpy as np
+from typing import Iterable, List, Optional
+
+from .spatial_index import bounding_box, distances_km, unit_vectors
+
+# Same propagation model as haversine.estimate_signal_strength
+BASE_SIGNAL_DBM = -40
+MAX_SIGNAL_DBM = -50
+MIN_SIGNAL_DBM = -120
+DISTANCE_PENALTY_PER_KM = 8
+MAX_HEIGHT_BONUS = 10
+
+# Beyond this distance every tower is clamped to MIN_SIGNAL_DBM, so farther
+# towers can never be the best server and don't need to be considered.
+MAX_RANGE_KM = (BASE_SIGNAL_DBM + MAX_HEIGHT_BONUS - MIN_SIGNAL_DBM) / DISTANCE_PENALTY_PER_KM
+
+# Upper bound on the size of one (points x towers) block, keeps memory flat
+# no matter how many points a request sends.
+DEFAULT_BLOCK_CELLS = 2_000_000
+
+
+class TowerArrays:
+    """Column-oriented view of a set of towers, ready for vectorized math"""
+
+    def __init__(self, towers: Iterable[dict]):
+        towers = list(towers)
+        self._labels(towers)
+        self.lats = np.array([t["lat"] for t in towers], dtype=np.float64)
+        self.lngs = np.array([t["lng"] for t in towers], dtype=np.float64)
+        self.heights = np.array([t.get("height", 0) for t in towers], dtype=np.float64)
+
+        self.xyz = unit_vectors(self.lats, self.lngs)
+        self.height_bonus = np.minimum(self.heights / 50, MAX_HEIGHT_BONUS)
+
+    @classmethod
+    def from_columns(cls, ids, operators, lats, lngs, heights, xyz) -> "TowerArrays":
+        """Reuse columns computed elsewhere (e.g. a shared snapshot) as-is"""
+        arrays = object.__new__(cls)
+        arrays.ids, arrays.operators = ids, operators
+        arrays.lats, arrays.lngs, arrays.heights, arrays.xyz = lats, lngs, heights, xyz
+        arrays.height_bonus = np.minimum(heights / 50, MAX_HEIGHT_BONUS)
+        return arrays
+
+    def _labels(self, towers: List[dict]):
+        self.ids = np.array([str(t["id"]) for t in towers], dtype=object)
+        self.operators = np.array([t["operator"] for t in towers], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, idx) -> "TowerArrays":
+        """Subset of these towers without going back through the dicts"""
+        subset = object.__new__(TowerArrays)
+        for name, values in vars(self).items():
+            setattr(subset, name, values[idx])
+        return subset
+
+
+def haversine_matrix(lats, lngs, towers: TowerArrays) -> np.ndarray:
+    """Distance in km from every point to every tower, shape (points, towers)"""
+    return distances_km(unit_vectors(lats, lngs), towers.xyz)
+
+
+def signal_from_distance(distances: np.ndarray, height_bonus: np.ndarray) -> np.ndarray:
+    """Unclamped model signal in dBm for a distance matrix"""
+    return BASE_SIGNAL_DBM + height_bonus - distances * DISTANCE_PENALTY_PER_KM
+
+
+def clamp_signal(raw: np.ndarray) -> np.ndarray:
+    """Truncate and clamp like estimate_signal_strength does"""
+    return np.clip(np.trunc(raw), MIN_SIGNAL_DBM, MAX_SIGNAL_DBM).astype(np.int16)
+
+
+def estimate_best_server(lats, lngs, towers: TowerArrays,
+                         block_cells: int = DEFAULT_BLOCK_CELLS) -> dict:
+    """
+    Best-server estimate for a batch of points.
+
+    Returns column arrays: `signal` (int dBm per point) and `tower_index`
+    (index into `towers`, -1 when no tower is in range).
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    n_points = len(lats)
+
+    signal = np.full(n_points, MIN_SIGNAL_DBM, dtype=np.int16)
+    tower_index = np.full(n_points, -1, dtype=np.int64)
+    if n_points == 0 or len(towers) == 0:
+        return {"signal": signal, "tower_index": tower_index}
+
+    step = max(1, block_cells // len(towers))
+    for start in range(0, n_points, step):
+        stop = min(start + step, n_points)
+        raw = signal_from_distance(
+            haversine_matrix(lats[start:stop], lngs[start:stop], towers),
+            towers.height_bonus[None, :],
+        )
+        best = np.argmax(raw, axis=1)
+        best_raw = raw[np.arange(stop - start), best]
+
+        signal[start:stop] = clamp_signal(best_raw)
+        in_range = best_raw > MIN_SIGNAL_DBM
+        tower_index[start:stop] = np.where(in_range, best, -1)
+
+    return {"signal": signal, "tower_index": tower_index}
+
+
+def candidate_box(lats, lngs) -> tuple:
+    """Box around the points containing every tower that can serve any of them"""
+    return bounding_box(lats, lngs, MAX_RANGE_KM)
+
+
+def best_server_results(lats, lngs, towers: TowerArrays) -> dict:
+    """Best-server estimate with tower ids/operators resolved, as plain lists"""
+    estimate = estimate_best_server(lats, lngs, towers)
+    idx = estimate["tower_index"]
+    found = idx >= 0
+
+    tower_ids: List[Optional[str]] = [None] * len(idx)
+    operators: List[Optional[str]] = [None] * len(idx)
+    if len(towers):
+        hit = np.nonzero(found)[0]
+        ids = towers.ids[idx[hit]]
+        ops = towers.operators[idx[hit]]
+        for pos, tower_id, operator in zip(hit.tolist(), ids.tolist(), ops.tolist()):
+            tower_ids[pos] = tower_id
+            operators[pos] = operator
+
+    return {
+        "signal": estimate["signal"].tolist(),
+        "tower_id": tower_ids,
+        "operator": operators,
+    }
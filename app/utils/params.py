@@ -0,0 +1,20 @@
+from fastapi import HTTPException
+from typing import List, Optional, Tuple
+
+
+def parse_floats(value: str, count: int, name: str) -> List[float]:
+    """Parse a comma-separated query value like "40.7,-74.0" """
+    try:
+        parts = [float(v) for v in value.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != count:
+        raise HTTPException(status_code=422, detail=f"'{name}' must be {count} comma-separated numbers")
+    return parts
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse "min_lat,min_lng,max_lat,max_lng" """
+    if not value:
+        return None
+    return tuple(parse_floats(value, 4, "bbox"))
@@ -0,0 +1,191 @@
+import math
+import numpy as np
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.0
+
+
+def unit_vectors(lats, lngs) -> np.ndarray:
+    """Points on the unit sphere, shape (n, 3)"""
+    lat_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lng_rad = np.radians(np.asarray(lngs, dtype=np.float64))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)))
+
+
+def distances_km(xyz_a: np.ndarray, xyz_b: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distance matrix in km between two sets of unit vectors.
+
+    Equivalent to the haversine formula: for unit vectors p and q,
+    sin^2(angle / 2) = (1 - p.q) / 2, so the whole matrix is one matmul.
+    """
+    dots = xyz_a @ xyz_b.T
+    half_chord = np.sqrt(np.clip((1.0 - dots) / 2.0, 0.0, 1.0))
+    return 2 * EARTH_RADIUS_KM * np.arcsin(half_chord)
+
+
+def bounding_box(lats, lngs, pad_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) around the points, padded by pad_km"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    pad_lat = pad_km / KM_PER_DEGREE_LAT
+    # Longitude degrees shrink with latitude - pad using the widest point
+    max_abs_lat = min(float(np.max(np.abs(lats))) + pad_lat, 89.0)
+    pad_lng = pad_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(max_abs_lat)))
+    return (
+        max(float(lats.min()) - pad_lat, -90.0),
+        max(float(lngs.min()) - pad_lng, -180.0),
+        min(float(lats.max()) + pad_lat, 90.0),
+        min(float(lngs.max()) + pad_lng, 180.0),
+    )
+
+
+class GridIndex:
+    """
+    Static spatial index over points using fixed lat/lng grid buckets.
+
+    Points are sorted by cell so every bucket is a contiguous slice of
+    `order`; queries collect the slices of the cells they touch and then
+    filter exactly with vectorized great-circle distances.
+    """
+
+    def __init__(self, lats, lngs, cell_deg: float = 0.25):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.xyz = unit_vectors(self.lats, self.lngs)
+        self.cell_deg = cell_deg
+        self.n_rows = int(math.ceil(180 / cell_deg)) + 1
+        self.n_cols = int(math.ceil(360 / cell_deg)) + 1
+
+        rows, cols = self._cell_of(self.lats, self.lngs)
+        keys = rows * self.n_cols + cols
+        self.order = np.argsort(keys, kind="stable")
+        cell_keys, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cells = {
+            key: (start, start + count)
+            for key, start, count in zip(cell_keys.tolist(), starts.tolist(), counts.tolist())
+        }
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cell_of(self, lats, lngs):
+        rows = np.floor((np.asarray(lats) + 90) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lngs) + 180) / self.cell_deg).astype(np.int64)
+        return np.clip(rows, 0, self.n_rows - 1), np.clip(cols, 0, self.n_cols - 1)
+
+    def _candidates(self, min_lat, min_lng, max_lat, max_lng) -> np.ndarray:
+        """Indices of points in every cell overlapping the box (superset)"""
+        rows, cols = self._cell_of([min_lat, max_lat], [min_lng, max_lng])
+        row_lo, row_hi = int(rows[0]), int(rows[1])
+        col_lo, col_hi = int(cols[0]), int(cols[1])
+        n_box_cells = (row_hi - row_lo + 1) * (col_hi - col_lo + 1)
+
+        slices = []
+        if n_box_cells <= len(self.cells):
+            for row in range(row_lo, row_hi + 1):
+                base = row * self.n_cols
+                for col in range(col_lo, col_hi + 1):
+                    bounds = self.cells.get(base + col)
+                    if bounds:
+                        slices.append(self.order[bounds[0]:bounds[1]])
+        else:
+            # Box is larger than the populated area - walk the occupied cells instead
+            for key, bounds in self.cells.items():
+                row, col = divmod(key, self.n_cols)
+                if row_lo <= row <= row_hi and col_lo <= col <= col_hi:
+                    slices.append(self.order[bounds[0]:bounds[1]])
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def bbox(self, min_lat, min_lng, max_lat, max_lng,
+             mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indices of points inside the box"""
+        idx = self._candidates(min_lat, min_lng, max_lat, max_lng)
+        if mask is not None:
+            idx = idx[mask[idx]]
+        inside = (
+            (self.lats[idx] >= min_lat) & (self.lats[idx] <= max_lat)
+            & (self.lngs[idx] >= min_lng) & (self.lngs[idx] <= max_lng)
+        )
+        return np.sort(idx[inside])
+
+    def radius(self, lat: float, lng: float, radius_km: float,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances of points within radius_km, nearest first"""
+        idx = self._candidates(*bounding_box([lat], [lng], radius_km))
+        if mask is not None:
+            idx = idx[mask[idx]]
+        dist = distances_km(unit_vectors([lat], [lng]), self.xyz[idx])[0]
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat: float, lng: float, k: int,
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances of the k nearest points, nearest first"""
+        available = len(self) if mask is None else int(mask.sum())
+        k = min(k, available)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # Grow a square of cells around the query until it holds k candidates.
+        # The k-th candidate distance is then an upper bound for the true k-th
+        # neighbour, so a radius query at that distance is exact.
+        rows, cols = self._cell_of([lat], [lng])
+        row, col = int(rows[0]), int(cols[0])
+        reach = 1
+        while True:
+            idx = self._candidates(
+                (row - reach) * self.cell_deg - 90, (col - reach) * self.cell_deg - 180,
+                (row + reach + 1) * self.cell_deg - 90, (col + reach + 1) * self.cell_deg - 180,
+            )
+            if mask is not None:
+                idx = idx[mask[idx]]
+            if len(idx) >= k or reach >= max(self.n_rows, self.n_cols):
+                break
+            reach *= 2
+
+        dist = distances_km(unit_vectors([lat], [lng]), self.xyz[idx])[0]
+        bound_km = float(np.partition(dist, k - 1)[k - 1])
+        idx, dist = self.radius(lat, lng, bound_km * (1 + 1e-9), mask)
+        return idx[:k], dist[:k]
+
+    def nearest_within(self, lats, lngs, max_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest point for each of many query points, searching only within
+        max_km. Returns (indices, distances) with -1 / inf where nothing is
+        in range. Queries sharing a grid cell are resolved together.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        best_idx = np.full(len(lats), -1, dtype=np.int64)
+        best_dist = np.full(len(lats), np.inf)
+        if len(lats) == 0 or len(self) == 0:
+            return best_idx, best_dist
+
+        rows, cols = self._cell_of(lats, lngs)
+        keys = rows * self.n_cols + cols
+        order = np.argsort(keys, kind="stable")
+        cell_keys, starts = np.unique(keys[order], return_index=True)
+        query_xyz = unit_vectors(lats, lngs)
+
+        for key, group in zip(cell_keys.tolist(), np.split(order, starts[1:])):
+            row, col = divmod(key, self.n_cols)
+            cell_lats = [row * self.cell_deg - 90, (row + 1) * self.cell_deg - 90]
+            cell_lngs = [col * self.cell_deg - 180, (col + 1) * self.cell_deg - 180]
+            candidates = self._candidates(*bounding_box(cell_lats, cell_lngs, max_km))
+            if len(candidates) == 0:
+                continue
+            dist = distances_km(query_xyz[group], self.xyz[candidates])
+            nearest = np.argmin(dist, axis=1)
+            nearest_dist = dist[np.arange(len(group)), nearest]
+            found = nearest_dist <= max_km
+            best_idx[group[found]] = candidates[nearest[found]]
+            best_dist[group[found]] = nearest_dist[found]
+        return best_idx, best_dist
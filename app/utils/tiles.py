@@ -0,0 +1,68 @@
+"""
+Web Mercator slippy-map tile math and a dependency-free PNG encoder.
+
+Tiles follow the usual z/x/y scheme (x grows east, y grows south from the
+north-west corner); a tile is sampled as a size x size grid of pixel centres.
+"""
+import math
+import struct
+import zlib
+import numpy as np
+
+MAX_ZOOM = 22
+MAX_LAT = 85.05112878  # Web Mercator cut-off
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """(min_lat, min_lng, max_lat, max_lng) of a tile"""
+    n = 2 ** z
+    min_lng = x / n * 360 - 180
+    max_lng = (x + 1) / n * 360 - 180
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def pixel_centers(z: int, x: int, y: int, size: int) -> tuple:
+    """lat, lng of every pixel centre as flat row-major arrays (north row first)"""
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lngs = (x + offsets) / n * 360 - 180
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    grid_lats, grid_lngs = np.meshgrid(lats, lngs, indexing="ij")
+    return grid_lats.ravel(), grid_lngs.ravel()
+
+
+def point_tiles(lats, lngs, z: int) -> tuple:
+    """Tile x, y containing each point at zoom z"""
+    n = 2 ** z
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    xs = np.floor((lngs + 180) / 360 * n)
+    ys = np.floor((1 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2 * n)
+    return np.clip(xs, 0, n - 1).astype(np.int64), np.clip(ys, 0, n - 1).astype(np.int64)
+
+
+def point_pixels(lats, lngs, z: int, x: int, y: int, size: int) -> np.ndarray:
+    """Flat pixel index of each point inside tile z/x/y, -1 for points outside it"""
+    n = 2 ** z * size
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    px = np.floor((lngs + 180) / 360 * n).astype(np.int64) - x * size
+    py = np.floor((1 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2 * n).astype(np.int64) - y * size
+    inside = (px >= 0) & (px < size) & (py >= 0) & (py < size)
+    return np.where(inside, py * size + px, -1)
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """8-bit RGBA PNG from an (height, width, 4) uint8 array"""
+    height, width, _ = rgba.shape
+    # Filter type 0 (none) in front of every scanline
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
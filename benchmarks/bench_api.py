@@ -0,0 +1,325 @@
+"""
+End-to-end API benchmark: every router under concurrent load.
+
+Boots app.main:app in-process against mongomock (default) or a local mongod
+(--database-url), seeds synthetic towers and reports at the requested
+scale, then runs each scenario below with --concurrency clients for
+--duration seconds through the ASGI interface. Prints throughput and
+p50/p95/p99 latency per scenario and writes them to a JSON file; pass an
+earlier file as --baseline to diff two commits and fail on regressions.
+
+    python -m benchmarks.bench_api --towers 5000 --reports 50000 --output before.json
+    python -m benchmarks.bench_api --towers 5000 --reports 50000 --baseline before.json
+
+Clients share the server's event loop, so absolute latencies include client
+overhead; compare runs made with the same options on the same machine.
+Every client comes from one address, so admission control (per-IP login
+buckets) is off unless --admission is passed.
+With --database-url the named database (default signalscope_bench) is
+dropped and reseeded, so it must not hold real data.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import httpx
+import numpy as np
+
+from app.config import settings
+from app.seed import CARRIERS as SEED_CARRIERS, DEVICES as SEED_DEVICES, METROS, generate_reports, generate_towers
+from app.utils.coverage import TowerArrays
+
+BENCH_DATABASE = "signalscope_bench"
+CARRIERS = list(SEED_CARRIERS)
+DEVICES = [name for name, _ in SEED_DEVICES]
+# Scale only: random query points near a metro
+NEAR_SIGMA_DEG = 0.15
+
+
+def metro_point(rng: random.Random, sigma: float = NEAR_SIGMA_DEG):
+    lat, lng, _ = rng.choices(METROS, weights=[m[2] for m in METROS])[0]
+    return lat + rng.gauss(0, sigma), lng + rng.gauss(0, sigma)
+
+
+async def seed(db, towers: int, reports: int, seed_value: int):
+    """Same generators as `python -m app.seed generate`, inserted directly"""
+    rng = np.random.default_rng(seed_value)
+    tower_docs = generate_towers(towers, rng, prefix="bench")
+    await db.towers.insert_many(tower_docs)
+    arrays = TowerArrays(tower_docs)
+    end = datetime.utcnow()
+    for start in range(0, reports, 10000):
+        await db.reports.insert_many(generate_reports(
+            arrays, min(10000, reports - start), rng, seed_value, start, end, days=30, users=500, noise_db=4.0))
+
+
+class Context:
+    """Shared state the scenarios draw from"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.users: List[dict] = []  # {"email", "headers"}
+        self.registered = 0
+
+    def point(self):
+        return metro_point(self.rng)
+
+    def bbox(self, half_deg: float = 0.05) -> str:
+        lat, lng = self.point()
+        return f"{lat - half_deg},{lng - half_deg},{lat + half_deg},{lng + half_deg}"
+
+    def user(self) -> dict:
+        return self.rng.choice(self.users)
+
+    def report(self) -> dict:
+        lat, lng = self.point()
+        return {"lat": lat, "lng": lng, "carrier": self.rng.choice(CARRIERS),
+                "signal_strength": self.rng.randint(-120, -50), "device": self.rng.choice(DEVICES)}
+
+
+def _register(ctx: Context) -> dict:
+    ctx.registered += 1
+    return {"method": "POST", "url": "/auth/register",
+            "json": {"email": f"bench{ctx.registered}-{os.getpid()}@example.com",
+                     "password": "bench-password", "name": "Bench"}}
+
+
+def _tile(ctx: Context) -> dict:
+    lat, lng = ctx.point()
+    z = 11
+    n = 2 ** z
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return {"method": "GET", "url": f"/api/coverage/tiles/{z}/{x}/{y}"}
+
+
+# name -> request builder; each returns httpx.request kwargs
+SCENARIOS: Dict[str, Callable[[Context], dict]] = {
+    "auth.register": _register,
+    "auth.login": lambda ctx: {"method": "POST", "url": "/auth/login",
+                               "json": {"email": ctx.user()["email"], "password": "bench-password"}},
+    "towers.list": lambda ctx: {"method": "GET", "url": "/api/towers/",
+                                "params": {"operator": ctx.rng.choice(CARRIERS)}},
+    "towers.near": lambda ctx: {"method": "GET", "url": "/api/towers/",
+                                "params": {"near": "%f,%f" % ctx.point(), "k": 20}},
+    "reports.create": lambda ctx: {"method": "POST", "url": "/api/reports/",
+                                   "json": ctx.report(), "headers": ctx.user()["headers"]},
+    "reports.bulk": lambda ctx: {"method": "POST", "url": "/api/reports/bulk",
+                                 "json": [ctx.report() for _ in range(100)], "headers": ctx.user()["headers"]},
+    "reports.list": lambda ctx: {"method": "GET", "url": "/api/reports/",
+                                 "params": {"carrier": ctx.rng.choice(CARRIERS), "limit": 100}},
+    "reports.bbox": lambda ctx: {"method": "GET", "url": "/api/reports/",
+                                 "params": {"bbox": ctx.bbox(), "fields": "lat,lng,signal_strength"}},
+    "reports.user": lambda ctx: {"method": "GET", "url": "/api/reports/user",
+                                 "headers": ctx.user()["headers"]},
+    "reports.export": lambda ctx: {"method": "GET", "url": "/api/reports/export",
+                                   "params": {"bbox": ctx.bbox(0.02)}, "headers": ctx.user()["headers"]},
+    "analytics.summary": lambda ctx: {"method": "GET", "url": "/api/analytics"},
+    "analytics.by_carrier": lambda ctx: {"method": "GET", "url": "/api/analytics/by-carrier"},
+    "analytics.by_zip": lambda ctx: {"method": "GET", "url": "/api/analytics/by-zip",
+                                     "params": {"carrier": ctx.rng.choice(CARRIERS)}},
+    "coverage.estimate": lambda ctx: {"method": "GET", "url": "/api/coverage/estimate",
+                                      "params": dict(zip(("lat", "lng"), ctx.point()))},
+    "coverage.batch": lambda ctx: {"method": "POST", "url": "/api/coverage/estimate",
+                                   "json": {"points": [dict(zip(("lat", "lng"), ctx.point()))
+                                                       for _ in range(100)]}},
+    "coverage.tile": _tile,
+}
+
+# bbox filters use $geoWithin on location, which mongomock doesn't implement
+GEO_SCENARIOS = {"reports.bbox", "reports.export", "coverage.tile"}
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, build, concurrency: int,
+                       duration: float, max_requests: int) -> dict:
+    latencies: List[float] = []
+    errors = issued = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors, issued
+        while time.perf_counter() < deadline and issued < max_requests:
+            issued += 1
+            request = build(ctx)
+            started = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                await response.aread()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            # Cache hits complete without ever suspending; yield so one
+            # client can't starve the others on the shared loop
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {"requests": len(latencies), "errors": errors, "rps": round(len(latencies) / elapsed, 1)}
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        result.update(p50_ms=round(p50, 2), p95_ms=round(p95, 2), p99_ms=round(p99, 2),
+                      max_ms=round(max(latencies) * 1000, 2))
+    return result
+
+
+def install_mongomock():
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app import database
+
+    client = AsyncMongoMockClient()
+
+    async def connect():
+        database.db.client = client
+        database.db.database = database.db.analytics = client[BENCH_DATABASE]
+
+    # Every caller imports connect_to_mongo from app.database at call time
+    database.connect_to_mongo = connect
+    return client[BENCH_DATABASE]
+
+
+async def prepare_database(args):
+    settings.DATABASE_NAME = BENCH_DATABASE
+    settings.SLOW_REQUEST_LOG_MS = 0
+    settings.ADMISSION_ENABLED = args.admission
+    if not args.database_url:
+        return install_mongomock()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from app.database import get_database_name_from_url
+
+    settings.DATABASE_URL = args.database_url
+    name = get_database_name_from_url(args.database_url)
+    if "bench" not in name and not args.allow_drop:
+        sys.exit(f"Refusing to drop database {name!r}; use a *bench* database or pass --allow-drop")
+    client = AsyncIOMotorClient(args.database_url)
+    await client.drop_database(name)
+    return client[name]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> List[str]:
+    """Scenarios whose p95 or throughput got worse than the baseline by more than tolerance"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    regressions = []
+    print(f"\nvs {baseline_path}:")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in now:
+            continue
+        p95 = now["p95_ms"] / before["p95_ms"] - 1
+        rps = now["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        flag = p95 > tolerance or rps < -tolerance
+        print(f"  {name:22s} p95 {p95:+7.1%}   req/s {rps:+7.1%}{'   REGRESSION' if flag else ''}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+async def main_async(args) -> dict:
+    db = await prepare_database(args)
+    seed_started = time.perf_counter()
+    await seed(db, args.towers, args.reports, args.seed)
+    print(f"Seeded {args.towers} towers and {args.reports} reports in {time.perf_counter() - seed_started:.1f}s")
+
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            ctx = Context(random.Random(args.seed))
+            for _ in range(args.users):
+                request = _register(ctx)
+                response = await client.request(**request)
+                response.raise_for_status()
+                ctx.users.append({"email": request["json"]["email"],
+                                  "headers": {"Authorization": "Bearer " + response.json()["access_token"]}})
+
+            pattern = re.compile(args.only) if args.only else None
+            results = {}
+            print(f"{'scenario':22s} {'req':>7s} {'err':>5s} {'req/s':>9s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  (ms)")
+            for name, build in SCENARIOS.items():
+                if pattern and not pattern.search(name):
+                    continue
+                if name in GEO_SCENARIOS and not args.database_url:
+                    print(f"{name:22s} skipped (needs --database-url)")
+                    continue
+                # bcrypt-bound routes get a request cap so they don't dominate the run
+                cap = args.auth_requests if name.startswith("auth.") else sys.maxsize
+                result = await run_scenario(client, ctx, build, args.concurrency, args.duration, cap)
+                results[name] = result
+                print(f"{name:22s} {result['requests']:7d} {result['errors']:5d} {result['rps']:9.1f} "
+                      f"{result.get('p50_ms', 0):8.2f} {result.get('p95_ms', 0):8.2f} {result.get('p99_ms', 0):8.2f}")
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--towers", type=int, default=2000)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=20, help="registered before the scenarios run")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients per scenario")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--auth-requests", type=int, default=200, help="request cap for bcrypt-bound scenarios")
+    parser.add_argument("--only", default="", help="regex selecting scenarios, e.g. '^reports\\.'")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="", help="local mongod to use instead of mongomock")
+    parser.add_argument("--admission", action="store_true", help="keep admission control (429s count as errors)")
+    parser.add_argument("--allow-drop", action="store_true", help="allow dropping a database not named *bench*")
+    parser.add_argument("--output", default="bench_api_results.json")
+    parser.add_argument("--baseline", default="", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fail when p95 or req/s is worse than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "mongod" if args.database_url else "mongomock",
+            "options": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "database_url")},
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
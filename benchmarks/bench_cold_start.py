@@ -0,0 +1,92 @@
+"""
+Cold start: how long until a freshly started server answers, per STARTUP_MODE.
+
+For each mode `python -m app.serve --workers 1` is started and polled every
+20 ms. Reports the time from spawn until the port answers /healthz, until
+/readyz returns 200, and until the first GET /api/towers/ succeeds, plus
+the process's own import time from /metrics.
+
+By default the server runs on mongomock (`pip install mongomock-motor`) with
+a simulated MongoDB connect latency (--connect-delay, like an Atlas ping
+after the database itself woke up); pass --database-url to use a real one.
+
+    python -m benchmarks.bench_cold_start --connect-delay 3 --runs 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_workers import free_port
+
+POLL_SECONDS = 0.02
+
+
+def start_server(mode: str, port: int, database_url: str, connect_delay: float) -> subprocess.Popen:
+    command = [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", "1"]
+    env = dict(os.environ, STARTUP_MODE=mode, BENCH_CONNECT_DELAY=str(connect_delay), BENCH_TOWERS="2000")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    else:
+        command += ["--app", "benchmarks.bench_workers:mock_app", "--factory"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for(client: httpx.Client, path: str, spawned: float, timeout: float) -> float:
+    while time.perf_counter() - spawned < timeout:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter() - spawned
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_SECONDS)
+    raise RuntimeError(f"{path} did not answer within {timeout:.0f}s")
+
+
+def import_seconds(client: httpx.Client) -> float:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith('startup_seconds{step="import"}'):
+            return float(line.split()[-1])
+    return float("nan")
+
+
+def cold_start(mode: str, database_url: str, connect_delay: float, timeout: float) -> dict:
+    port = free_port()
+    spawned = time.perf_counter()
+    server = start_server(mode, port, database_url, connect_delay)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            # In blocking mode nothing answers before startup is done, so these coincide
+            healthz = wait_for(client, "/healthz", spawned, timeout)
+            first = wait_for(client, "/api/towers/", spawned, timeout)
+            readyz = wait_for(client, "/readyz", spawned, timeout)
+            return {"healthz": healthz, "first_request": first, "readyz": readyz,
+                    "import": import_seconds(client)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", nargs="+", default=["blocking", "background"])
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per mode (median reported)")
+    parser.add_argument("--connect-delay", type=float, default=2.0, help="simulated connect latency (mongomock only)")
+    parser.add_argument("--database-url", default="", help="use this MongoDB instead of mongomock")
+    parser.add_argument("--timeout", type=float, default=90.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'import':>9}{'healthz':>10}{'first GET':>11}{'ready':>9}   (seconds from spawn, median)")
+    for mode in args.modes:
+        runs = [cold_start(mode, args.database_url, args.connect_delay, args.timeout) for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{mode:<12}{median['import']:9.2f}{median['healthz']:10.2f}"
+              f"{median['first_request']:11.2f}{median['readyz']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
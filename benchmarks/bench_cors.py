@@ -0,0 +1,154 @@
+"""
+Micro-benchmark: the old three-layer CORS stack vs app.cors.CORSMiddleware.
+
+Both apps serve one trivial route. The old stack is rebuilt here as it was:
+Starlette's CORSMiddleware, a BaseHTTPMiddleware request logger, the
+force_cors_headers function middleware and a catch-all OPTIONS route.
+Requests are driven straight through the ASGI interface, so only the
+framework and middleware cost is measured (no sockets).
+
+    python -m benchmarks.bench_cors --requests 20000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.cors import CORSMiddleware
+
+ORIGINS = ["http://localhost:5173", "http://localhost:5174", "https://signal-scope-psi.vercel.app"]
+ORIGIN = ORIGINS[0].encode()
+
+# The old logger wrote to stderr; keep the record creation and formatting
+# but drop the I/O so the terminal doesn't dominate the numbers
+logger = logging.getLogger("bench_cors")
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+def ping():
+    return {"status": "ok"}
+
+
+def old_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        StarletteCORSMiddleware,
+        allow_origins=ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"],
+    )
+
+    class SimpleLoggerMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            origin = request.headers.get('origin', 'none')
+            logger.info(f"[REQUEST] {request.method} {request.url.path} | Origin: {origin}")
+            response = await call_next(request)
+            logger.info(f"[RESPONSE] {request.method} {request.url.path} | Status: {response.status_code}")
+            return response
+
+    app.add_middleware(SimpleLoggerMiddleware)
+
+    @app.middleware("http")
+    async def force_cors_headers(request, call_next):
+        response = await call_next(request)
+        origin = request.headers.get("origin")
+        if origin and origin in ORIGINS:
+            response.headers["Access-Control-Allow-Origin"] = origin
+            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH, HEAD"
+            response.headers["Access-Control-Allow-Headers"] = "content-type, authorization, accept, origin, x-requested-with, cache-control, pragma"
+        return response
+
+    @app.options("/{full_path:path}")
+    async def global_options_handler(full_path: str):
+        return Response(status_code=200)
+
+    app.get("/ping")(ping)
+    return app
+
+
+def new_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, origins=ORIGINS)
+    app.get("/ping")(ping)
+    return app
+
+
+def make_scope(method: str, headers: list) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": "/ping", "raw_path": b"/ping",
+        "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("127.0.0.1", 5000), "server": ("127.0.0.1", 8000),
+    }
+
+
+CASES = {
+    "GET, allowed origin": ("GET", [(b"host", b"bench"), (b"origin", ORIGIN)]),
+    "GET, no origin": ("GET", [(b"host", b"bench")]),
+    "preflight": ("OPTIONS", [
+        (b"host", b"bench"), (b"origin", ORIGIN),
+        (b"access-control-request-method", b"POST"),
+        (b"access-control-request-headers", b"content-type, authorization"),
+    ]),
+}
+
+
+def make_receive():
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a server with the client still connected: wait until cancelled
+        await asyncio.Event().wait()
+
+    return receive
+
+
+async def drive(app, scope: dict, count: int) -> float:
+    status = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(dict(scope), make_receive(), send)
+    elapsed = time.perf_counter() - started
+    assert all(s == 200 for s in status), set(status)
+    return count / elapsed
+
+
+async def main_async(count: int):
+    apps = {"old stack": old_app(), "pure ASGI": new_app()}
+    for case, (method, headers) in CASES.items():
+        scope = make_scope(method, headers)
+        rates = {}
+        for name, app in apps.items():
+            await drive(app, scope, min(count, 1000))  # warm up
+            rates[name] = await drive(app, scope, count)
+        print(f"{case:22s} old {rates['old stack']:9,.0f} req/s   new {rates['pure ASGI']:9,.0f} req/s   "
+              f"{rates['pure ASGI'] / rates['old stack']:4.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000, help="requests per case and stack")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Load benchmark: /api/towers latency while a burst of logins is in flight.
+
+Runs in one event loop, like a single uvicorn worker. A probe calls the
+`get_towers` handler against an in-memory tower index at a fixed rate while
+`--logins` concurrent clients keep verifying bcrypt passwords, first inline
+(the old `verify_password` call in the login handler) and then through the
+bounded worker pool. Prints p50/p99 of the towers probe for each mode.
+
+    python -m benchmarks.bench_login_burst --logins 20 --seconds 5
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+
+from app.auth.utils import get_password_hash, password_pool, verify_password, verify_password_async
+from app.routers.towers import get_towers
+from app.tower_index import TowerIndex
+
+PROBE_INTERVAL = 0.005
+
+
+def make_index(count: int) -> TowerIndex:
+    rng = random.Random(7)
+    return TowerIndex([
+        {
+            "id": f"bench-{i}",
+            "lat": rng.uniform(25, 49),
+            "lng": rng.uniform(-125, -67),
+            "operator": rng.choice(["T-Mobile", "Verizon", "AT&T"]),
+            "height": rng.randint(30, 200),
+            "tech": ["LTE", "5G"],
+        }
+        for i in range(count)
+    ])
+
+
+async def login_client(hashed: str, pooled: bool, stop: asyncio.Event, done: list):
+    while not stop.is_set():
+        if pooled:
+            await verify_password_async("correct horse battery", hashed)
+        else:
+            verify_password("correct horse battery", hashed)
+            await asyncio.sleep(0)
+        done.append(1)
+
+
+async def towers_probe(index: TowerIndex, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        # A request "arrives" every PROBE_INTERVAL; its latency includes any
+        # time it waited for the event loop before the handler could run.
+        arrival = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        await get_towers(operator=None, tech=None, near="40.7,-74.0", k=10,
+                         radius_km=None, bbox=None, limit=None, index=index)
+        latencies.append(time.perf_counter() - arrival)
+
+
+async def run_mode(index: TowerIndex, hashed: str, logins: int, seconds: float, pooled: bool) -> dict:
+    stop = asyncio.Event()
+    latencies, done = [], []
+    tasks = [asyncio.create_task(towers_probe(index, stop, latencies))]
+    tasks += [asyncio.create_task(login_client(hashed, pooled, stop, done)) for _ in range(logins)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        "probes": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, math.ceil(len(latencies) * 0.99) - 1)] * 1000,
+        "logins_per_s": len(done) / seconds,
+    }
+
+
+async def main_async(args):
+    index = make_index(args.towers)
+    hashed = get_password_hash("correct horse battery")
+    print(f"{args.logins} concurrent logins, {args.seconds}s per mode, "
+          f"pool={password_pool.kind} x{password_pool.workers}")
+
+    for label, pooled in (("inline bcrypt (before)", False), ("worker pool (after)", True)):
+        result = await run_mode(index, hashed, args.logins, args.seconds, pooled)
+        print(f"{label:24s} towers p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+              f"({result['probes']} probes, {result['logins_per_s']:.1f} logins/s)")
+    password_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--towers", type=int, default=20000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
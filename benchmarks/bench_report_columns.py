@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: ad-hoc report analytics over the columnar snapshot vs the
+documents Motor would return.
+
+For synthetic reports it measures memory per report as dicts (tracemalloc)
+and as columns, the time to append them, and per query the time of a plain
+Python pass over the dicts against ReportColumns.query.
+
+    python -m benchmarks.bench_report_columns --sizes 100000,1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+
+from app.analytics.report_stats import histogram_percentiles
+from app.report_columns import ReportColumns, TIME_STEPS, epoch_seconds
+
+CARRIERS = ["T-Mobile", "Verizon", "AT&T"]
+DEVICES = ["Pixel 8", "iPhone 15", "Galaxy S24", "Moto G"]
+NOW = datetime(2024, 1, 1)
+
+
+def make_reports(count: int, seed: int = 42) -> List[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": f"user-{rng.randint(1, 5000)}",
+            "lat": 40.7 + rng.uniform(-0.5, 0.5),
+            "lng": -74.0 + rng.uniform(-0.5, 0.5),
+            "carrier": rng.choice(CARRIERS),
+            "signal_strength": rng.randint(-120, -50),
+            "device": rng.choice(DEVICES),
+            "timestamp": NOW - timedelta(seconds=rng.randint(0, 90 * 86400)),
+        }
+        for _ in range(count)
+    ]
+
+
+def python_query(docs: List[dict], key, keep=lambda d: True) -> dict:
+    """What a handler does with the documents: group, histogram, summarize"""
+    hists = {}
+    for doc in docs:
+        if keep(doc):
+            hist = hists.setdefault(key(doc), {})
+            value = str(doc["signal_strength"])
+            hist[value] = hist.get(value, 0) + 1
+    return {k: histogram_percentiles(h) for k, h in hists.items()}
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench(count: int, repeat: int):
+    tracemalloc.start()
+    docs = make_reports(count)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    columns = ReportColumns(watermark=0)
+    started = time.perf_counter()
+    for i in range(0, count, 5000):
+        columns.append(docs[i:i + 5000])
+    append_seconds = time.perf_counter() - started
+
+    print(f"reports x {count:,}")
+    print(f"  memory: {dict_bytes / count:,.0f} B/report as dicts, "
+          f"{columns.nbytes / count:,.1f} B/report as columns (incl. spare capacity)")
+    print(f"  append: {count / append_seconds:,.0f} reports/s")
+
+    start, end = NOW - timedelta(days=30), NOW - timedelta(days=7)
+    queries = [
+        ("by carrier", lambda d: d["carrier"], lambda d: True, dict(group_by="carrier")),
+        ("by device, Verizon", lambda d: d["device"], lambda d: d["carrier"] == "Verizon",
+         dict(group_by="device", carrier="Verizon")),
+        ("by day, 23-day window", lambda d: epoch_seconds(d["timestamp"]) // TIME_STEPS["day"],
+         lambda d: start <= d["timestamp"] < end, dict(group_by="day", start=start, end=end)),
+        ("bbox total", lambda d: 0, lambda d: 40.6 <= d["lat"] <= 40.8 and -74.1 <= d["lng"] <= -73.9,
+         dict(bbox=(40.6, -74.1, 40.8, -73.9))),
+    ]
+    for name, key, keep, params in queries:
+        baseline = best_of(lambda: python_query(docs, key, keep), repeat)
+        seconds = best_of(lambda: columns.query(**params), repeat)
+        print(f"  {name:24s} dicts {baseline * 1000:9.2f} ms   columns {seconds * 1000:8.3f} ms  "
+              f"{baseline / seconds:7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="100000,1000000", help="comma-separated report counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    for count in (int(s) for s in args.sizes.split(",")):
+        bench(count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark: list endpoint serialization, old path vs the fast path.
+
+For synthetic report and tower documents shaped like the Mongo results, it
+times the old path: one pydantic model per document, FastAPI's
+response_model validation and jsonable_encoder, then JSONResponse. That is
+compared with a single TypeAdapter validate + dump_json, plain orjson for
+trusted rows, and, for towers, the pre-encoded rows of the tower index.
+
+    python -m benchmarks.bench_serialization --sizes 1000,10000,100000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.schemas import ReportResponse, TowerResponse
+from app.serialization import ListSerializer
+from app.tower_index import TowerIndex
+
+CARRIERS = ["T-Mobile", "Verizon", "AT&T"]
+
+
+def make_reports(count: int, seed: int = 42) -> List[dict]:
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": f"user-{rng.randint(1, 500)}",
+            "lat": 40.7 + rng.uniform(-0.5, 0.5),
+            "lng": -74.0 + rng.uniform(-0.5, 0.5),
+            "carrier": rng.choice(CARRIERS),
+            "signal_strength": rng.randint(-120, -50),
+            "device": "Pixel 8",
+            "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def make_towers(count: int, seed: int = 42) -> List[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"bench-{i}",
+            "lat": 40.7 + rng.uniform(-0.5, 0.5),
+            "lng": -74.0 + rng.uniform(-0.5, 0.5),
+            "operator": rng.choice(CARRIERS),
+            "height": rng.randint(30, 200),
+            "tech": ["LTE", "5G"],
+        }
+        for i in range(count)
+    ]
+
+
+async def old_path(field, models) -> bytes:
+    content = await serialize_response(field=field, response_content=models)
+    return JSONResponse(content).body
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(name: str, count: int, seconds: float, baseline: float):
+    print(f"  {name:34s} {seconds * 1000:9.1f} ms  {count / seconds:12,.0f} docs/s  {baseline / seconds:6.1f}x")
+
+
+def bench_reports(count: int, repeat: int):
+    docs = make_reports(count)
+    rows = [{**d, "_id": str(d["_id"])} for d in docs]
+    field = create_response_field(name="Response_get_reports", type_=List[ReportResponse])
+    serializer = ListSerializer(ReportResponse)
+
+    def old():
+        models = [ReportResponse(**{**r, "_id": str(r["_id"])}) for r in docs]
+        asyncio.run(old_path(field, models))
+
+    baseline = best_of(old, repeat)
+    print(f"reports x {count:,}")
+    report("model per doc + response_model", count, baseline, baseline)
+    report("TypeAdapter validate + dump_json", count, best_of(lambda: serializer.render(rows, True), repeat), baseline)
+    report("orjson (trusted)", count, best_of(lambda: serializer.render(rows, False), repeat), baseline)
+
+
+def bench_towers(count: int, repeat: int):
+    towers = make_towers(count)
+    field = create_response_field(name="Response_get_towers", type_=List[TowerResponse])
+    index = TowerIndex(towers)
+    idx = index.all()
+
+    def old():
+        asyncio.run(old_path(field, [TowerResponse(**t) for t in towers]))
+
+    baseline = best_of(old, repeat)
+    print(f"towers x {count:,}")
+    report("model per doc + response_model", count, baseline, baseline)
+    report("pre-encoded index rows", count, best_of(lambda: index.render(idx), repeat), baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated document counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    for count in (int(s) for s in args.sizes.split(",")):
+        bench_reports(count, args.repeat)
+        bench_towers(count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
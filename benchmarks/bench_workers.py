@@ -0,0 +1,146 @@
+"""
+Load test: throughput of `python -m app.serve` at increasing worker counts.
+
+For each worker count the server is started as a subprocess and several
+client processes hammer POST /api/coverage/estimate (CPU-bound: spatial
+lookup plus the vectorized propagation model) over keep-alive connections
+for a fixed duration. Reports req/s, speedup over one worker and scaling
+efficiency. Clients run on the same host, so leave CPUs for them: scaling is
+only meaningful up to roughly half the cores.
+
+By default every worker runs against an in-memory mongomock database seeded
+with the same synthetic towers (`pip install mongomock-motor`); pass
+--database-url to use a real MongoDB that already has towers.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 8 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_coverage import make_towers
+
+POINTS_PER_REQUEST = 200
+
+
+def mock_app():
+    """app.main:app on mongomock with seeded towers - each worker builds its own"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app import database
+    import app.main as main
+
+    client = AsyncMongoMockClient()
+
+    async def connect():
+        # Simulates a slow first ping (e.g. Atlas after a cold start)
+        await asyncio.sleep(float(os.environ.get("BENCH_CONNECT_DELAY", 0)))
+        database.db.client = client
+        database.db.database = database.db.analytics = client[database.settings.DATABASE_NAME]
+        if not await database.db.database.towers.count_documents({}):
+            towers = make_towers(int(os.environ.get("BENCH_TOWERS", 2000)))
+            for tower in towers:
+                tower["tech"] = ["LTE", "5G"]
+            await database.db.database.towers.insert_many(towers)
+
+    database.connect_to_mongo = connect
+    return main.app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int, database_url: str) -> subprocess.Popen:
+    command = [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers)]
+    env = dict(os.environ, SLOW_REQUEST_LOG_MS="0")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    else:
+        command += ["--app", "benchmarks.bench_workers:mock_app", "--factory"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # Goes through the tower index, so every worker that answers is warm
+            if httpx.get(base_url + "/api/coverage/estimate?lat=40.7&lng=-74.0").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+def client_loop(base_url: str, duration: float, seed: int) -> int:
+    rng = random.Random(seed)
+    done = 0
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            points = [{"lat": 40.7128 + rng.uniform(-0.5, 0.5), "lng": -74.006 + rng.uniform(-0.5, 0.5)}
+                      for _ in range(POINTS_PER_REQUEST)]
+            response = client.post("/api/coverage/estimate", json={"points": points})
+            response.raise_for_status()
+            done += 1
+    return done
+
+
+def measure(workers: int, clients: int, duration: float, database_url: str) -> float:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(workers, port, database_url)
+    try:
+        wait_ready(base_url)
+        # Warm every worker (index load, numpy first-call costs) before timing
+        with multiprocessing.Pool(clients) as pool:
+            pool.starmap(client_loop, [(base_url, 1.0, -i) for i in range(clients)])
+            started = time.perf_counter()
+            counts = pool.starmap(client_loop, [(base_url, duration, i) for i in range(clients)])
+            elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return sum(counts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--towers", type=int, default=2000, help="synthetic towers (mongomock only)")
+    parser.add_argument("--database-url", default="", help="use this MongoDB instead of mongomock")
+    args = parser.parse_args()
+    os.environ["BENCH_TOWERS"] = str(args.towers)
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count()
+    print(f"{cpus} CPU(s), {args.clients} client processes, {POINTS_PER_REQUEST} points per request")
+
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workers, args.clients, args.duration, args.database_url)
+        baseline = baseline or rate / workers
+        speedup = rate / baseline
+        print(f"{workers:3d} worker(s)  {rate:8.1f} req/s   {speedup:4.2f}x   "
+              f"efficiency {speedup / workers:4.0%}")
+
+
+if __name__ == "__main__":
+    main()
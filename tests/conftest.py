@@ -0,0 +1,15 @@
+"""
+Shared test setup. Run from the backend directory:
+
+    pip install pytest mongomock-motor httpx
+    python -m pytest
+
+Snapshots and the shared cache generations go to a scratch directory
+instead of /dev/shm, so tests never see the files of a running server.
+"""
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="signalscope-tests-")
+os.environ.setdefault("TOWER_SNAPSHOT_DIR", _scratch)
+os.environ.setdefault("REPORT_COLUMNS_DIR", _scratch)
@@ -0,0 +1,34 @@
+from app.admission import gcra
+
+
+def test_new_client_gets_the_full_burst():
+    tat = None
+    for _ in range(3):
+        tat, retry_after = gcra(tat, 0.0, rate=1.0, burst=3)
+        assert tat is not None and retry_after == 0.0
+
+    rejected, retry_after = gcra(tat, 0.0, rate=1.0, burst=3)
+    assert rejected is None
+    assert retry_after == 1.0
+
+
+def test_tokens_refill_at_the_rate():
+    tat = None
+    for _ in range(3):
+        tat, _ = gcra(tat, 0.0, rate=2.0, burst=3)
+    assert gcra(tat, 0.0, rate=2.0, burst=3)[0] is None
+    # One token back after 1 / rate seconds
+    assert gcra(tat, 0.5, rate=2.0, burst=3)[0] is not None
+
+
+def test_idle_client_is_treated_as_new():
+    tat, _ = gcra(None, 0.0, rate=1.0, burst=2)
+    assert gcra(tat, 100.0, rate=1.0, burst=2) == gcra(None, 100.0, rate=1.0, burst=2)
+
+
+def test_rejection_leaves_the_state_unchanged():
+    tat = None
+    for _ in range(2):
+        tat, _ = gcra(tat, 10.0, rate=1.0, burst=2)
+    assert gcra(tat, 10.0, rate=1.0, burst=2) == (None, 1.0)
+    assert gcra(tat, 10.5, rate=1.0, burst=2) == (None, 0.5)
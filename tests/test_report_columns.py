@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+from app.report_columns import SYNC_LAG_SECONDS, ReportColumns, read_columns, summarize, write_columns
+
+
+def report(signal: int = -80, carrier: str = "Verizon", timestamp: datetime = None, **fields) -> dict:
+    return {"_id": ObjectId(), "lat": 40.75, "lng": -73.99, "signal_strength": signal, "carrier": carrier,
+            "device": "Pixel 8", "user_id": "u1", "timestamp": timestamp or datetime.utcnow(), **fields}
+
+
+def test_summarize_merges_triples_from_both_segments():
+    # (group, dBm, count): group 0 has -80 from two segments
+    groups = np.array([0, 0, 1, 0], dtype=np.int64)
+    signals = np.array([-80, -90, -70, -80], dtype=np.int64)
+    counts = np.array([1, 2, 3, 1], dtype=np.int64)
+    keys, summaries = summarize(groups, signals, counts, histogram=True)
+
+    assert keys.tolist() == [0, 1]
+    assert summaries[0] == {
+        "count": 4, "mean_signal": -85.0, "min_signal": -90, "max_signal": -80,
+        "p50": -90, "p90": -80, "p95": -80, "histogram": {"-90": 2, "-80": 2},
+    }
+    assert summaries[1]["count"] == 3
+    assert summaries[1]["p50"] == summaries[1]["p95"] == -70
+
+
+def test_summarize_percentiles_are_nearest_rank():
+    signals = np.arange(-100, -0, dtype=np.int64)
+    _, (summary,) = summarize(np.zeros(100, dtype=np.int64), signals, np.ones(100, dtype=np.int64))
+    assert (summary["p50"], summary["p90"], summary["p95"]) == (-51, -11, -6)
+
+
+def test_append_skips_recent_reports_already_seen():
+    columns = ReportColumns(watermark=time.time())
+    first, second = report(), report()
+    assert columns.append([first, second]) == 2
+    # The watcher and this worker's inserts can both deliver a report
+    assert columns.append([second, report(carrier="AT&T")]) == 1
+    assert len(columns) == 3
+    busiest = columns.query("carrier")["groups"][0]
+    assert (busiest["carrier"], busiest["count"]) == ("Verizon", 2)
+
+
+def test_append_forgets_ids_behind_the_watermark():
+    old = report(timestamp=datetime.utcnow() - timedelta(hours=1))
+    columns = ReportColumns(watermark=time.time())
+    assert columns.append([old]) == 1
+    assert old["_id"] not in columns.recent
+
+    columns.append([report()])
+    columns.advance(time.time() + SYNC_LAG_SECONDS + 1)
+    assert columns.recent == {}
+
+
+def test_snapshot_round_trip(tmp_path):
+    columns = ReportColumns(watermark=time.time())
+    columns.append([report(signal=-70 - i, carrier=["Verizon", "AT&T"][i % 2]) for i in range(20)])
+    recent = report(_id="imported-1")
+    columns.append([recent])
+    path = str(tmp_path / "reports.cols")
+    write_columns(path, columns)
+
+    loaded = read_columns(path)
+    assert loaded is not None and loaded.persisted
+    assert len(loaded) == len(columns) == 21
+    assert loaded.watermark == columns.watermark and loaded.scanned_at == columns.scanned_at
+    assert loaded.dictionaries["carrier"].values == columns.dictionaries["carrier"].values
+    assert loaded.recent == columns.recent
+    assert any(isinstance(key, ObjectId) for key in loaded.recent) and "imported-1" in loaded.recent
+    assert loaded.query("carrier", histogram=True) == columns.query("carrier", histogram=True)
+
+    # Rows appended after loading go to the tail, after the mapped base
+    assert loaded.append([report(carrier="T-Mobile")]) == 1
+    assert loaded.query(carrier="T-Mobile")["count"] == 1
+
+
+def test_snapshot_older_than_a_scan_is_ignored(tmp_path):
+    columns = ReportColumns(watermark=time.time())
+    columns.append([report()])
+    path = str(tmp_path / "reports.cols")
+    write_columns(path, columns)
+    assert read_columns(path, scanned_after=columns.scanned_at) is None
+    assert read_columns(str(tmp_path / "missing.cols")) is None
+
+
+def test_truncated_snapshot_is_ignored(tmp_path):
+    columns = ReportColumns(watermark=time.time())
+    columns.append([report() for _ in range(10)])
+    path = tmp_path / "reports.cols"
+    write_columns(str(path), columns)
+    path.write_bytes(path.read_bytes()[:-64])
+    assert read_columns(str(path)) is None
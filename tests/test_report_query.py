@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.report_query import bbox_filter, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    oid = ObjectId()
+    timestamp = datetime(2026, 10, 17, 12, 30, 15, 123000)
+    query = decode_cursor(encode_cursor({"timestamp": timestamp, "_id": oid}))
+    assert query == {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": oid}},
+    ]}
+
+
+def test_cursor_with_other_time_field_and_string_ids():
+    bucket = datetime(2026, 10, 17)
+    cursor = encode_cursor({"bucket": bucket, "_id": "Verizon|dr5ru|2026-10-17T00"}, time_field="bucket")
+    query = decode_cursor(cursor, time_field="bucket", id_type=str)
+    assert query["$or"][1] == {"bucket": bucket, "_id": {"$lt": "Verizon|dr5ru|2026-10-17T00"}}
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"timestamp": datetime(2026, 1, 1), "_id": ObjectId()})
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor({"timestamp": datetime(2026, 1, 1), "_id": "x"})])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_bbox_filter_uses_location_only_when_allowed():
+    bbox = (40.7, -74.1, 40.8, -73.9)
+    ranges = {"lat": {"$gte": 40.7, "$lte": 40.8}, "lng": {"$gte": -74.1, "$lte": -73.9}}
+    assert bbox_filter(bbox, use_location=False) == ranges
+    query = bbox_filter(bbox, use_location=True)
+    assert "$geoWithin" in query["location"]
+    assert {k: query[k] for k in ("lat", "lng")} == ranges
+    # Too wide for a polygon
+    assert bbox_filter((0, -100, 10, 100), use_location=True) == {
+        "lat": {"$gte": 0, "$lte": 10}, "lng": {"$gte": -100, "$lte": 100}}
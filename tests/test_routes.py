@@ -0,0 +1,103 @@
+"""
+Smoke test of the routes against mongomock, with the app booted through
+its real startup hook like benchmarks/bench_api. mongomock has no
+$geoWithin, so bbox queries on reports are left to bench_api --database-url.
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mongomock_motor")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from app import database
+from app.config import settings
+
+DATABASE = "signalscope_test"
+
+
+@pytest.fixture(scope="module")
+def client():
+    from app.seed import generate_towers
+
+    mongo = AsyncMongoMockClient()
+    patch = pytest.MonkeyPatch()
+
+    async def connect():
+        database.db.client = mongo
+        database.db.database = database.db.analytics = mongo[DATABASE]
+
+    # Every caller imports connect_to_mongo from app.database at call time
+    patch.setattr(database, "connect_to_mongo", connect)
+    patch.setattr(settings, "DATABASE_NAME", DATABASE)
+    patch.setattr(settings, "ADMISSION_ENABLED", False)
+    asyncio.run(mongo[DATABASE].towers.insert_many(generate_towers(200, np.random.default_rng(1))))
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+    patch.undo()
+
+
+@pytest.fixture(scope="module")
+def auth(client):
+    response = client.post("/auth/register", json={
+        "email": "tester@example.com", "password": "correct horse", "name": "Tester"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_health(client):
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 200
+
+
+def test_login(client, auth):
+    response = client.post("/auth/login", json={"email": "tester@example.com", "password": "correct horse"})
+    assert response.status_code == 200
+    assert client.post("/auth/login", json={"email": "tester@example.com", "password": "wrong one"}).status_code == 401
+
+
+def test_towers(client):
+    towers = client.get("/api/towers/").json()
+    assert len(towers) == 200
+    assert {"id", "lat", "lng", "operator", "height", "tech"} <= set(towers[0])
+
+
+def test_coverage_estimate(client):
+    response = client.get("/api/coverage/estimate", params={"lat": 40.75, "lng": -73.99})
+    assert response.status_code == 200
+    batch = client.post("/api/coverage/estimate", json={"points": [{"lat": 40.75, "lng": -73.99}] * 3}).json()
+    assert len(batch["signal_strength"]) == 3
+
+
+def test_reports_feed_the_analytics(client, auth):
+    for i, carrier in enumerate(["Verizon", "Verizon", "AT&T"]):
+        response = client.post("/api/reports/", headers=auth, json={
+            "lat": 40.75 + i / 1000, "lng": -73.99, "carrier": carrier, "signal_strength": -80 - i,
+            "device": "Pixel 8"})
+        assert response.status_code == 200, response.text
+
+    mine = client.get("/api/reports/user", headers=auth).json()
+    assert len(mine) == 3
+
+    analytics = client.get("/api/analytics", headers=auth).json()
+    assert analytics["reports_by_carrier"]["Verizon"] == 2
+    assert analytics["total_towers"] == 200
+
+    by_carrier = client.get("/api/analytics/by-carrier").json()
+    assert set(by_carrier) == {"start", "end", "resolution", "approximate", "carriers"}
+    assert {c["carrier"]: c["count"] for c in by_carrier["carriers"]} == {"Verizon": 2, "AT&T": 1}
+
+    clusters = client.get("/api/clusters/reports", params={"bbox": "40,-75,41,-73", "zoom": 10}).json()
+    assert clusters["total"] == 3
+
+
+def test_tower_clusters(client):
+    clusters = client.get("/api/clusters/towers", params={"bbox": "-90,-180,90,180", "zoom": 2}).json()
+    assert clusters["total"] == 200